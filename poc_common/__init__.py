@@ -0,0 +1 @@
+"""Shared helpers for the POC scripts (poc_smartscore, poc_street_sampling)"""
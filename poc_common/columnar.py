@@ -0,0 +1,190 @@
+"""
+Columnar table storage for the data exchanged between POC stages
+
+Tables are written as Parquet (pyarrow) with typed float64/int64 columns and
+dictionary-encoded string columns, so loaders skip CSV parsing and can read
+only the columns they need. Without pyarrow, tables fall back to a NumPy .npz
+archive (numeric columns as-is, string columns as int32 codes plus a
+dictionary array, bytes columns as lengths plus one flat buffer, other object
+columns of numbers as float64). A .csv copy can be written alongside for
+inspection or export.
+
+Paths are given without caring about the extension: "data/pois/parks.csv",
+"data/pois/parks.parquet" and "data/pois/parks" all name the same table, and
+readers take the first of .parquet, .npz, .csv that exists, so CSV files from
+older runs still load.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+TABLE_EXTENSIONS = ['.parquet', '.npz', '.csv']
+
+# String columns with at most this share of distinct values are dictionary-encoded
+DICTIONARY_MAX_RATIO = 0.5
+
+# Prefixes of the dictionary arrays and bytes buffers in the .npz fallback
+NPZ_DICTIONARY_PREFIX = '__dictionary__'
+NPZ_BYTES_PREFIX = '__bytes__'
+NPZ_PREFIXES = (NPZ_DICTIONARY_PREFIX, NPZ_BYTES_PREFIX)
+
+def table_base(path):
+    """Path without a known table extension"""
+    root, ext = os.path.splitext(path)
+    return root if ext in TABLE_EXTENSIONS else path
+
+def find_table(path):
+    """
+    Existing file for a table, preferring columnar formats
+
+    Raises:
+        FileNotFoundError: If no .parquet, .npz or .csv version exists
+    """
+    base = table_base(path)
+    for ext in TABLE_EXTENSIONS:
+        if os.path.exists(base + ext):
+            return base + ext
+    raise FileNotFoundError(f"No table found for {path} (tried {', '.join(TABLE_EXTENSIONS)})")
+
+def is_string_column(series):
+    """True for object or pandas string columns"""
+    return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+
+def holds_only(series, value_type):
+    """True if every non-missing value of an object or string column is a value_type (and there is one)"""
+    values = series.dropna()
+    return is_string_column(series) and len(values) > 0 and values.map(type).eq(value_type).all()
+
+def dictionary_columns(df):
+    """String columns worth dictionary-encoding (few distinct values)"""
+    return [
+        column for column in df.columns
+        if holds_only(df[column], str) and df[column].nunique() <= DICTIONARY_MAX_RATIO * len(df)
+    ]
+
+def npz_arrays(column, series):
+    """Arrays storing one column in the .npz fallback"""
+    if holds_only(series, str):
+        # Codes + dictionary (code -1 = missing)
+        codes, uniques = pd.factorize(series)
+        return {column: codes.astype(np.int32), NPZ_DICTIONARY_PREFIX + column: np.asarray(uniques, dtype=str)}
+    if holds_only(series, bytes):
+        # Lengths (-1 = missing) + all values back to back
+        values = series.to_numpy()
+        missing = pd.isna(series).to_numpy()
+        lengths = np.array([-1 if is_missing else len(value) for value, is_missing in zip(values, missing)],
+                           dtype=np.int64)
+        buffer = b''.join(value for value, is_missing in zip(values, missing) if not is_missing)
+        return {column: lengths, NPZ_BYTES_PREFIX + column: np.frombuffer(buffer, dtype=np.uint8)}
+    if is_string_column(series):
+        # Numbers mixed with None (e.g. nearest_poi_id of a category without POIs), or all missing
+        numeric = pd.to_numeric(series, errors='coerce')
+        if numeric.notna().sum() == series.notna().sum():
+            return {column: numeric.to_numpy(dtype=np.float64)}
+        codes, uniques = pd.factorize(series.map(lambda value: value if pd.isna(value) else str(value)))
+        return {column: codes.astype(np.int32), NPZ_DICTIONARY_PREFIX + column: np.asarray(uniques, dtype=str)}
+    return {column: series.to_numpy()}
+
+def npz_column(archive, name):
+    """One column read back from the .npz fallback"""
+    values = archive[name]
+    if NPZ_DICTIONARY_PREFIX + name in archive.files:
+        dictionary = archive[NPZ_DICTIONARY_PREFIX + name].astype(object)
+        if not len(dictionary):
+            return np.full(len(values), np.nan, dtype=object)
+        return pd.Categorical.from_codes(values, dictionary)
+    if NPZ_BYTES_PREFIX + name in archive.files:
+        buffer = archive[NPZ_BYTES_PREFIX + name].tobytes()
+        ends = np.cumsum(np.maximum(values, 0))
+        return np.array([None if length < 0 else buffer[end - length:end] for length, end in zip(values, ends)],
+                        dtype=object)
+    return values
+
+def write_table(df, path, csv_export=False):
+    """
+    Write a DataFrame as a columnar table
+
+    Args:
+        df: DataFrame to write
+        path: Table path (extension optional, see module docstring)
+        csv_export: Also write a .csv copy
+
+    Returns:
+        Path of the columnar file written
+    """
+    base = table_base(path)
+    os.makedirs(os.path.dirname(base) or '.', exist_ok=True)
+    encoded = dictionary_columns(df)
+
+    if pq is not None:
+        output_file = base + '.parquet'
+        table = pa.Table.from_pandas(df.astype({column: 'category' for column in encoded}), preserve_index=False)
+        pq.write_table(table, output_file)
+    else:
+        output_file = base + '.npz'
+        arrays = {}
+        for column in df.columns:
+            arrays.update(npz_arrays(column, df[column]))
+        np.savez(output_file, **arrays)
+
+    # A stale file of the other columnar format would shadow or confuse the new one
+    # (CSV files are left alone: they never shadow a columnar table)
+    for ext in ('.parquet', '.npz'):
+        if base + ext != output_file and os.path.exists(base + ext):
+            os.remove(base + ext)
+
+    if csv_export:
+        df.to_csv(base + '.csv', index=False)
+
+    return output_file
+
+def table_columns(path):
+    """Column names of a stored table without loading its data"""
+    table_file = find_table(path)
+
+    if table_file.endswith('.parquet'):
+        return list(pq.read_schema(table_file).names)
+    if table_file.endswith('.npz'):
+        with np.load(table_file) as archive:
+            return [name for name in archive.files if not name.startswith(NPZ_PREFIXES)]
+    return list(pd.read_csv(table_file, nrows=0).columns)
+
+def read_table(path, columns=None, categorical=False):
+    """
+    Read a stored table, optionally only some of its columns
+
+    Args:
+        path: Table path (extension optional)
+        columns: Column names to load (default: all)
+        categorical: Keep dictionary-encoded columns as pandas categoricals
+            (default decodes them to plain strings)
+
+    Returns:
+        DataFrame
+    """
+    table_file = find_table(path)
+
+    if table_file.endswith('.parquet'):
+        df = pq.read_table(table_file, columns=columns).to_pandas()
+    elif table_file.endswith('.npz'):
+        with np.load(table_file) as archive:
+            names = columns or [name for name in archive.files if not name.startswith(NPZ_PREFIXES)]
+            df = pd.DataFrame({name: npz_column(archive, name) for name in names})
+    else:
+        df = pd.read_csv(table_file, usecols=columns)
+        if columns is not None:
+            df = df[columns]
+
+    if not categorical:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object)
+
+    return df
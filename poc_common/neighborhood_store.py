@@ -0,0 +1,134 @@
+"""
+Per-neighborhood result storage for incremental recomputation
+
+Stages whose results for one neighborhood do not depend on the other
+neighborhoods (streets, sample points, distances, POI counts) keep one table
+per neighborhood plus a manifest of signatures. A signature hashes the
+neighborhood's row (center, polygon, name, ...), the stage parameters and,
+where a stage builds on another, a digest of that neighborhood's upstream
+data. Adding or editing one neighborhood then recomputes only that
+neighborhood; all others are read back from the store. Tables of
+neighborhoods that are no longer listed stay in the store and are reused if
+the same row comes back.
+"""
+
+import json
+import os
+import pandas as pd
+
+from poc_common.columnar import find_table, read_table, write_table
+from poc_common.stage_cache import frame_digest, params_digest
+
+MANIFEST_FILE = 'manifest.json'
+
+def neighborhood_signatures(neighborhoods_df, params, upstream=None):
+    """
+    Signature per neighborhood id, in order of first appearance
+
+    Args:
+        neighborhoods_df: Neighborhood rows (rows sharing an id are hashed together)
+        params: JSON-serializable stage parameters shared by all neighborhoods
+        upstream: Optional {neighborhood_id: digest} of per-neighborhood input data
+
+    Returns:
+        Dict of neighborhood_id -> hex signature
+    """
+    shared = params_digest(params)
+    upstream = upstream or {}
+
+    signatures = {}
+    for nbh_id, rows in neighborhoods_df.groupby('id', sort=False):
+        signatures[nbh_id] = params_digest([shared, frame_digest(rows.reset_index(drop=True)),
+                                            upstream.get(nbh_id)])
+    return signatures
+
+def group_digests(df, key='neighborhood_id', drop=()):
+    """Digest of each group's rows (e.g. the streets of every neighborhood)"""
+    df = df.drop(columns=list(drop))
+    return {nbh_id: frame_digest(rows.reset_index(drop=True)) for nbh_id, rows in df.groupby(key, sort=False)}
+
+def neighborhood_positions(neighborhoods_df):
+    """Map of neighborhood id -> position of its first row, for restoring full-run order"""
+    ids = neighborhoods_df['id'].drop_duplicates()
+    return pd.Series(range(len(ids)), index=ids.to_numpy())
+
+class NeighborhoodStore:
+    """
+    Directory with one table per neighborhood and a manifest of their signatures
+
+    Layout: <store_dir>/<neighborhood_id>.parquet (or .npz) and manifest.json
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.manifest = {}
+        manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def table_path(self, nbh_id):
+        return os.path.join(self.store_dir, str(nbh_id))
+
+    def has_table(self, nbh_id):
+        try:
+            find_table(self.table_path(nbh_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stale(self, signatures):
+        """Neighborhood ids that are new, changed or missing their table"""
+        return [
+            nbh_id for nbh_id, signature in signatures.items()
+            if self.manifest.get(str(nbh_id)) != signature or not self.has_table(nbh_id)
+        ]
+
+    def save(self, tables, signatures):
+        """Write tables ({id: DataFrame}) and record their signatures"""
+        for nbh_id, df in tables.items():
+            write_table(df.reset_index(drop=True), self.table_path(nbh_id))
+            self.manifest[str(nbh_id)] = signatures[nbh_id]
+        self.write_manifest()
+
+    def write_manifest(self):
+        manifest_path = os.path.join(self.store_dir, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def load(self, ids):
+        """Concatenated tables of the given neighborhoods, in the given order"""
+        tables = [read_table(self.table_path(nbh_id)) for nbh_id in ids]
+        tables = [df for df in tables if len(df.columns)]
+        if not tables:
+            return pd.DataFrame()
+        return pd.concat(tables, ignore_index=True)
+
+def update_neighborhoods(store, neighborhoods_df, signatures, compute):
+    """
+    Recompute new or changed neighborhoods and return the results of all of them
+
+    Args:
+        store: NeighborhoodStore of the stage
+        neighborhoods_df: All neighborhoods
+        signatures: Output of neighborhood_signatures()
+        compute: Function taking the stale neighborhood rows and returning a
+            DataFrame with a neighborhood_id column
+
+    Returns:
+        Tuple of (DataFrame for all neighborhoods in signature order, recomputed ids)
+    """
+    stale = store.stale(signatures)
+
+    if stale:
+        result = compute(neighborhoods_df[neighborhoods_df['id'].isin(stale)])
+        if 'neighborhood_id' in result.columns:
+            tables = {nbh_id: result[result['neighborhood_id'] == nbh_id] for nbh_id in stale}
+        else:
+            tables = {nbh_id: result for nbh_id in stale}
+        store.save(tables, signatures)
+
+    return store.load(list(signatures)), stale
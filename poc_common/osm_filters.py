@@ -0,0 +1,64 @@
+"""
+Osmium tag filters compiled from the POC filter definitions
+
+The extraction scripts describe what they want as lists of
+(key, [values]) pairs (DOMAINS, POI_CATEGORIES, STREET_TYPES). These helpers
+turn those lists into pyosmium filters that run in the C++ layer, so objects
+that cannot match never reach a Python callback.
+
+Filters only drop objects for the entity types they are enabled for; node
+location handlers and area assembly run before them, so ways still get their
+node locations and multipolygons still see their untagged member ways.
+"""
+
+import osmium
+from osmium.osm import NODE, WAY, RELATION, AREA
+
+# Entity types to filter when extracting area POIs: nodes, multipolygon
+# relations (first area pass) and the assembled areas
+AREA_POI_ENTITIES = NODE | RELATION | AREA
+
+def tag_pairs(filters):
+    """
+    Flatten [(key, [values])] filter lists into unique (key, value) pairs
+
+    Args:
+        filters: Iterable of (key, [values]) tuples
+
+    Returns:
+        List of (key, value) tuples in first-seen order
+    """
+    pairs = []
+    for key, values in filters:
+        for value in values:
+            if (key, value) not in pairs:
+                pairs.append((key, value))
+    return pairs
+
+def tag_filter(filters, entities=NODE):
+    """
+    osmium TagFilter passing objects that match any (key, value) pair
+
+    Args:
+        filters: Iterable of (key, [values]) tuples
+        entities: osm_entity_bits the filter applies to (others pass through)
+    """
+    return osmium.filter.TagFilter(*tag_pairs(filters)).enable_for(entities)
+
+def combined_filters(definitions):
+    """All filter lists from a DOMAINS / POI_CATEGORIES style dict"""
+    return [pair for info in definitions.values() for pair in info['filters']]
+
+def definitions_tag_filter(definitions, entities=NODE):
+    """
+    One TagFilter matching any entry of a DOMAINS / POI_CATEGORIES style dict
+
+    Args:
+        definitions: Dict of {key: {'filters': [(key, [values]), ...], ...}}
+        entities: osm_entity_bits the filter applies to
+    """
+    return tag_filter(combined_filters(definitions), entities)
+
+def highway_filter(highway_types, entities=WAY):
+    """TagFilter for ways with highway=<one of highway_types>"""
+    return tag_filter([('highway', list(highway_types))], entities)
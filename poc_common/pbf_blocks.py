@@ -0,0 +1,197 @@
+"""
+Block-level access to OSM PBF files for parallel decoding
+
+A PBF file is a sequence of self-contained blobs (an OSMHeader followed by
+OSMData blocks). Any contiguous run of data blocks, prefixed with the file's
+header blob, is itself a valid PBF file. This module scans the blob headers
+without decompressing anything, splits the data blocks into contiguous byte
+ranges of similar size, and lets a process pool decode those ranges through
+osmium.io.FileBuffer. Results come back in file order, so merging them is
+deterministic.
+"""
+
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import osmium
+
+from poc_common.process_pools import pool_context
+
+# Byte ranges per worker; more ranges than workers keeps the pool busy at the end
+GROUPS_PER_WORKER = 4
+
+# OSMHeader optional feature telling that nodes come before ways before relations
+SORTED_FEATURE = 'Sort.Type_then_ID'
+
+def read_varint(data, pos):
+    """Decode a protobuf varint at pos; returns (value, next_pos)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+def protobuf_fields(data):
+    """
+    Iterate (field_number, value) over a protobuf message
+
+    Only the wire types used by the PBF container are decoded (varint and
+    length-delimited); fixed-size fields are skipped.
+    """
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 2:
+            length, pos = read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        elif wire_type == 1:
+            pos += 8
+            continue
+        elif wire_type == 5:
+            pos += 4
+            continue
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield field, value
+
+def scan_blocks(pbf_file):
+    """
+    List the blobs of a PBF file from their headers only
+
+    Returns:
+        Tuple of (header_bytes, blocks) where header_bytes is the raw OSMHeader
+        fileblock and blocks is a list of (offset, size) per OSMData fileblock
+    """
+    header_bytes = b''
+    blocks = []
+
+    with open(pbf_file, 'rb') as f:
+        offset = 0
+        while True:
+            prefix = f.read(4)
+            if len(prefix) < 4:
+                break
+            header_size = struct.unpack('>I', prefix)[0]
+            blob_header = f.read(header_size)
+
+            blob_type = None
+            data_size = 0
+            for field, value in protobuf_fields(blob_header):
+                if field == 1:
+                    blob_type = value.decode('utf-8')
+                elif field == 3:
+                    data_size = value
+
+            size = 4 + header_size + data_size
+            if blob_type == 'OSMHeader':
+                header_bytes = prefix + blob_header + f.read(data_size)
+            else:
+                if blob_type == 'OSMData':
+                    blocks.append((offset, size))
+                f.seek(data_size, os.SEEK_CUR)
+            offset += size
+
+    return header_bytes, blocks
+
+def header_features(header_bytes):
+    """
+    Required and optional features declared in the OSMHeader
+
+    Returns:
+        Set of feature strings (empty if the header blob is not raw or zlib)
+    """
+    if not header_bytes:
+        return set()
+
+    header_size = struct.unpack('>I', header_bytes[:4])[0]
+    blob = header_bytes[4 + header_size:]
+
+    block = None
+    for field, value in protobuf_fields(blob):
+        if field == 1:
+            block = value
+        elif field == 3:
+            block = zlib.decompress(value)
+    if block is None:
+        return set()
+
+    return {value.decode('utf-8') for field, value in protobuf_fields(block) if field in (4, 5)}
+
+def block_groups(blocks, count):
+    """
+    Split data blocks into at most count contiguous byte ranges of similar size
+
+    Returns:
+        List of (start_offset, end_offset) byte ranges in file order
+    """
+    if not blocks:
+        return []
+
+    sizes = np.array([size for _, size in blocks], dtype=np.int64)
+    ends = np.cumsum(sizes)
+    cuts = np.searchsorted(ends, ends[-1] * np.arange(1, count) / count, side='left') + 1
+    bounds = np.unique(np.concatenate([[0], cuts, [len(blocks)]]))
+
+    return [
+        (blocks[start][0], blocks[end - 1][0] + blocks[end - 1][1])
+        for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+    ]
+
+def read_block_group(pbf_file, header_bytes, byte_range):
+    """A standalone PBF buffer: the header blob plus one range of data blocks"""
+    start, end = byte_range
+    with open(pbf_file, 'rb') as f:
+        f.seek(start)
+        return osmium.io.FileBuffer(header_bytes + f.read(end - start), 'pbf')
+
+def run_block_group(task):
+    """Pool task: decode one byte range and hand it to the worker function"""
+    worker, pbf_file, header_bytes, byte_range = task
+    return worker(read_block_group(pbf_file, header_bytes, byte_range))
+
+def map_block_groups(pbf_file, worker, groups, header_bytes, workers=None, initializer=None, initargs=()):
+    """
+    Run worker(FileBuffer) over byte ranges in a process pool
+
+    Args:
+        pbf_file: Path to the PBF file
+        worker: Module-level function taking an osmium.io.FileBuffer
+        groups: Byte ranges from block_groups
+        header_bytes: OSMHeader fileblock from scan_blocks
+        workers: Number of processes (default: all cores)
+        initializer, initargs: Per-process setup (e.g. large shared lookups)
+
+    Returns:
+        List of worker results in file order
+    """
+    tasks = [(worker, pbf_file, header_bytes, byte_range) for byte_range in groups]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=pool_context(),
+                             initializer=initializer, initargs=initargs) as pool:
+        return list(pool.map(run_block_group, tasks))
+
+def split_pbf(pbf_file, workers=None):
+    """
+    Scan a PBF file and split it for a pool of workers
+
+    Returns:
+        Tuple of (header_bytes, groups, is_sorted)
+    """
+    workers = workers or os.cpu_count() or 1
+    header_bytes, blocks = scan_blocks(pbf_file)
+    groups = block_groups(blocks, workers * GROUPS_PER_WORKER)
+    is_sorted = SORTED_FEATURE in header_features(header_bytes)
+
+    print(f"  {len(blocks):,} PBF blocks in {len(groups):,} ranges for {workers} worker(s)")
+
+    return header_bytes, groups, is_sorted
@@ -0,0 +1,234 @@
+"""
+In-process DAG runner for POC pipelines
+
+Each stage declares the named inputs it consumes and the named outputs it
+produces. Stage functions receive their inputs as keyword arguments and
+return a dict with their outputs, so DataFrames are handed from stage to
+stage in memory instead of being re-read from disk. Stages whose inputs are
+all available run concurrently on a thread pool (independent branches such
+as street and POI extraction overlap), and every stage is timed.
+
+With a StageCache, each stage's outputs are stored under a content hash of
+its code, parameters and upstream keys, and an unchanged stage is loaded
+from the cache instead of being run again (as long as the files it wrote
+have not been overwritten since).
+"""
+
+import inspect
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from poc_common.stage_cache import params_digest, source_digest, value_digest
+
+class Stage:
+    """
+    One pipeline step: func(**inputs) returns a dict with every declared output
+
+    Cache key parts (only used when the pipeline has a cache):
+        params: Function taking the same inputs as func and returning a
+            JSON-serializable description of everything besides upstream
+            outputs that determines the result (config values, constants,
+            input file signatures). Without it, those inputs are hashed whole.
+        code: Functions or modules whose module source is part of the key
+            (func's own source is always included)
+        files: Function taking the same inputs and returning the files the
+            stage writes; a cached result is only used while they are all
+            unchanged since the run that produced it
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, code=(), files=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params
+        self.code = list(code)
+        self.files = files
+
+class Pipeline:
+    """
+    A set of stages connected by the artifacts they exchange
+
+    Usage:
+        pipeline = Pipeline()
+        pipeline.add('samples', make_samples, inputs=['streets_df'], outputs=['samples_df'])
+        artifacts = pipeline.run({'streets_df': streets_df})
+        pipeline.timings['samples']['duration_s']
+    """
+
+    def __init__(self, cache=None):
+        self.stages = {}
+        self.cache = cache
+        self.keys = {}
+        self.timings = {}
+        self.wall_time_s = 0.0
+
+    def add(self, name, func, inputs=(), outputs=(), params=None, code=(), files=None):
+        """Register a stage; stages are listed (and reported) in the order they are added"""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage name: {name}")
+
+        produced = {output for stage in self.stages.values() for output in stage.outputs}
+        duplicates = produced.intersection(outputs)
+        if duplicates:
+            raise ValueError(f"Stage {name} redeclares outputs {sorted(duplicates)}")
+
+        self.stages[name] = Stage(name, func, inputs, outputs, params, code, files)
+        return self.stages[name]
+
+    def producers(self):
+        """Map of artifact name -> stage producing it"""
+        return {output: stage.name for stage in self.stages.values() for output in stage.outputs}
+
+    def validate(self, initial):
+        """
+        Check that every input is produced by a stage or given up front, and that there are no cycles
+
+        Raises:
+            ValueError: On a missing input or a dependency cycle
+        """
+        producers = self.producers()
+        for stage in self.stages.values():
+            missing = [name for name in stage.inputs if name not in producers and name not in initial]
+            if missing:
+                raise ValueError(f"Stage {stage.name} needs {missing}, which nothing provides")
+
+        # Kahn's algorithm over stage -> stage edges
+        depends = {
+            stage.name: {producers[name] for name in stage.inputs if name in producers and name not in initial}
+            for stage in self.stages.values()
+        }
+        done = set()
+        while len(done) < len(depends):
+            ready = [name for name, deps in depends.items() if name not in done and deps <= done]
+            if not ready:
+                raise ValueError(f"Dependency cycle among stages {sorted(set(depends) - done)}")
+            done.update(ready)
+
+    def run(self, initial=None, workers=None):
+        """
+        Run all stages, each as soon as its inputs exist
+
+        A failing stage is reported and its dependents are skipped; independent
+        branches still run to completion.
+
+        Args:
+            initial: Dict of artifacts available before any stage runs (e.g. configuration)
+            workers: Concurrent stages (default: number of stages)
+
+        Returns:
+            Dict of all artifacts (initial plus every stage output)
+        """
+        artifacts = dict(initial or {})
+        self.validate(artifacts)
+        self.timings = {}
+        self.keys = {}
+
+        producers = self.producers()
+        pending = dict(self.stages)
+        running = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers or max(len(self.stages), 1)) as pool:
+            while pending or running:
+                self._skip_blocked(pending, producers)
+
+                for name, stage in list(pending.items()):
+                    if all(i in artifacts for i in stage.inputs):
+                        kwargs = {i: artifacts[i] for i in stage.inputs}
+                        if self.cache is not None:
+                            self.keys[name] = self.stage_key(stage, kwargs, producers)
+                        running[pool.submit(self._run_stage, stage, kwargs, start)] = name
+                        del pending[name]
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    outputs, timing = future.result()
+                    self.timings[name] = timing
+                    if outputs is not None:
+                        artifacts.update(outputs)
+
+        self.wall_time_s = time.perf_counter() - start
+        self.timings = {name: self.timings[name] for name in self.stages if name in self.timings}
+
+        return artifacts
+
+    def stage_key(self, stage, kwargs, producers):
+        """Content hash of a stage's code, parameters and upstream stage keys"""
+        parts = {
+            'stage': stage.name,
+            'func': params_digest(inspect.getsource(stage.func)),
+            'code': source_digest(stage.code),
+            'upstream': {i: self.keys[producers[i]] for i in stage.inputs if i in producers}
+        }
+        local = {i: value for i, value in kwargs.items() if i not in producers}
+        if stage.params is not None:
+            parts['params'] = stage.params(**kwargs)
+        else:
+            parts['inputs'] = {i: value_digest(value) for i, value in local.items()}
+        return params_digest(parts)
+
+    def _skip_blocked(self, pending, producers):
+        """Drop pending stages that can never run because an upstream stage failed"""
+        blocked = True
+        while blocked:
+            blocked = [
+                name for name, stage in pending.items()
+                if any(self.timings.get(producers.get(i), {}).get('status') in ('failed', 'skipped')
+                       for i in stage.inputs)
+            ]
+            for name in blocked:
+                self.timings[name] = {'status': 'skipped', 'start_s': None, 'end_s': None, 'duration_s': 0.0}
+                print(f"[pipeline] {name}: skipped (upstream stage failed)")
+                del pending[name]
+
+    def _run_stage(self, stage, kwargs, pipeline_start):
+        """Run one stage on a pool thread; returns (outputs or None, timing dict)"""
+        stage_start = time.perf_counter()
+        timing = {'start_s': stage_start - pipeline_start}
+        key = self.keys.get(stage.name)
+
+        try:
+            outputs = None
+            if key is not None:
+                outputs = self.cache.get(key, stage.files(**kwargs) if stage.files else [])
+
+            if outputs is not None:
+                timing['status'] = 'cached'
+            else:
+                print(f"[pipeline] {stage.name}: started")
+                outputs = stage.func(**kwargs) or {}
+                missing = [name for name in stage.outputs if name not in outputs]
+                if missing:
+                    raise ValueError(f"Stage {stage.name} did not return {missing}")
+                outputs = {name: outputs[name] for name in stage.outputs}
+                if key is not None:
+                    self.cache.put(key, outputs, stage.files(**kwargs) if stage.files else [])
+                timing['status'] = 'ok'
+        except Exception:
+            print(f"[pipeline] {stage.name}: FAILED\n{traceback.format_exc()}")
+            outputs = None
+            timing['status'] = 'failed'
+
+        end = time.perf_counter()
+        timing['end_s'] = end - pipeline_start
+        timing['duration_s'] = end - stage_start
+        print(f"[pipeline] {stage.name}: {timing['status']} in {timing['duration_s']:.2f} seconds")
+
+        return outputs, timing
+
+    def summary_lines(self):
+        """Per-stage timing table (start offset, duration, status) for reports"""
+        lines = [f"{'Stage':<28} {'Start (s)':>10} {'Duration (s)':>13}  Status"]
+        for name, timing in self.timings.items():
+            start = f"{timing['start_s']:.2f}" if timing['start_s'] is not None else '-'
+            lines.append(f"{name:<28} {start:>10} {timing['duration_s']:>13.2f}  {timing['status']}")
+        stage_total = sum(timing['duration_s'] for timing in self.timings.values())
+        lines.append(f"{'Sum of stage times':<28} {'':>10} {stage_total:>13.2f}")
+        lines.append(f"{'Wall-clock time':<28} {'':>10} {self.wall_time_s:>13.2f}")
+        return lines
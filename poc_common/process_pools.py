@@ -0,0 +1,29 @@
+"""
+Start method shared by the POC process pools
+
+Pipeline stages run on threads, and forking a process that has other
+threads running can deadlock the child (a lock held by another thread is
+copied locked). Pools therefore start their workers from a fork server, a
+single-threaded process that imports the heavy libraries once; a new worker
+then only re-imports the project modules. Where there is no fork server
+(Windows), workers are spawned.
+
+All pools share one fork server, so the preload list lives here rather than
+with each pool.
+"""
+
+import multiprocessing
+
+# Installed libraries imported once in the fork server (missing ones are skipped)
+PRELOAD_MODULES = [
+    'numpy', 'pandas', 'pyarrow.parquet', 'scipy.spatial', 'scipy.sparse.csgraph', 'shapely', 'geopandas',
+    'pyproj', 'osmium', 'folium'
+]
+
+def pool_context():
+    """multiprocessing context for ProcessPoolExecutor(mp_context=...)"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        return context
+    return multiprocessing.get_context('spawn')
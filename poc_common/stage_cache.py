@@ -0,0 +1,152 @@
+"""
+Content-addressed cache for pipeline stage outputs
+
+A stage's cache key is a SHA-256 over everything that determines its result:
+the source code of the modules it runs, its parameters (configuration values,
+module constants, input file signatures) and the keys of the upstream stages
+whose outputs it consumes. Unchanged stages are then loaded from disk instead
+of recomputed, while any edit upstream changes every key downstream of it.
+
+Entries are pickled output dicts in a local directory, together with the
+signatures of the files the stage wrote. An entry only counts as a hit while
+those files are unchanged, so a run with other parameters (or a standalone
+script) that overwrote them makes the stage run again and rewrite them. When
+the directory grows beyond its size budget, least recently used entries are
+evicted.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import pandas as pd
+
+CACHE_EXTENSION = '.pkl'
+
+def params_digest(params):
+    """SHA-256 of a JSON-serializable description (tuples and paths are fine)"""
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def file_signature(path):
+    """
+    Cheap fingerprint of an input file (path, size, modification time)
+
+    Large inputs like the Belgium PBF are not hashed byte by byte; a new
+    download changes size and mtime.
+    """
+    if not path or not os.path.exists(path):
+        return {'path': path, 'missing': True}
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def frame_digest(df):
+    """SHA-256 of a DataFrame's columns, dtypes and values"""
+    h = hashlib.sha256()
+    h.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+def value_digest(value):
+    """SHA-256 of a DataFrame or of any JSON-serializable value"""
+    if isinstance(value, pd.DataFrame):
+        return frame_digest(value)
+    return params_digest(value)
+
+def source_digest(objects):
+    """
+    SHA-256 of the source files of the modules defining the given objects
+
+    Args:
+        objects: Functions, classes or modules; each contributes its whole module
+            source, so edits to module-level constants count as code changes
+    """
+    h = hashlib.sha256()
+    for path in sorted({inspect.getsourcefile(inspect.getmodule(obj)) for obj in objects}):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+class StageCache:
+    """
+    Directory of pickled stage outputs keyed by content hash, with LRU eviction
+
+    Reading an entry refreshes its modification time, which eviction uses as
+    the last-use time.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def get(self, key, files=()):
+        """
+        Cached outputs for key, or None
+
+        Args:
+            key: Stage key
+            files: Files the stage writes; the entry is a miss unless they all
+                still have the signatures recorded when it was stored
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Entries from before file signatures were recorded are plain output dicts
+        if not isinstance(entry, dict) or set(entry) != {'outputs', 'files'}:
+            return None
+        if entry['files'] != [file_signature(file) for file in files]:
+            return None
+
+        os.utime(path)
+        return entry['outputs']
+
+    def put(self, key, outputs, files=()):
+        """Store outputs and the signatures of the files written with them, then evict down to the size budget"""
+        path = self.path(key)
+        entry = {'outputs': outputs, 'files': [file_signature(file) for file in files]}
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+        self.evict(keep=path)
+
+    def entries(self):
+        """List of (path, size, last_used) for every cache entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_EXTENSION):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
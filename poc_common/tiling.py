@@ -0,0 +1,107 @@
+"""
+Spatial tiling for country-scale runs
+
+Neighborhoods are partitioned into a grid of square tiles over Belgium by
+their center, so every tile can be processed on its own with only the data
+around it (its streets plus a halo of POIs). Tiles run in a process pool
+whose workers are recycled after a fixed number of tiles and which only
+keeps a bounded number of tiles in flight, so memory stays flat however
+many tiles a run has.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+from poc_common.geodesy import haversine, EARTH_RADIUS_M
+from poc_common.process_pools import pool_context
+
+# Belgium in WGS84: (min_lon, min_lat, max_lon, max_lat)
+BELGIUM_BOUNDS = (2.54, 49.49, 6.41, 51.51)
+
+TILE_SIZE_M = 20000
+
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+def tile_steps(tile_size_m=TILE_SIZE_M, bounds=BELGIUM_BOUNDS):
+    """Tile height and width in degrees (the width is measured at the middle latitude of bounds)"""
+    mid_lat = (bounds[1] + bounds[3]) / 2
+    return tile_size_m / METERS_PER_DEGREE, tile_size_m / (METERS_PER_DEGREE * math.cos(math.radians(mid_lat)))
+
+def partition_neighborhoods(neighborhoods_df, tile_size_m=TILE_SIZE_M, bounds=BELGIUM_BOUNDS):
+    """
+    Assign every neighborhood to the grid tile containing its center
+
+    The grid is anchored at the south-west corner of bounds; centers outside
+    bounds still get a tile (the grid simply extends).
+
+    Returns:
+        List of tile dicts (tile_id, row, col, bounds, neighborhood_ids), in row then column order
+    """
+    lat_step, lon_step = tile_steps(tile_size_m, bounds)
+    rows = np.floor((neighborhoods_df['latitude'].to_numpy(dtype=float) - bounds[1]) / lat_step).astype(np.int64)
+    cols = np.floor((neighborhoods_df['longitude'].to_numpy(dtype=float) - bounds[0]) / lon_step).astype(np.int64)
+
+    tiles = {}
+    for nbh_id, row, col in zip(neighborhoods_df['id'].tolist(), rows.tolist(), cols.tolist()):
+        if (row, col) not in tiles:
+            min_lon = bounds[0] + col * lon_step
+            min_lat = bounds[1] + row * lat_step
+            tiles[(row, col)] = {
+                'tile_id': f"r{row:03d}_c{col:03d}",
+                'row': row,
+                'col': col,
+                'bounds': (min_lon, min_lat, min_lon + lon_step, min_lat + lat_step),
+                'neighborhood_ids': []
+            }
+        if nbh_id not in tiles[(row, col)]['neighborhood_ids']:
+            tiles[(row, col)]['neighborhood_ids'].append(nbh_id)
+
+    return [tiles[key] for key in sorted(tiles)]
+
+def bounding_circle(lons, lats):
+    """Center (bounding box midpoint) and radius in meters of a circle containing all points"""
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    center_lon = (lons.min() + lons.max()) / 2
+    center_lat = (lats.min() + lats.max()) / 2
+    return center_lon, center_lat, float(haversine(center_lon, center_lat, lons, lats).max())
+
+def map_bounded(func, tasks, workers=1, max_tasks_per_child=None, max_pending=None):
+    """
+    Run func over tasks in a process pool, yielding (task, result) as tasks finish
+
+    Tasks are pulled from the iterable only as slots free up, so at most
+    max_pending task payloads (default: twice the workers) exist at once,
+    and each worker process is replaced after max_tasks_per_child tasks to
+    hand its memory back.
+
+    Args:
+        func: Module-level function taking one task
+        tasks: Iterable of tasks (may be a generator)
+        workers: Number of processes (1 runs in-process, None = all cores)
+        max_tasks_per_child: Tasks per worker process before it is replaced (None = never)
+        max_pending: Tasks submitted but not yet finished
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for task in tasks:
+            yield task, func(task)
+        return
+
+    max_pending = max_pending or 2 * workers
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), max_tasks_per_child=max_tasks_per_child) as pool:
+        running = {}
+        while True:
+            for task in tasks:
+                running[pool.submit(func, task)] = task
+                if len(running) >= max_pending:
+                    break
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield running.pop(future), future.result()
@@ -1,6 +1,14 @@
+import numpy as np
 import pandas as pd
 import os
-from math import radians, cos, sin, asin, sqrt
+import sys
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import haversine, to_unit_vectors, chord_radius
+from poc_common.columnar import find_table, read_table
+from poc_common.neighborhood_store import NeighborhoodStore, neighborhood_signatures, update_neighborhoods
+from poc_common.stage_cache import frame_digest, params_digest, source_digest
 
 # Domain definitions
 DOMAINS = ['winkels', 'restaurants', 'groen', 'onderwijs', 'transport', 'sport', 'gezondheidszorg', 'cultuur']
@@ -16,116 +24,180 @@ DOMAIN_NAMES = {
     'cultuur': 'Cultuur (Culture & Nightlife)'
 }
 
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance in meters between two points
-    on the earth (specified in decimal degrees)
-
-    The haversine formula determines the great-circle distance between
-    two points on a sphere given their longitudes and latitudes.
-
-    Args:
-        lon1, lat1: Longitude and latitude of point 1 (in decimal degrees)
-        lon2, lat2: Longitude and latitude of point 2 (in decimal degrees)
-
-    Returns:
-        Distance in meters
-    """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000  # Radius of earth in meters
-    return c * r
-
 def load_neighborhoods(file_path):
     """Load neighborhood data from CSV"""
     df = pd.read_csv(file_path)
     print(f"Loaded {len(df)} neighborhoods")
     return df
 
-def load_pois(domain):
-    """Load POI data for a specific domain"""
-    file_path = f"data/pois/{domain}.csv"
-    if not os.path.exists(file_path):
+def load_pois(domain, columns=None):
+    """Load POI data for a specific domain (Parquet, or CSV from older runs)"""
+    file_path = f"data/pois/{domain}"
+    try:
+        find_table(file_path)
+    except FileNotFoundError:
         print(f"Warning: {file_path} not found")
         return pd.DataFrame()
 
-    df = pd.read_csv(file_path)
-    return df
-
-def count_pois_within_radius(neighborhood, pois_df, radius_m=1000):
-    """
-    Count POIs within a given radius of a neighborhood center point
+    return read_table(file_path, columns=columns)
 
-    Args:
-        neighborhood: Row from neighborhoods dataframe with lat/lon
-        pois_df: DataFrame of POIs with latitude/longitude columns
-        radius_m: Radius in meters (default 1000m = 1km)
+def load_all_pois(domains=DOMAINS):
+    """Load the POI coordinates of every domain once"""
+    return {domain: load_pois(domain, columns=['latitude', 'longitude']) for domain in domains}
 
-    Returns:
-        Count of POIs within radius
+class POICounter:
     """
-    if pois_df.empty:
-        return 0
-
-    nbh_lat = neighborhood['latitude']
-    nbh_lon = neighborhood['longitude']
+    Spatial index over the POIs of one domain for batched radius counts
 
-    count = 0
-    for _, poi in pois_df.iterrows():
-        distance = haversine(nbh_lon, nbh_lat, poi['longitude'], poi['latitude'])
-        if distance <= radius_m:
-            count += 1
-
-    return count
+    POIs are indexed as 3D unit vectors, where a great-circle radius maps to a
+    fixed chord length. One ball query at the largest radius finds candidate
+    POIs for every neighborhood; their distances are then sorted once so each
+    radius is a searchsorted away.
+    """
 
-def calculate_all_counts(neighborhoods_df, radius_m=1000):
+    def __init__(self, pois_df):
+        self.size = len(pois_df)
+        self.tree = None
+        if self.size:
+            self.lons = pois_df['longitude'].to_numpy(dtype=float)
+            self.lats = pois_df['latitude'].to_numpy(dtype=float)
+            self.tree = cKDTree(to_unit_vectors(self.lons, self.lats))
+
+    def count_within_radii(self, lons, lats, radii):
+        """
+        Number of POIs within each radius of each point
+
+        Returns:
+            int array of shape (len(lons), len(radii))
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        radii = np.asarray(radii, dtype=float)
+        counts = np.zeros((len(lons), len(radii)), dtype=np.int64)
+
+        if self.tree is None or len(radii) == 0:
+            return counts
+
+        # Slightly widened chord so the exact haversine test decides the boundary
+        candidates = self.tree.query_ball_point(
+            to_unit_vectors(lons, lats), chord_radius(radii.max() + 1)
+        )
+
+        for i, poi_index in enumerate(candidates):
+            if not poi_index:
+                continue
+            distances = np.sort(haversine(lons[i], lats[i], self.lons[poi_index], self.lats[poi_index]))
+            counts[i] = np.searchsorted(distances, radii, side='right')
+
+        return counts
+
+def calculate_all_counts(neighborhoods_df, radius_m=1000, pois_dict=None):
     """
-    Calculate POI counts for all neighborhood × domain combinations
+    Calculate POI counts for all neighborhood × domain × radius combinations
+
+    Distances are computed once per neighborhood and domain, so extra radii
+    cost no more than a single one.
 
     Args:
         neighborhoods_df: DataFrame of neighborhoods
-        radius_m: Radius in meters for counting
+        radius_m: Radius in meters for counting, or a list of radii
+        pois_dict: Optional {domain: pois_df}; loaded from data/pois when omitted
 
     Returns:
-        DataFrame with columns: neighborhood_id, neighborhood_name, domain, count
+        Long DataFrame with one row per neighborhood × domain × radius:
+        neighborhood_id, neighborhood_name, domain, poi_count, radius_m
     """
-    results = []
+    radii = [int(r) if float(r).is_integer() else float(r) for r in np.atleast_1d(radius_m)]
+    radii_label = ', '.join(f"{r}m" for r in radii)
+
+    print(f"\nCalculating POI counts within {radii_label} for each neighborhood...\n")
 
-    print(f"\nCalculating POI counts within {radius_m}m for each neighborhood...\n")
+    # Load each domain once and count all neighborhoods in one query per domain
+    if pois_dict is None:
+        pois_dict = load_all_pois()
 
-    for _, neighborhood in neighborhoods_df.iterrows():
-        print(f"Processing: {neighborhood['name']} ({neighborhood['city']})")
+    lons = neighborhoods_df['longitude'].to_numpy(dtype=float)
+    lats = neighborhoods_df['latitude'].to_numpy(dtype=float)
 
+    counts = {}
+    for domain in DOMAINS:
+        counts[domain] = POICounter(pois_dict.get(domain, pd.DataFrame())).count_within_radii(lons, lats, radii)
+        totals = ', '.join(f"{r}m: {total:,}" for r, total in zip(radii, counts[domain].sum(axis=0)))
+        print(f"  {DOMAIN_NAMES[domain]}: {totals} POIs across {len(neighborhoods_df)} neighborhoods")
+
+    results = []
+    for i, (_, neighborhood) in enumerate(neighborhoods_df.iterrows()):
         for domain in DOMAINS:
-            # Load POIs for this domain
-            pois_df = load_pois(domain)
+            for j, radius in enumerate(radii):
+                # Store result
+                results.append({
+                    'neighborhood_id': neighborhood['id'],
+                    'neighborhood_name': neighborhood['name'],
+                    'city': neighborhood['city'],
+                    'category': neighborhood['category'],
+                    'domain': domain,
+                    'domain_name': DOMAIN_NAMES[domain],
+                    'poi_count': int(counts[domain][i, j]),
+                    'radius_m': radius
+                })
 
-            # Count POIs within radius
-            count = count_pois_within_radius(neighborhood, pois_df, radius_m)
+    return pd.DataFrame(results)
 
-            # Store result
-            results.append({
-                'neighborhood_id': neighborhood['id'],
-                'neighborhood_name': neighborhood['name'],
-                'city': neighborhood['city'],
-                'category': neighborhood['category'],
-                'domain': domain,
-                'domain_name': DOMAIN_NAMES[domain],
-                'poi_count': count,
-                'radius_m': radius_m
-            })
+def poi_reach_digests(neighborhoods_df, pois_dict, radius_m):
+    """
+    Per neighborhood, a digest of the POIs within radius_m of its center in every domain
 
-            print(f"  {DOMAIN_NAMES[domain]}: {count} POIs")
+    Counts only depend on these POIs, so POI changes elsewhere in the country
+    leave a neighborhood's counts valid.
+    """
+    lons = neighborhoods_df['longitude'].to_numpy(dtype=float)
+    lats = neighborhoods_df['latitude'].to_numpy(dtype=float)
+    ids = neighborhoods_df['id'].to_numpy()
+
+    nearby = {nbh_id: [] for nbh_id in ids}
+    for domain in DOMAINS:
+        pois_df = pois_dict.get(domain, pd.DataFrame())
+        if pois_df.empty:
+            points = np.empty((0, 2))
+            candidates = [[] for _ in ids]
+        else:
+            points = pois_df[['longitude', 'latitude']].to_numpy(dtype=float)
+            tree = cKDTree(to_unit_vectors(points[:, 0], points[:, 1]))
+            candidates = tree.query_ball_point(to_unit_vectors(lons, lats), chord_radius(radius_m + 1))
+
+        for nbh_id, poi_index in zip(ids, candidates):
+            nearby_points = points[sorted(poi_index)].reshape(-1, 2)
+            nearby[nbh_id].append(frame_digest(pd.DataFrame(nearby_points, columns=['longitude', 'latitude'])))
+
+    return {nbh_id: params_digest(digests) for nbh_id, digests in nearby.items()}
+
+def calculate_counts_incremental(neighborhoods_df, store_dir, radius_m=1000, pois_dict=None):
+    """
+    calculate_all_counts() that only recomputes new or changed neighborhoods
 
-        print()
+    Counts are kept per neighborhood in store_dir, signed with the
+    neighborhood's row, the radii, the source of the counting code and the
+    POIs within the largest radius of its center. The reassembled table matches a full run.
 
-    return pd.DataFrame(results)
+    Returns:
+        Tuple of (long counts DataFrame, recomputed neighborhood ids)
+    """
+    radii = [int(r) if float(r).is_integer() else float(r) for r in np.atleast_1d(radius_m)]
+    if pois_dict is None:
+        pois_dict = load_all_pois()
+
+    store = NeighborhoodStore(store_dir)
+    code = source_digest([calculate_all_counts, haversine, read_table, NeighborhoodStore])
+    signatures = neighborhood_signatures(neighborhoods_df, {'radii': radii, 'domains': DOMAINS, 'code': code},
+                                         upstream=poi_reach_digests(neighborhoods_df, pois_dict, max(radii)))
+
+    counts_df, stale = update_neighborhoods(
+        store, neighborhoods_df, signatures,
+        lambda stale_df: calculate_all_counts(stale_df, radius_m=radii, pois_dict=pois_dict)
+    )
+    print(f"Neighborhoods recomputed: {len(stale)} of {len(signatures)} (others loaded from {store_dir})")
+
+    return counts_df, stale
 
 def create_summary_table(counts_df):
     """
@@ -156,21 +228,32 @@ def main():
 
     # Configuration
     RADIUS_M = 1000  # 1km radius for scoring
+    SENSITIVITY_RADII_M = [500, 1000, 2000]  # Extra radii computed in the same sweep
+    NEIGHBORHOOD_STORE_DIR = "results/poi_counts_by_neighborhood"  # Per-neighborhood results (None = count all)
 
     # Load neighborhoods
     print("\n1. Loading neighborhoods...")
     neighborhoods_df = load_neighborhoods("data/neighborhoods.csv")
 
-    # Calculate counts for all combinations
-    print(f"\n2. Calculating POI counts (radius: {RADIUS_M}m = {RADIUS_M/1000}km)...")
-    counts_df = calculate_all_counts(neighborhoods_df, radius_m=RADIUS_M)
+    # Calculate counts for all combinations (every radius in one sweep)
+    radii = sorted(set(SENSITIVITY_RADII_M) | {RADIUS_M})
+    print(f"\n2. Calculating POI counts (scoring radius: {RADIUS_M}m = {RADIUS_M/1000}km, radii: {radii})...")
+    if NEIGHBORHOOD_STORE_DIR:
+        counts_by_radius_df, _ = calculate_counts_incremental(neighborhoods_df, NEIGHBORHOOD_STORE_DIR, radius_m=radii)
+    else:
+        counts_by_radius_df = calculate_all_counts(neighborhoods_df, radius_m=radii)
 
-    # Save detailed results
+    # Save detailed results (scoring radius only, as consumed by calculate_scores.py)
+    counts_df = counts_by_radius_df[counts_by_radius_df['radius_m'] == RADIUS_M].reset_index(drop=True)
     output_file = "results/poi_counts.csv"
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     counts_df.to_csv(output_file, index=False)
     print(f"\n3. Detailed results saved to: {output_file}")
 
+    radius_file = "results/poi_counts_by_radius.csv"
+    counts_by_radius_df.to_csv(radius_file, index=False)
+    print(f"   Radius sensitivity table saved to: {radius_file}")
+
     # Create and save summary table
     print("\n4. Creating summary table...")
     summary = create_summary_table(counts_df)
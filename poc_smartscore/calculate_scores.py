@@ -82,24 +82,25 @@ def calculate_domain_scores(counts_df, normalization='minmax'):
     """
     df = counts_df.copy()
 
-    # Calculate scores per domain
-    for domain in DOMAIN_WEIGHTS.keys():
-        domain_mask = df['domain'] == domain
-        domain_counts = df.loc[domain_mask, 'poi_count']
-
-        if normalization == 'minmax':
-            min_val = domain_counts.min()
-            max_val = domain_counts.max()
-            df.loc[domain_mask, 'domain_score'] = domain_counts.apply(
-                lambda x: min_max_normalize(x, min_val, max_val)
-            )
-        elif normalization == 'log':
-            max_val = domain_counts.max()
-            df.loc[domain_mask, 'domain_score'] = domain_counts.apply(
-                lambda x: log_normalize(x, max_val)
-            )
-        else:
-            raise ValueError(f"Unknown normalization: {normalization}")
+    # Per-domain min and max in one grouped pass, then the formulas of
+    # min_max_normalize / log_normalize applied to whole columns
+    scored = df['domain'].isin(list(DOMAIN_WEIGHTS.keys()))
+    counts = df.loc[scored, 'poi_count']
+    by_domain = counts.groupby(df.loc[scored, 'domain'])
+
+    if normalization == 'minmax':
+        min_val = by_domain.transform('min')
+        max_val = by_domain.transform('max')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(max_val == min_val, 5.0, (counts - min_val) / (max_val - min_val) * 10)
+    elif normalization == 'log':
+        max_val = by_domain.transform('max')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(max_val == 0, 0.0, np.log(counts + 1) / np.log(max_val + 1) * 10)
+    else:
+        raise ValueError(f"Unknown normalization: {normalization}")
+
+    df.loc[scored, 'domain_score'] = scores
 
     return df
 
@@ -1,7 +1,12 @@
 import pandas as pd
+import numpy as np
 import folium
 import os
-from math import radians, cos, sin, asin, sqrt
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import haversine_chunks
+from poc_common.columnar import find_table, read_table
 
 # Domain colors for visual distinction
 DOMAIN_COLORS = {
@@ -26,28 +31,15 @@ DOMAIN_NAMES = {
     'cultuur': 'Cultuur'
 }
 
-def haversine(lon1, lat1, lon2, lat2):
-    """Calculate distance between two points on Earth"""
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000
-    return c * r
-
 def filter_pois_within_radius(pois_df, neighborhoods_df, radius_m=2000):
     """Filter POIs to only those within radius of any neighborhood"""
-    filtered_pois = []
-    for _, poi in pois_df.iterrows():
-        poi_lat = poi['latitude']
-        poi_lon = poi['longitude']
-        for _, nbh in neighborhoods_df.iterrows():
-            distance = haversine(poi_lon, poi_lat, nbh['longitude'], nbh['latitude'])
-            if distance <= radius_m:
-                filtered_pois.append(poi)
-                break
-    return pd.DataFrame(filtered_pois)
+    within = np.zeros(len(pois_df), dtype=bool)
+    for rows, distances in haversine_chunks(
+        pois_df['longitude'], pois_df['latitude'],
+        neighborhoods_df['longitude'], neighborhoods_df['latitude']
+    ):
+        within[rows] = (distances <= radius_m).any(axis=1)
+    return pois_df[within]
 
 def create_map_html(neighborhoods_df, pois_dict):
     """Create the Folium map and return its HTML"""
@@ -181,10 +173,13 @@ def main():
     print("\n2. Loading POIs...")
     pois_dict = {}
     for domain in DOMAIN_COLORS.keys():
-        file_path = f"data/pois/{domain}.csv"
-        if os.path.exists(file_path):
-            pois_df = pd.read_csv(file_path)
-            pois_dict[domain] = filter_pois_within_radius(pois_df, neighborhoods_df)
+        file_path = f"data/pois/{domain}"
+        try:
+            find_table(file_path)
+        except FileNotFoundError:
+            continue
+        pois_df = read_table(file_path, columns=['name', 'latitude', 'longitude'])
+        pois_dict[domain] = filter_pois_within_radius(pois_df, neighborhoods_df)
 
     # Create map HTML
     print("\n3. Generating map...")
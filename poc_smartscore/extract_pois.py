@@ -1,6 +1,15 @@
 import osmium
-import csv
 import os
+import sys
+import pandas as pd
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.osm_filters import tag_filter, definitions_tag_filter
+from poc_common.pbf_blocks import split_pbf, map_block_groups
+from poc_common.columnar import write_table, read_table
+
+POI_COLUMNS = ['osm_type', 'osm_id', 'name', 'latitude', 'longitude', 'tags']
 
 # Define domain filters
 DOMAINS = {
@@ -110,53 +119,143 @@ class POIExtractor(osmium.SimpleHandler):
     def node(self, n):
         self.extract_poi(n)
 
+def build_filter_index(domains):
+    """
+    Build a tag lookup index: {key: {value: [domain_key, ...]}}
+
+    Lets a single handler test every domain with one dict lookup per key
+    instead of looping over all domains and their filters.
+    """
+    index = {}
+    for domain_key, domain_info in domains.items():
+        for key, values in domain_info['filters']:
+            for value in values:
+                domain_keys = index.setdefault(key, {}).setdefault(value, [])
+                if domain_key not in domain_keys:
+                    domain_keys.append(domain_key)
+    return index
+
+class MultiDomainPOIExtractor(osmium.SimpleHandler):
+    """Extract POIs for all domains in a single pass over the OSM file"""
+
+    def __init__(self, domains):
+        super().__init__()
+        self.filter_index = build_filter_index(domains)
+        self.pois = {domain_key: [] for domain_key in domains}
+        self.found = 0
+        self.processed = 0
+
+    def matching_domains(self, tags):
+        """Return the domains whose filters match these tags (a node can match several)"""
+        matches = []
+        for key, values in self.filter_index.items():
+            value = tags.get(key)
+            if value is None or value not in values:
+                continue
+            for domain_key in values[value]:
+                if domain_key not in matches:
+                    matches.append(domain_key)
+        return matches
+
+    def node(self, n):
+        domain_keys = self.matching_domains(n.tags)
+
+        if domain_keys:
+            poi = {
+                'osm_type': 'node',
+                'osm_id': n.id,
+                'name': n.tags.get('name', 'Unnamed'),
+                'latitude': n.location.lat,
+                'longitude': n.location.lon,
+                'tags': ';'.join([f"{k}={v}" for k, v in n.tags])
+            }
+
+            for domain_key in domain_keys:
+                self.pois[domain_key].append(poi)
+
+            self.found += 1
+            if self.found % 1000 == 0:
+                print(f"  Found {self.found} POIs...")
+
+        self.processed += 1
+        if self.processed % 1000000 == 0:
+            print(f"  Processed {self.processed:,} objects...")
+
 def extract_domain_pois(osm_file, domain_key, domain_info):
     """Extract POIs for a specific domain"""
     print(f"\nExtracting {domain_info['name']}...")
 
     handler = POIExtractor(domain_key, domain_info['filters'])
-    handler.apply_file(osm_file)
+    handler.apply_file(osm_file, filters=[tag_filter(domain_info['filters'])])
 
     print(f"  Found {len(handler.pois)} POIs")
 
     return handler.pois
 
-def save_to_csv(pois, output_file):
-    """Save POIs to CSV file"""
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+def extract_pois_in_blocks(buffer, domains):
+    """Pool task: POIs of all domains in one range of PBF blocks"""
+    handler = MultiDomainPOIExtractor(domains)
+    handler.apply_file(buffer, filters=[definitions_tag_filter(domains)])
+    return handler.pois
+
+def extract_all_domain_pois(osm_file, domains, workers=1):
+    """
+    Extract POIs for all domains while reading the OSM file only once
+
+    Args:
+        osm_file: Path to OSM PBF file
+        domains: Domain definitions (see DOMAINS)
+        workers: Processes decoding PBF blocks in parallel (1 = serial, None = all cores)
+
+    Returns:
+        Dict of {domain_key: list of POI dicts}
+    """
+    print(f"\nExtracting {len(domains)} domains in a single pass...")
+
+    if workers == 1:
+        # Only nodes matching some domain are handed to Python
+        handler = MultiDomainPOIExtractor(domains)
+        handler.apply_file(osm_file, filters=[definitions_tag_filter(domains)])
+        pois = handler.pois
+    else:
+        # Block ranges are decoded in parallel and merged back in file order
+        header_bytes, groups, _ = split_pbf(osm_file, workers)
+        results = map_block_groups(osm_file, partial(extract_pois_in_blocks, domains=domains), groups, header_bytes, workers)
+        pois = {domain_key: [poi for result in results for poi in result[domain_key]] for domain_key in domains}
+
+    for domain_key, domain_info in domains.items():
+        print(f"  {domain_info['name']}: {len(pois[domain_key])} POIs")
+
+    return pois
 
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        if pois:
-            fieldnames = ['osm_type', 'osm_id', 'name', 'latitude', 'longitude', 'tags']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(pois)
+def save_pois(pois, output_file, csv_export=False):
+    """Save POIs as a columnar table (optionally with a CSV copy)"""
+    saved_file = write_table(pd.DataFrame(pois, columns=POI_COLUMNS), output_file, csv_export=csv_export)
 
-    print(f"  Saved to {output_file}")
+    print(f"  Saved to {saved_file}")
 
 def main():
     osm_file = "data/belgium-latest.osm.pbf"
     output_dir = "data/pois"
+    workers = os.cpu_count()  # Processes decoding PBF blocks (1 = serial)
+    export_csv = False  # Also write a .csv copy of every POI table
 
     print(f"Processing OSM file: {osm_file}")
     print(f"Output directory: {output_dir}")
     print("=" * 60)
 
-    # Extract POIs for each domain
-    for domain_key, domain_info in DOMAINS.items():
-        pois = extract_domain_pois(osm_file, domain_key, domain_info)
-        output_file = os.path.join(output_dir, f"{domain_key}.csv")
-        save_to_csv(pois, output_file)
+    # Extract POIs for all domains in one pass over the file
+    all_pois = extract_all_domain_pois(osm_file, DOMAINS, workers)
+    for domain_key, pois in all_pois.items():
+        output_file = os.path.join(output_dir, f"{domain_key}.parquet")
+        save_pois(pois, output_file, csv_export=export_csv)
 
     print("\n" + "=" * 60)
     print("Extraction complete!")
     print("\nSummary:")
     for domain_key in DOMAINS.keys():
-        csv_file = os.path.join(output_dir, f"{domain_key}.csv")
-        if os.path.exists(csv_file):
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                line_count = sum(1 for line in f) - 1  # Subtract header
-                print(f"  {domain_key}.csv: {line_count:,} POIs")
+        pois_df = read_table(os.path.join(output_dir, domain_key), columns=['osm_id'])
+        print(f"  {domain_key}: {len(pois_df):,} POIs")
 
 if __name__ == "__main__":
     main()
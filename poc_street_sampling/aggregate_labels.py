@@ -1,5 +1,9 @@
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import read_table
 
 # Label thresholds (from POC specification)
 LABEL_THRESHOLDS = {
@@ -142,14 +146,14 @@ def main():
     print("=" * 70)
 
     # Configuration
-    DISTANCES_FILE = "results/distances_per_sample.csv"
+    DISTANCES_FILE = "results/distances_per_sample.parquet"
     NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
     OUTPUT_LABELS_FILE = "results/neighborhood_labels.csv"
     OUTPUT_SUMMARY_FILE = "results/neighborhood_labels_summary.csv"
 
     # Load data
     print("\n1. Loading data...")
-    distances_df = pd.read_csv(DISTANCES_FILE)
+    distances_df = read_table(DISTANCES_FILE, columns=['neighborhood_name', 'category', 'distance_m'])
     print(f"   Loaded {len(distances_df):,} distance records")
 
     neighborhoods_df = pd.read_csv(NEIGHBORHOODS_FILE)
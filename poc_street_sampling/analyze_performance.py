@@ -4,18 +4,25 @@ Analyzes existing files to document performance metrics
 """
 
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import find_table, read_table
+
 def get_file_size_mb(filepath):
-    """Get file size in MB"""
-    if os.path.exists(filepath):
-        return os.path.getsize(filepath) / (1024 * 1024)
-    return 0
+    """Get file size in MB (tables in whichever format they were stored)"""
+    if not os.path.exists(filepath):
+        try:
+            filepath = find_table(filepath)
+        except FileNotFoundError:
+            return 0
+    return os.path.getsize(filepath) / (1024 * 1024)
 
 def count_sample_points_per_neighborhood():
     """Count sample points per neighborhood"""
-    samples_df = pd.read_csv('data/samples/street_samples.csv')
+    samples_df = read_table('data/samples/street_samples.parquet')
     counts = samples_df.groupby('neighborhood_name').size().sort_values(ascending=False)
     return counts
 
@@ -34,11 +41,11 @@ def main():
     file_sizes = {
         'neighborhoods': get_file_size_mb('data/neighborhoods.csv'),
         'streets': get_file_size_mb('data/streets/residential_streets.geojson'),
-        'street_samples': get_file_size_mb('data/samples/street_samples.csv'),
-        'supermarkets': get_file_size_mb('data/pois/supermarkets.csv'),
-        'pt_stops': get_file_size_mb('data/pois/pt_stops.csv'),
-        'green_spaces': get_file_size_mb('data/pois/green_spaces.csv'),
-        'distances': get_file_size_mb('results/distances_per_sample.csv'),
+        'street_samples': get_file_size_mb('data/samples/street_samples.parquet'),
+        'supermarkets': get_file_size_mb('data/pois/supermarkets.parquet'),
+        'pt_stops': get_file_size_mb('data/pois/pt_stops.parquet'),
+        'green_spaces': get_file_size_mb('data/pois/green_spaces.parquet'),
+        'distances': get_file_size_mb('results/distances_per_sample.parquet'),
         'labels_summary': get_file_size_mb('results/neighborhood_labels_summary.csv'),
         'html_map': get_file_size_mb('street_sampling_map.html')
     }
@@ -46,11 +53,11 @@ def main():
     # Count records
     neighborhoods_df = pd.read_csv('data/neighborhoods.csv')
     streets_df = pd.read_csv('data/streets/residential_streets_summary.csv')
-    samples_df = pd.read_csv('data/samples/street_samples.csv')
-    pois_supermarkets = pd.read_csv('data/pois/supermarkets.csv')
-    pois_pt = pd.read_csv('data/pois/pt_stops.csv')
-    pois_green = pd.read_csv('data/pois/green_spaces.csv')
-    distances_df = pd.read_csv('results/distances_per_sample.csv')
+    samples_df = read_table('data/samples/street_samples.parquet')
+    pois_supermarkets = read_table('data/pois/supermarkets.parquet')
+    pois_pt = read_table('data/pois/pt_stops.parquet')
+    pois_green = read_table('data/pois/green_spaces.parquet')
+    distances_df = read_table('results/distances_per_sample.parquet')
     labels_df = pd.read_csv('results/neighborhood_labels_summary.csv')
 
     record_counts = {
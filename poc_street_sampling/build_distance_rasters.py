@@ -0,0 +1,230 @@
+"""
+Precompute distance-to-nearest rasters per POI category
+
+Rasterizes the POIs of each category onto a fine grid over Belgium in
+Lambert 72 (EPSG:31370) and runs a Euclidean distance transform. The results
+are stored as memory-mapped .npy arrays (nearest distance and nearest POI
+index per cell), so the nearest POI for any coordinate becomes an O(1) gather
+instead of a search.
+"""
+
+import json
+import os
+import sys
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from scipy import ndimage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import read_table, write_table
+from poc_common.stage_cache import frame_digest
+
+# POI categories (same files as written by extract_pois.py)
+POI_CATEGORIES = ['supermarkets', 'pt_stops', 'green_spaces']
+
+# Belgium in Lambert 72 meters: (xmin, ymin, xmax, ymax)
+BELGIUM_BOUNDS_L72 = (14000, 22000, 296000, 246000)
+
+CELL_SIZE_M = 25
+
+# Rows handled at once when gathering nearest indices into the memmap
+ROW_BLOCK = 512
+
+POI_COLUMNS = ['osm_id', 'name', 'poi_type', 'latitude', 'longitude']
+
+@lru_cache(maxsize=1)
+def lambert72_transformer():
+    """Transformer from WGS84 lon/lat to Lambert 72 x/y meters (built once per process; creating one takes ~50 ms)"""
+    return Transformer.from_crs('EPSG:4326', 'EPSG:31370', always_xy=True)
+
+def pois_digest(pois_df):
+    """Digest of the POIs (order, ids and coordinates) a raster's nearest indices refer to"""
+    return frame_digest(pd.DataFrame({
+        'osm_id': pois_df['osm_id'].astype(str).to_numpy(),
+        'latitude': pois_df['latitude'].to_numpy(dtype=float),
+        'longitude': pois_df['longitude'].to_numpy(dtype=float)
+    }))
+
+def grid_shape(bounds, cell_size):
+    """Number of (rows, cols) covering bounds at cell_size"""
+    xmin, ymin, xmax, ymax = bounds
+    return int(np.ceil((ymax - ymin) / cell_size)), int(np.ceil((xmax - xmin) / cell_size))
+
+def raster_paths(raster_dir, category):
+    """File paths for one category's raster set"""
+    return {
+        'distance': os.path.join(raster_dir, f"{category}_distance.npy"),
+        'nearest': os.path.join(raster_dir, f"{category}_nearest.npy"),
+        'pois': os.path.join(raster_dir, f"{category}_pois"),
+        'indices': os.path.join(raster_dir, f"{category}_indices.tmp.npy"),
+        'meta': os.path.join(raster_dir, f"{category}_meta.json")
+    }
+
+def build_category_raster(pois_df, raster_dir, category, bounds=BELGIUM_BOUNDS_L72, cell_size=CELL_SIZE_M):
+    """
+    Rasterize one category's POIs and store its distance transform
+
+    Args:
+        pois_df: DataFrame with POIs (latitude, longitude, osm_id, name, poi_type)
+        raster_dir: Output directory
+        category: Category key used in file names
+        bounds: Grid extent in Lambert 72 meters
+        cell_size: Cell size in meters
+
+    Returns:
+        Dict with the category's raster metadata
+    """
+    os.makedirs(raster_dir, exist_ok=True)
+    paths = raster_paths(raster_dir, category)
+    rows, cols = grid_shape(bounds, cell_size)
+    xmin, ymin, xmax, ymax = bounds
+
+    print(f"\n  {category}: {len(pois_df):,} POIs on a {rows:,} × {cols:,} grid ({cell_size}m cells)")
+
+    x, y = lambert72_transformer().transform(
+        pois_df['longitude'].to_numpy(dtype=float), pois_df['latitude'].to_numpy(dtype=float)
+    )
+    poi_rows = np.floor((ymax - y) / cell_size).astype(np.int64)
+    poi_cols = np.floor((x - xmin) / cell_size).astype(np.int64)
+    inside = (poi_rows >= 0) & (poi_rows < rows) & (poi_cols >= 0) & (poi_cols < cols)
+
+    if not inside.any():
+        raise ValueError(f"No {category} POIs inside the raster bounds")
+
+    # Seed cells hold POI index + 1; reversed so the first POI in a cell wins
+    seeds = np.zeros((rows, cols), dtype=np.int32)
+    poi_index = np.flatnonzero(inside)[::-1]
+    seeds[poi_rows[poi_index], poi_cols[poi_index]] = poi_index + 1
+
+    # Position of the nearest seed cell for every cell, written straight into a
+    # temporary memmap (asking SciPy for distances too would allocate several
+    # full-grid int32/float64 planes)
+    indices = np.lib.format.open_memmap(paths['indices'], mode='w+', dtype=np.int32, shape=(2, rows, cols))
+    ndimage.distance_transform_edt(seeds == 0, return_distances=False, return_indices=True, indices=indices)
+
+    distance_map = np.lib.format.open_memmap(paths['distance'], mode='w+', dtype=np.float32, shape=(rows, cols))
+    nearest_map = np.lib.format.open_memmap(paths['nearest'], mode='w+', dtype=np.int32, shape=(rows, cols))
+
+    # Distances and nearest POI indices one block of rows at a time
+    col_index = np.arange(cols)
+    for start in range(0, rows, ROW_BLOCK):
+        block = slice(start, min(start + ROW_BLOCK, rows))
+        nearest_rows = indices[0][block]
+        nearest_cols = indices[1][block]
+        dy = (nearest_rows - np.arange(block.start, block.stop)[:, None]).astype(np.float64) * cell_size
+        dx = (nearest_cols - col_index).astype(np.float64) * cell_size
+        distance_map[block] = np.sqrt(dy * dy + dx * dx)
+        nearest_map[block] = seeds[nearest_rows, nearest_cols] - 1
+
+    distance_map.flush()
+    nearest_map.flush()
+    del indices, distance_map, nearest_map
+    os.remove(paths['indices'])
+
+    # Keep the POI table the indices refer to next to the rasters
+    write_table(pois_df[POI_COLUMNS], paths['pois'])
+
+    meta = {
+        'category': category,
+        'crs': 'EPSG:31370',
+        'bounds': list(bounds),
+        'cell_size_m': cell_size,
+        'shape': [rows, cols],
+        'poi_count': int(len(pois_df)),
+        'pois_digest': pois_digest(pois_df),
+        'pois_inside_bounds': int(inside.sum())
+    }
+    with open(paths['meta'], 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"    Saved {paths['distance']} and {paths['nearest']}")
+
+    return meta
+
+class DistanceRaster:
+    """
+    Memory-mapped distance-to-nearest raster for one POI category
+
+    Lookups project points to Lambert 72 and gather the precomputed cell
+    values, so a million-point query costs one projection and one gather.
+    """
+
+    def __init__(self, raster_dir, category):
+        paths = raster_paths(raster_dir, category)
+
+        with open(paths['meta'], 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.category = category
+        self.bounds = tuple(self.meta['bounds'])
+        self.cell_size = self.meta['cell_size_m']
+        self.shape = tuple(self.meta['shape'])
+        self.distance = np.load(paths['distance'], mmap_mode='r')
+        self.nearest = np.load(paths['nearest'], mmap_mode='r')
+        self.pois_df = read_table(paths['pois'])
+        self.transformer = lambert72_transformer()
+
+    def cells(self, lons, lats):
+        """
+        Raster row/col for each point
+
+        Returns:
+            Tuple of (rows, cols, inside) where inside flags points on the grid
+        """
+        x, y = self.transformer.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        xmin, ymin, xmax, ymax = self.bounds
+        rows = np.floor((ymax - np.asarray(y)) / self.cell_size).astype(np.int64)
+        cols = np.floor((np.asarray(x) - xmin) / self.cell_size).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return rows, cols, inside
+
+    def lookup(self, lons, lats):
+        """
+        Nearest POI index and raster distance for many points
+
+        Distances are cell-center to POI-cell-center, so they are accurate to
+        about one cell. Points off the grid get index -1 and NaN distance.
+
+        Returns:
+            Tuple of (nearest_index, distance_m) arrays
+        """
+        rows, cols, inside = self.cells(lons, lats)
+        nearest_index = np.full(len(rows), -1, dtype=np.int64)
+        distances = np.full(len(rows), np.nan)
+
+        nearest_index[inside] = self.nearest[rows[inside], cols[inside]]
+        distances[inside] = self.distance[rows[inside], cols[inside]]
+
+        return nearest_index, distances
+
+def main():
+    print("=" * 70)
+    print("Street Sampling POC - Build Distance-to-Nearest Rasters")
+    print("=" * 70)
+
+    # Configuration
+    POI_DIR = "data/pois"
+    RASTER_DIR = "data/rasters"
+
+    rows, cols = grid_shape(BELGIUM_BOUNDS_L72, CELL_SIZE_M)
+    print(f"\nGrid: {rows:,} × {cols:,} cells of {CELL_SIZE_M}m over Belgium (Lambert 72)")
+
+    print("\n1. Building rasters...")
+    for category in POI_CATEGORIES:
+        pois_df = read_table(os.path.join(POI_DIR, f"{category}.parquet"))
+        build_category_raster(pois_df, RASTER_DIR, category)
+
+    print("\n2. Raster files:")
+    for category in POI_CATEGORIES:
+        paths = raster_paths(RASTER_DIR, category)
+        size_mb = (os.path.getsize(paths['distance']) + os.path.getsize(paths['nearest'])) / (1024 * 1024)
+        print(f"  {category:15s}: {size_mb:,.1f} MB")
+
+    print("\n" + "=" * 70)
+    print("Raster build complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
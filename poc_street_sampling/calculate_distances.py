@@ -1,6 +1,16 @@
+import numpy as np
 import pandas as pd
 import os
-from math import radians, cos, sin, asin, sqrt
+import sys
+import shapely
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import haversine, haversine_to_many, nearest_haversine, to_unit_vectors, chord_radius
+from poc_common.columnar import read_table, write_table, table_columns
+from poc_common.neighborhood_store import NeighborhoodStore, group_digests, neighborhood_signatures
+from poc_common.stage_cache import file_signature, frame_digest, params_digest, source_digest
+from poc_common.tiling import bounding_circle, map_bounded
 
 # POI categories
 POI_CATEGORIES = {
@@ -9,21 +19,20 @@ POI_CATEGORIES = {
     'green_spaces': 'Parks & Green Spaces'
 }
 
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance in meters between two points
-    on the earth (specified in decimal degrees)
-    """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+# Columns loaded from the sample and POI tables (geometry_wkb only when stored)
+SAMPLE_COLUMNS = ['sample_id', 'neighborhood_name', 'street_name', 'latitude', 'longitude']
+POI_COLUMNS = ['osm_id', 'name', 'poi_type', 'latitude', 'longitude']
+
+# Methods whose samples can be sharded across processes (each shard gets the POIs within its reach)
+SHARDED_METHODS = ('kdtree', 'brute_force')
 
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000  # Radius of earth in meters
-    return c * r
+# Samples per shard, and the latitude strips (degrees) along which neighborhoods are batched
+SHARD_SAMPLES = 20000
+SHARD_STRIP_DEG = 0.1
+
+# Slack on POI reach for projected (area) and spherical distances disagreeing slightly
+REACH_MARGIN = 1.01
+REACH_MARGIN_M = 10
 
 def find_nearest_poi(sample_lat, sample_lon, pois_df):
     """
@@ -39,25 +48,370 @@ def find_nearest_poi(sample_lat, sample_lon, pois_df):
     if pois_df.empty:
         return None, None
 
-    min_distance = float('inf')
-    nearest_poi = None
+    distances = haversine_to_many(sample_lon, sample_lat, pois_df['longitude'], pois_df['latitude'])
+    nearest = int(distances.argmin())
+
+    return pois_df.iloc[nearest], float(distances[nearest])
+
+class NearestPOIIndex:
+    """
+    KD-tree nearest-neighbour engine over the POIs of one category
+
+    Points are indexed as 3D unit vectors, where chord distance orders exactly
+    like great-circle distance, so the tree finds the same nearest POI as a
+    brute-force haversine scan. Near-ties are re-resolved by brute force so the
+    first POI wins, exactly like the sequential scan.
+    """
+
+    # Relative gap between the two nearest chords below which we re-check by brute force
+    TIE_TOLERANCE = 1e-9
+
+    def __init__(self, pois_df):
+        self.pois_df = pois_df
+        self.lons = pois_df['longitude'].to_numpy(dtype=float)
+        self.lats = pois_df['latitude'].to_numpy(dtype=float)
+        self.tree = cKDTree(to_unit_vectors(self.lons, self.lats))
+
+    def query(self, lons, lats):
+        """
+        Nearest POI for many points in one bulk query
+
+        Returns:
+            Tuple of (nearest_index, distance_m) arrays (positions into pois_df)
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+
+        k = min(2, len(self.lons))
+        chords, nearest_index = self.tree.query(to_unit_vectors(lons, lats), k=k)
+        if k == 2:
+            # Ties (e.g. duplicate POI locations): keep brute-force first-match semantics
+            ties = chords[:, 1] - chords[:, 0] <= self.TIE_TOLERANCE * np.maximum(chords[:, 1], 1e-12)
+            nearest_index = nearest_index[:, 0].copy()
+            for i in np.flatnonzero(ties):
+                nearest_index[i] = haversine_to_many(lons[i], lats[i], self.lons, self.lats).argmin()
+        else:
+            nearest_index = nearest_index.reshape(-1)
+
+        distances = haversine(lons, lats, self.lons[nearest_index], self.lats[nearest_index])
+        return nearest_index, distances
+
+    def nearest(self, lons, lats):
+        """
+        Nearest POI id, name, type and distance for many points
+
+        Returns:
+            DataFrame with nearest_poi_id, nearest_poi_name, nearest_poi_type, distance_m
+        """
+        nearest_index, distances = self.query(lons, lats)
+        nearest_pois = self.pois_df.iloc[nearest_index]
+
+        return pd.DataFrame({
+            'nearest_poi_id': nearest_pois['osm_id'].to_numpy(),
+            'nearest_poi_name': nearest_pois['name'].to_numpy(),
+            'nearest_poi_type': nearest_pois['poi_type'].to_numpy(),
+            'distance_m': distances
+        })
+
+def has_area_geometries(pois_df):
+    """True if the POI table carries polygon geometries (geometry_wkb from extract_pois.py)"""
+    return 'geometry_wkb' in pois_df.columns and pois_df['geometry_wkb'].notna().any()
+
+class NearestAreaIndex:
+    """
+    STRtree nearest-geometry engine for POIs with polygon geometries
+
+    Parks and woods are measured to their boundary (0 for samples inside them)
+    instead of to their centroid; point POIs in the same table stay points.
+    Everything is projected once to Lambert 72, so a bulk query_nearest over
+    all samples returns planar meters directly.
+    """
+
+    def __init__(self, pois_df):
+        from build_distance_rasters import lambert72_transformer
 
-    for _, poi in pois_df.iterrows():
-        distance = haversine(sample_lon, sample_lat, poi['longitude'], poi['latitude'])
+        self.pois_df = pois_df
+        self.transformer = lambert72_transformer()
 
-        if distance < min_distance:
-            min_distance = distance
-            nearest_poi = poi
+        geometries = shapely.points(pois_df['longitude'].to_numpy(dtype=float), pois_df['latitude'].to_numpy(dtype=float))
+        has_area = pois_df['geometry_wkb'].notna().to_numpy()
+        geometries[has_area] = shapely.from_wkb(pois_df['geometry_wkb'].to_numpy()[has_area])
 
-    return nearest_poi, min_distance
+        self.geometries = shapely.transform(geometries, self.project)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
 
-def calculate_all_distances(samples_df, pois_dict):
+    def project(self, coords):
+        x, y = self.transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    def query(self, lons, lats):
+        """
+        Nearest POI geometry for many points in one bulk query
+
+        Returns:
+            Tuple of (nearest_index, distance_m) arrays (positions into pois_df)
+        """
+        x, y = self.transformer.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        (sample_index, nearest_index), distances = self.tree.query_nearest(
+            shapely.points(x, y), return_distance=True, all_matches=True
+        )
+
+        # One match per sample, in sample order; equidistant geometries (e.g. a sample inside two
+        # overlapping parks) resolve to the first POI like the point index, whatever the tree layout
+        order = np.lexsort((nearest_index, sample_index))
+        first = order[np.unique(sample_index[order], return_index=True)[1]]
+        return nearest_index[first], distances[first]
+
+class POIReach:
+    """
+    Which POIs of one category can be the nearest one for points in a circle
+
+    Point POIs are indexed by location. Area POIs additionally carry their
+    extent (distance from their location to the farthest corner of their
+    bounding box), so a park whose centroid is further away but whose boundary
+    is close still counts. Radii get REACH_MARGIN of slack because area
+    distances are measured in Lambert 72 rather than on the sphere.
+    """
+
+    def __init__(self, pois_df):
+        self.pois_df = pois_df
+        self.lons = pois_df['longitude'].to_numpy(dtype=float)
+        self.lats = pois_df['latitude'].to_numpy(dtype=float)
+
+        self.extent = np.zeros(len(pois_df))
+        if has_area_geometries(pois_df):
+            has_area = pois_df['geometry_wkb'].notna().to_numpy()
+            bounds = shapely.bounds(shapely.from_wkb(pois_df['geometry_wkb'].to_numpy()[has_area]))
+            lons, lats = self.lons[has_area], self.lats[has_area]
+            self.extent[has_area] = np.max(
+                [haversine(lons, lats, bounds[:, x], bounds[:, y]) for x, y in ((0, 1), (0, 3), (2, 1), (2, 3))], axis=0
+            )
+
+        self.tree = cKDTree(to_unit_vectors(self.lons, self.lats)) if len(pois_df) else None
+
+    def within(self, lon, lat, radius_m):
+        """Positions (ascending) of the POIs that may lie within radius_m of a point"""
+        if self.tree is None or radius_m < 0:
+            return np.empty(0, dtype=np.int64)
+
+        radius_m = radius_m * REACH_MARGIN + REACH_MARGIN_M
+        candidates = np.sort(np.asarray(self.tree.query_ball_point(
+            to_unit_vectors(lon, lat)[0], chord_radius(radius_m + self.extent.max() + 1)
+        ), dtype=np.int64))
+        lower = haversine(lon, lat, self.lons[candidates], self.lats[candidates]) - self.extent[candidates]
+        return candidates[lower <= radius_m]
+
+    def for_circle(self, lon, lat, radius_m):
+        """
+        Positions of the POIs that can be nearest to some point within radius_m of (lon, lat)
+
+        The POI nearest to the center is at most d away, so every point in
+        the circle has a POI within radius_m + d, and its nearest POI lies
+        within 2 * radius_m + d of the center.
+        """
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        return self.within(lon, lat, self.circle_reach(lon, lat, radius_m))
+
+    def circle_reach(self, lon, lat, radius_m):
+        """Distance from (lon, lat) within which every point within radius_m of it has its nearest POI"""
+        _, nearest = self.tree.query(to_unit_vectors(lon, lat)[0])
+        bound = haversine(lon, lat, self.lons[nearest], self.lats[nearest]) + self.extent[nearest]
+        return 2 * radius_m + float(bound)
+
+def raster_nearest_poi(raster, lons, lats):
+    """
+    Nearest POI from a precomputed distance raster
+
+    The raster gives the nearest POI per cell with one gather; the distance is
+    then recomputed exactly (haversine) to that POI. Points off the raster fall
+    back to the KD-tree.
+
+    Returns:
+        Tuple of (nearest_index, distance_m) arrays (positions into raster.pois_df)
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    nearest_index, _ = raster.lookup(lons, lats)
+
+    off_grid = nearest_index < 0
+    if off_grid.any():
+        nearest_index[off_grid], _ = NearestPOIIndex(raster.pois_df).query(lons[off_grid], lats[off_grid])
+
+    pois_lons = raster.pois_df['longitude'].to_numpy(dtype=float)
+    pois_lats = raster.pois_df['latitude'].to_numpy(dtype=float)
+    distances = haversine(lons, lats, pois_lons[nearest_index], pois_lats[nearest_index])
+    return nearest_index, distances
+
+def load_raster(raster_dir, category, pois_df):
+    """
+    Distance raster of a category, checked against the POIs being measured
+
+    Raises:
+        ValueError: If the raster was built from other POIs (its nearest
+            indices would point at the wrong rows)
+    """
+    from build_distance_rasters import DistanceRaster, pois_digest
+
+    raster = DistanceRaster(raster_dir, category)
+    if raster.meta.get('pois_digest') != pois_digest(pois_df):
+        raise ValueError(
+            f"Raster for {category} in {raster_dir} was built from other POIs "
+            f"({raster.meta.get('poi_count')} vs {len(pois_df)}); rerun build_distance_rasters.py"
+        )
+    return raster
+
+def nearest_pois_by_category(samples_df, pois_dict, method='kdtree', raster_dir='data/rasters', walking_graph=None,
+                             sample_order=None, verbose=True):
+    """
+    Nearest POI of every category for a set of samples (see calculate_all_distances)
+
+    Returns:
+        List of per-category DataFrames with _sample_order (sample_order, or
+        the row position) and _category_order columns for sorting
+    """
+    sample_lons = samples_df['longitude'].to_numpy(dtype=float)
+    sample_lats = samples_df['latitude'].to_numpy(dtype=float)
+
+    category_results = []
+
+    # Nearest POI for all samples at once, one category at a time
+    for category_order, (category_key, pois_df) in enumerate(pois_dict.items()):
+        if verbose:
+            print(f"  {POI_CATEGORIES[category_key]}: {len(samples_df):,} samples × {len(pois_df):,} POIs")
+
+        category_df = pd.DataFrame({
+            'sample_id': samples_df['sample_id'].to_numpy(),
+            'neighborhood_name': samples_df['neighborhood_name'].to_numpy(),
+            'street_name': samples_df['street_name'].to_numpy(),
+            'sample_latitude': sample_lats,
+            'sample_longitude': sample_lons,
+            'category': category_key,
+            'category_name': POI_CATEGORIES[category_key]
+        })
+
+        if not pois_df.empty:
+            if method == 'raster':
+                nearest_index, distances = raster_nearest_poi(load_raster(raster_dir, category_key, pois_df),
+                                                              sample_lons, sample_lats)
+            elif method == 'network':
+                from walking_graph import multi_source_walking_distances
+
+                nearest_index, distances = multi_source_walking_distances(
+                    walking_graph,
+                    pois_df['longitude'].to_numpy(dtype=float), pois_df['latitude'].to_numpy(dtype=float),
+                    sample_lons, sample_lats
+                )
+            elif method == 'kdtree' and has_area_geometries(pois_df):
+                nearest_index, distances = NearestAreaIndex(pois_df).query(sample_lons, sample_lats)
+            elif method == 'kdtree':
+                nearest_index, distances = NearestPOIIndex(pois_df).query(sample_lons, sample_lats)
+            elif method == 'brute_force':
+                nearest_index, distances = nearest_haversine(
+                    sample_lons, sample_lats,
+                    pois_df['longitude'].to_numpy(dtype=float), pois_df['latitude'].to_numpy(dtype=float)
+                )
+            else:
+                raise ValueError(f"Unknown distance method: {method}")
+            nearest_pois = pois_df.iloc[np.maximum(nearest_index, 0)]
+
+            category_df['nearest_poi_id'] = nearest_pois['osm_id'].to_numpy()
+            category_df['nearest_poi_name'] = nearest_pois['name'].to_numpy()
+            category_df['nearest_poi_type'] = nearest_pois['poi_type'].to_numpy()
+            category_df['distance_m'] = distances
+
+            # No POI reachable over the street graph (network method only)
+            unreachable = nearest_index < 0
+            if unreachable.any():
+                category_df['nearest_poi_id'] = category_df['nearest_poi_id'].astype(object)
+                category_df['nearest_poi_type'] = category_df['nearest_poi_type'].astype(object)
+                category_df.loc[unreachable, 'nearest_poi_id'] = None
+                category_df.loc[unreachable, 'nearest_poi_name'] = 'No POI reachable'
+                category_df.loc[unreachable, 'nearest_poi_type'] = None
+                category_df.loc[unreachable, 'distance_m'] = None
+        else:
+            # No POIs found in this category (shouldn't happen with our data)
+            category_df['nearest_poi_id'] = None
+            category_df['nearest_poi_name'] = 'No POI found'
+            category_df['nearest_poi_type'] = None
+            category_df['distance_m'] = None
+
+        category_df['_sample_order'] = range(len(samples_df)) if sample_order is None else sample_order
+        category_df['_category_order'] = category_order
+        category_results.append(category_df)
+
+    return category_results
+
+def distances_for_shard(task):
+    """Pool task: nearest POIs for one shard of samples against the POIs within its reach"""
+    samples_df, pois_dict, method, sample_order = task
+    return nearest_pois_by_category(samples_df, pois_dict, method, sample_order=sample_order, verbose=False)
+
+def shard_tasks(samples_df, pois_dict, method, shard_samples=SHARD_SAMPLES):
+    """
+    Tasks of nearby neighborhoods with their samples and the POIs that can be nearest to them
+
+    Each neighborhood's samples fit in a circle around their bounding box
+    center, and POIReach.for_circle() finds the POIs that can be nearest to a
+    point in it. Neighborhoods are batched along latitude strips into tasks
+    of about shard_samples samples; a task gets the union of its
+    neighborhoods' POIs, in their original order, so ties resolve like in
+    the serial run.
+    """
+    poi_reaches = {category_key: POIReach(pois_df) for category_key, pois_df in pois_dict.items()}
+    lons = samples_df['longitude'].to_numpy(dtype=float)
+    lats = samples_df['latitude'].to_numpy(dtype=float)
+
+    neighborhoods = []
+    for positions in samples_df.groupby('neighborhood_name', sort=False, dropna=False).indices.values():
+        center_lon, center_lat, radius_m = bounding_circle(lons[positions], lats[positions])
+        neighborhoods.append((np.floor(center_lat / SHARD_STRIP_DEG), center_lon, center_lat, radius_m, positions))
+    neighborhoods.sort(key=lambda neighborhood: neighborhood[:2])
+
+    def task(batch):
+        sample_order = np.concatenate([positions for *_, positions in batch])
+        shard_pois = {}
+        for category_key, poi_reach in poi_reaches.items():
+            poi_positions = np.unique(np.concatenate([
+                poi_reach.for_circle(center_lon, center_lat, radius_m) for _, center_lon, center_lat, radius_m, _ in batch
+            ]))
+            shard_pois[category_key] = poi_reach.pois_df.iloc[poi_positions]
+        return samples_df.iloc[sample_order], shard_pois, method, sample_order
+
+    batch = []
+    batch_samples = 0
+    for neighborhood in neighborhoods:
+        batch.append(neighborhood)
+        batch_samples += len(neighborhood[-1])
+        if batch_samples >= shard_samples:
+            yield task(batch)
+            batch = []
+            batch_samples = 0
+    if batch:
+        yield task(batch)
+
+def calculate_all_distances(samples_df, pois_dict, method='kdtree', raster_dir='data/rasters', walking_graph=None,
+                            workers=1):
     """
     Calculate nearest POI distance for all sample points across all categories
 
     Args:
         samples_df: DataFrame with sample points
         pois_dict: Dictionary of {category_key: pois_df}
+        method: 'kdtree' (indexed, one tree per category; categories with
+            polygon geometries are measured to the polygon boundary),
+            'brute_force' (point POIs only), or 'raster' (lookups in rasters
+            from build_distance_rasters.py, which must have been built from
+            the same POIs; the nearest POI is exact to within about one
+            raster cell)
+        raster_dir: Directory with the precomputed rasters (method='raster')
+        walking_graph: WalkingGraph for method='network' (walking distance
+            over the OSM street graph, one multi-source sweep per category)
+        workers: Processes for 'kdtree' and 'brute_force' (1 = in-process,
+            None = all cores). Samples are sharded by neighborhood (see
+            shard_tasks) and every shard only receives the POIs within its
+            reach; the merged result is identical to the serial one
 
     Returns:
         DataFrame with distance results
@@ -65,57 +419,177 @@ def calculate_all_distances(samples_df, pois_dict):
     print(f"\nCalculating distances for {len(samples_df):,} sample points × {len(pois_dict)} categories...")
     print(f"Total distance calculations: {len(samples_df) * len(pois_dict):,}")
 
-    results = []
-    processed = 0
-
-    for _, sample in samples_df.iterrows():
-        processed += 1
-
-        # Progress indicator
-        if processed % 500 == 0:
-            print(f"  Processed {processed:,}/{len(samples_df):,} sample points ({processed/len(samples_df)*100:.1f}%)...")
-
-        sample_lat = sample['latitude']
-        sample_lon = sample['longitude']
-        sample_id = sample['sample_id']
-
-        # Calculate distance to nearest POI in each category
-        for category_key, pois_df in pois_dict.items():
-            nearest_poi, distance = find_nearest_poi(sample_lat, sample_lon, pois_df)
-
-            if nearest_poi is not None:
-                results.append({
-                    'sample_id': sample_id,
-                    'neighborhood_name': sample['neighborhood_name'],
-                    'street_name': sample['street_name'],
-                    'sample_latitude': sample_lat,
-                    'sample_longitude': sample_lon,
-                    'category': category_key,
-                    'category_name': POI_CATEGORIES[category_key],
-                    'nearest_poi_id': nearest_poi['osm_id'],
-                    'nearest_poi_name': nearest_poi['name'],
-                    'nearest_poi_type': nearest_poi['poi_type'],
-                    'distance_m': distance
-                })
-            else:
-                # No POIs found in this category (shouldn't happen with our data)
-                results.append({
-                    'sample_id': sample_id,
-                    'neighborhood_name': sample['neighborhood_name'],
-                    'street_name': sample['street_name'],
-                    'sample_latitude': sample_lat,
-                    'sample_longitude': sample_lon,
-                    'category': category_key,
-                    'category_name': POI_CATEGORIES[category_key],
-                    'nearest_poi_id': None,
-                    'nearest_poi_name': 'No POI found',
-                    'nearest_poi_type': None,
-                    'distance_m': None
-                })
-
-    print(f"  Completed: {processed:,} sample points processed")
-
-    return pd.DataFrame(results)
+    if workers != 1 and method in SHARDED_METHODS and len(samples_df) > 0:
+        workers = workers or os.cpu_count()
+        # Smaller shards when there are few samples, so every worker gets some
+        shard_samples = min(SHARD_SAMPLES, -(-len(samples_df) // (workers * 4)))
+        print(f"  Sharding neighborhoods over {workers} worker processes (~{shard_samples:,} samples per shard)...")
+
+        # Shards are built as workers free up, so only a few shard payloads exist at once
+        category_results = []
+        tasks = shard_tasks(samples_df[SAMPLE_COLUMNS], pois_dict, method, shard_samples)
+        for _, shard_results in map_bounded(distances_for_shard, tasks, workers):
+            category_results.extend(shard_results)
+    else:
+        category_results = nearest_pois_by_category(samples_df, pois_dict, method, raster_dir, walking_graph)
+
+    print(f"  Completed: {len(samples_df):,} sample points processed")
+
+    if not category_results:
+        return pd.DataFrame()
+
+    # One row per sample × category, in sample order like the per-sample loop (shards merge back the same way)
+    results = pd.concat(category_results, ignore_index=True)
+    results = results.sort_values(['_sample_order', '_category_order'], kind='stable')
+    return results.drop(columns=['_sample_order', '_category_order']).reset_index(drop=True)
+
+def poi_digest(pois_df):
+    """Digest of the POI columns that distance results depend on, independent of how the table was loaded"""
+    pois = pd.DataFrame({
+        'osm_id': pois_df['osm_id'].astype(np.int64).to_numpy(),
+        'name': pois_df['name'].astype(str).to_numpy(),
+        'poi_type': pois_df['poi_type'].astype(str).to_numpy(),
+        'latitude': pois_df['latitude'].to_numpy(dtype=float),
+        'longitude': pois_df['longitude'].to_numpy(dtype=float)
+    })
+    if 'geometry_wkb' in pois_df.columns:
+        pois['geometry_wkb'] = [wkb_hex(wkb) for wkb in pois_df['geometry_wkb']]
+    return frame_digest(pois)
+
+def wkb_hex(wkb):
+    """Lower-case hex of a WKB geometry stored as bytes or as a hex string (osmium's WKBFactory), '' if missing"""
+    if isinstance(wkb, bytes):
+        return wkb.hex()
+    if isinstance(wkb, str):
+        return wkb.lower()
+    return ''
+
+def sample_digests(samples_df):
+    """Digest of every neighborhood's sample points (sample_id is only a position and left out)"""
+    samples = pd.DataFrame({
+        'neighborhood_id': samples_df['neighborhood_id'].astype(np.int64).to_numpy(),
+        'neighborhood_name': samples_df['neighborhood_name'].astype(str).to_numpy(),
+        'street_name': samples_df['street_name'].astype(str).to_numpy(),
+        'latitude': samples_df['latitude'].to_numpy(dtype=float),
+        'longitude': samples_df['longitude'].to_numpy(dtype=float)
+    })
+    return group_digests(samples)
+
+def reach_signature(base_signature, distances_df, center, poi_reaches):
+    """
+    Signature of a neighborhood's distances given its stored results
+
+    Any POI nearer to a sample than its current nearest POI lies within
+    (sample offset from center + nearest distance) of the center, since
+    walking and boundary distances are never shorter than straight-line ones.
+    Only POIs within that reach can therefore change the result, so adding a
+    neighborhood elsewhere (which adds POIs around it) keeps this one valid.
+    """
+    lon, lat = center
+    reach = {}
+    if not distances_df.empty:
+        offsets = haversine(lon, lat, distances_df['sample_longitude'].to_numpy(dtype=float),
+                            distances_df['sample_latitude'].to_numpy(dtype=float))
+        nearest = pd.to_numeric(distances_df['distance_m'], errors='coerce').fillna(np.inf).to_numpy()
+        reach = pd.Series(offsets + nearest).groupby(distances_df['category'].to_numpy()).max().to_dict()
+
+    digests = {
+        category_key: poi_digest(poi_reach.pois_df.iloc[poi_reach.within(lon, lat, reach.get(category_key, -np.inf))])
+        for category_key, poi_reach in poi_reaches.items()
+    }
+    return params_digest([base_signature, digests])
+
+def distance_code(method):
+    """Digest of the source of the code computing distances with method"""
+    code = [calculate_all_distances, haversine, read_table, NeighborhoodStore, bounding_circle]
+    if method == 'raster':
+        from build_distance_rasters import DistanceRaster
+        code.append(DistanceRaster)
+    elif method == 'network':
+        from walking_graph import multi_source_walking_distances
+        code.append(multi_source_walking_distances)
+    return source_digest(code)
+
+def raster_signatures(raster_dir):
+    """Signatures of the raster files (a rebuild changes them)"""
+    if not os.path.isdir(raster_dir):
+        return [file_signature(raster_dir)]
+    return [file_signature(os.path.join(raster_dir, name)) for name in sorted(os.listdir(raster_dir))]
+
+def calculate_distances_incremental(samples_df, pois_dict, neighborhoods_df, store_dir, method='kdtree',
+                                    raster_dir='data/rasters', walking_graph=None, params=None, workers=1):
+    """
+    calculate_all_distances() that only recomputes new or changed neighborhoods
+
+    Distances are kept per neighborhood in store_dir. A neighborhood is
+    recomputed when its samples, a POI within its reach (see
+    reach_signature()) or the source of the distance code changes; the
+    reassembled table matches a full run.
+
+    Args:
+        samples_df: Sample points, including neighborhood_id
+        pois_dict: Dictionary of {category_key: pois_df}
+        neighborhoods_df: Neighborhoods (centers anchor the POI reach)
+        store_dir: Directory with the per-neighborhood results
+        method, raster_dir, walking_graph, workers: As for calculate_all_distances()
+        params: Extra JSON-serializable inputs of the result (e.g. the walking graph source)
+
+    Returns:
+        Tuple of (DataFrame with distance results, recomputed neighborhood ids)
+    """
+    store = NeighborhoodStore(store_dir)
+    if method == 'raster':
+        params = {**(params or {}), 'rasters': raster_signatures(raster_dir)}
+
+    base = neighborhood_signatures(
+        neighborhoods_df[neighborhoods_df['id'].isin(samples_df['neighborhood_id'])],
+        {'method': method, 'categories': list(pois_dict), 'params': params, 'code': distance_code(method)},
+        upstream=sample_digests(samples_df)
+    )
+    centers = neighborhoods_df.drop_duplicates('id').set_index('id')[['longitude', 'latitude']]
+    poi_reaches = {category_key: POIReach(pois_df) for category_key, pois_df in pois_dict.items()}
+
+    tables = {nbh_id: read_table(store.table_path(nbh_id)) for nbh_id in base if store.has_table(nbh_id)}
+    signatures = {
+        nbh_id: reach_signature(signature, tables[nbh_id], centers.loc[nbh_id], poi_reaches) if nbh_id in tables else signature
+        for nbh_id, signature in base.items()
+    }
+    stale = store.stale(signatures)
+    print(f"Neighborhoods recomputed: {len(stale)} of {len(signatures)} (others loaded from {store_dir})")
+
+    if stale:
+        stale_samples = samples_df[samples_df['neighborhood_id'].isin(stale)]
+        stale_df = calculate_all_distances(stale_samples, pois_dict, method, raster_dir, walking_graph, workers)
+
+        # One row per sample and category, sample-major: tag rows with their neighborhood and local sample index
+        repeats = len(pois_dict)
+        stale_df['neighborhood_id'] = np.repeat(stale_samples['neighborhood_id'].to_numpy(), repeats)
+        stale_df['sample_index'] = np.repeat(stale_samples.groupby('neighborhood_id').cumcount().to_numpy(), repeats)
+
+        new_tables = {nbh_id: stale_df[stale_df['neighborhood_id'] == nbh_id].reset_index(drop=True) for nbh_id in stale}
+        store.save(new_tables, {
+            nbh_id: reach_signature(base[nbh_id], table, centers.loc[nbh_id], poi_reaches)
+            for nbh_id, table in new_tables.items()
+        })
+        tables.update(new_tables)
+
+    tables = [tables[nbh_id] for nbh_id in base if len(tables[nbh_id].columns)]
+    if not tables:
+        return pd.DataFrame(), stale
+    distances_df = pd.concat(tables, ignore_index=True)
+
+    # Back to sample order (current sample ids), then category order, as in a full run
+    sample_keys = pd.MultiIndex.from_arrays([samples_df['neighborhood_id'].to_numpy(),
+                                             samples_df.groupby('neighborhood_id').cumcount().to_numpy()])
+    row_keys = pd.MultiIndex.from_arrays([distances_df['neighborhood_id'].to_numpy(),
+                                          distances_df['sample_index'].to_numpy()])
+    sample_position = sample_keys.get_indexer(row_keys)
+    category_position = distances_df['category'].map({key: i for i, key in enumerate(pois_dict)}).to_numpy()
+    order = np.lexsort((category_position, sample_position))
+
+    distances_df = distances_df.iloc[order].reset_index(drop=True)
+    distances_df['sample_id'] = samples_df['sample_id'].to_numpy()[sample_position[order]]
+    return distances_df.drop(columns=['neighborhood_id', 'sample_index']), stale
 
 def main():
     print("=" * 70)
@@ -123,17 +597,25 @@ def main():
     print("=" * 70)
 
     # Configuration
-    SAMPLES_FILE = "data/samples/street_samples.csv"
+    SAMPLES_FILE = "data/samples/street_samples.parquet"
     POI_FILES = {
-        'supermarkets': 'data/pois/supermarkets.csv',
-        'pt_stops': 'data/pois/pt_stops.csv',
-        'green_spaces': 'data/pois/green_spaces.csv'
+        'supermarkets': 'data/pois/supermarkets.parquet',
+        'pt_stops': 'data/pois/pt_stops.parquet',
+        'green_spaces': 'data/pois/green_spaces.parquet'
     }
-    OUTPUT_FILE = "results/distances_per_sample.csv"
+    OUTPUT_FILE = "results/distances_per_sample.parquet"
+    EXPORT_CSV = False  # Also write a .csv copy of the distances
+    DISTANCE_METHOD = "kdtree"  # 'kdtree' (straight line), 'network' (walking), 'raster', 'brute_force'
+    OSM_FILE = "../poc_smartscore/data/belgium-latest.osm.pbf"  # Street graph for 'network'
+    GRAPH_DIR = "data/graph"  # Cached walking graph (rebuilt when the OSM file changes)
+    NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
+    NEIGHBORHOOD_STORE_DIR = "results/distances_by_neighborhood"  # Per-neighborhood results (None = compute all)
+    WORKERS = os.cpu_count()  # Processes sharding the samples by neighborhood (1 = serial)
 
     # Load sample points
     print("\n1. Loading sample points...")
-    samples_df = pd.read_csv(SAMPLES_FILE)
+    sample_columns = SAMPLE_COLUMNS + (['neighborhood_id'] if NEIGHBORHOOD_STORE_DIR else [])
+    samples_df = read_table(SAMPLES_FILE, columns=sample_columns)
     print(f"   Loaded {len(samples_df):,} sample points")
 
     # Load POIs
@@ -141,21 +623,39 @@ def main():
     pois_dict = {}
     total_pois = 0
     for category_key, file_path in POI_FILES.items():
-        pois_df = pd.read_csv(file_path)
+        columns = POI_COLUMNS + [column for column in ['geometry_wkb'] if column in table_columns(file_path)]
+        pois_df = read_table(file_path, columns=columns)
         pois_dict[category_key] = pois_df
         total_pois += len(pois_df)
         print(f"   - {POI_CATEGORIES[category_key]}: {len(pois_df)} POIs")
     print(f"   Total POIs: {total_pois}")
 
+    # Walking graph for network distances
+    walking_graph = None
+    graph_source = None
+    if DISTANCE_METHOD == 'network':
+        from walking_graph import load_or_build_walking_graph, source_signature
+
+        walking_graph = load_or_build_walking_graph(OSM_FILE, GRAPH_DIR)
+        graph_source = source_signature(OSM_FILE)
+
     # Calculate distances
-    print("\n3. Calculating distances...")
-    distances_df = calculate_all_distances(samples_df, pois_dict)
+    print(f"\n3. Calculating distances (method: {DISTANCE_METHOD})...")
+    if NEIGHBORHOOD_STORE_DIR:
+        neighborhoods_df = pd.read_csv(NEIGHBORHOODS_FILE)
+        distances_df, _ = calculate_distances_incremental(
+            samples_df, pois_dict, neighborhoods_df, NEIGHBORHOOD_STORE_DIR, method=DISTANCE_METHOD,
+            walking_graph=walking_graph, params={'graph_source': graph_source}, workers=WORKERS
+        )
+    else:
+        distances_df = calculate_all_distances(samples_df, pois_dict, method=DISTANCE_METHOD,
+                                               walking_graph=walking_graph, workers=WORKERS)
 
     # Save results
     print("\n4. Saving results...")
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    distances_df.to_csv(OUTPUT_FILE, index=False)
-    print(f"   Saved to: {OUTPUT_FILE}")
+    saved_file = write_table(distances_df, OUTPUT_FILE, csv_export=EXPORT_CSV)
+    print(f"   Saved to: {saved_file}")
 
     # Statistics
     print("\n" + "=" * 70)
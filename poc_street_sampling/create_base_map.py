@@ -1,6 +1,10 @@
 import folium
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import read_table
 
 def create_base_map(neighborhoods_df, samples_df, output_file="street_sampling_map.html"):
     """
@@ -119,7 +123,7 @@ def main():
 
     # Configuration
     NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
-    SAMPLES_FILE = "data/samples/street_samples.csv"
+    SAMPLES_FILE = "data/samples/street_samples.parquet"
     OUTPUT_FILE = "street_sampling_map.html"
 
     # Load data
@@ -129,7 +133,7 @@ def main():
     print(f"   Loaded {len(neighborhoods_df)} neighborhoods")
 
     print(f"   Reading sample points from: {SAMPLES_FILE}")
-    samples_df = pd.read_csv(SAMPLES_FILE)
+    samples_df = read_table(SAMPLES_FILE)
     print(f"   Loaded {len(samples_df):,} sample points")
 
     # Create map
@@ -1,6 +1,10 @@
 import folium
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import read_table
 
 # POI category styling
 POI_STYLES = {
@@ -181,13 +185,13 @@ def main():
 
     # Configuration
     NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
-    SAMPLES_FILE = "data/samples/street_samples.csv"
+    SAMPLES_FILE = "data/samples/street_samples.parquet"
     OUTPUT_FILE = "street_sampling_map.html"
 
     POI_FILES = {
-        'supermarkets': 'data/pois/supermarkets.csv',
-        'pt_stops': 'data/pois/pt_stops.csv',
-        'green_spaces': 'data/pois/green_spaces.csv'
+        'supermarkets': 'data/pois/supermarkets.parquet',
+        'pt_stops': 'data/pois/pt_stops.parquet',
+        'green_spaces': 'data/pois/green_spaces.parquet'
     }
 
     # Load data
@@ -198,14 +202,14 @@ def main():
     print(f"   Loaded {len(neighborhoods_df)} neighborhoods")
 
     print(f"   Reading sample points from: {SAMPLES_FILE}")
-    samples_df = pd.read_csv(SAMPLES_FILE)
+    samples_df = read_table(SAMPLES_FILE)
     print(f"   Loaded {len(samples_df):,} sample points")
 
     print(f"   Reading POIs...")
     pois_dict = {}
     total_pois = 0
     for category_key, file_path in POI_FILES.items():
-        pois_df = pd.read_csv(file_path)
+        pois_df = read_table(file_path)
         pois_dict[category_key] = pois_df
         total_pois += len(pois_df)
         print(f"     - {POI_STYLES[category_key]['name']}: {len(pois_df)} POIs")
@@ -1,7 +1,16 @@
 import osmium
 import pandas as pd
+import numpy as np
 import os
-from math import radians, cos, sin, asin, sqrt
+import sys
+import shapely
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import haversine_to_many, LocalProjection
+from poc_common.columnar import write_table
+from poc_common.osm_filters import tag_filter, AREA_POI_ENTITIES
+from poc_common.pbf_blocks import split_pbf, map_block_groups
 
 # POI categories for the street sampling POC (3 categories only)
 POI_CATEGORIES = {
@@ -19,6 +28,7 @@ POI_CATEGORIES = {
     },
     'green_spaces': {
         'name': 'Parks & Green Spaces',
+        'areas': True,  # Mostly mapped as closed ways and multipolygons
         'filters': [
             ('leisure', ['park', 'garden', 'dog_park']),
             ('natural', ['wood']),
@@ -27,39 +37,38 @@ POI_CATEGORIES = {
     }
 }
 
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance in meters between two points
-    on the earth (specified in decimal degrees)
-    """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000  # Radius of earth in meters
-    return c * r
-
-def point_within_any_neighborhood(lon, lat, neighborhoods_df, radius_m):
+def point_within_any_neighborhood(lon, lat, centers_lon, centers_lat, radius_m):
     """
     Check if a point is within radius of ANY neighborhood center
 
     Args:
         lon, lat: Point coordinates
-        neighborhoods_df: DataFrame with neighborhood centers
+        centers_lon, centers_lat: Arrays of neighborhood centers
         radius_m: Radius in meters
 
     Returns:
         True if within radius of at least one neighborhood
     """
-    for _, neighborhood in neighborhoods_df.iterrows():
-        distance = haversine(lon, lat, neighborhood['longitude'], neighborhood['latitude'])
-        if distance <= radius_m:
-            return True
-    return False
+    return bool((haversine_to_many(lon, lat, centers_lon, centers_lat) <= radius_m).any())
+
+def area_distances(geometry, centers_lon, centers_lat):
+    """
+    Distance in meters from an area to each neighborhood center
+
+    Distances are measured to the polygon itself (0 inside it) in a local
+    metric frame around the area, so large parks whose centroid lies far away
+    but whose edge is close count as close.
+    """
+    centroid = geometry.centroid
+    projection = LocalProjection(centroid.x, centroid.y)
+    projected = shapely.transform(geometry, lambda coords: np.column_stack(projection.project(coords[:, 0], coords[:, 1])))
+    x, y = projection.project(centers_lon, centers_lat)
+
+    return shapely.distance(projected, shapely.points(x, y))
+
+def area_within_any_neighborhood(geometry, centers_lon, centers_lat, radius_m):
+    """Check if any part of an area is within radius of ANY neighborhood center"""
+    return bool((area_distances(geometry, centers_lon, centers_lat) <= radius_m).any())
 
 class POIExtractor(osmium.SimpleHandler):
     def __init__(self, category_key, filters, neighborhoods_df, radius_m=2000):
@@ -67,6 +76,8 @@ class POIExtractor(osmium.SimpleHandler):
         self.category_key = category_key
         self.filters = filters
         self.neighborhoods_df = neighborhoods_df
+        self.centers_lon = neighborhoods_df['longitude'].to_numpy(dtype=float)
+        self.centers_lat = neighborhoods_df['latitude'].to_numpy(dtype=float)
         self.radius_m = radius_m
         self.pois = []
         self.processed = 0
@@ -81,43 +92,44 @@ class POIExtractor(osmium.SimpleHandler):
     def extract_poi(self, obj):
         """Extract POI information from OSM object"""
         if self.matches_filter(obj.tags):
-            # Get location (only process nodes for simplicity)
+            # Point POIs (nodes) only; areas come in through area()
             if hasattr(obj, 'location'):
                 lat = obj.location.lat
                 lon = obj.location.lon
             else:
-                # Skip ways/areas for now (would need centroid calculation)
                 return
 
             # Check if within radius of any neighborhood
-            if not point_within_any_neighborhood(lon, lat, self.neighborhoods_df, self.radius_m):
+            if not point_within_any_neighborhood(lon, lat, self.centers_lon, self.centers_lat, self.radius_m):
                 return
 
-            # Extract relevant tags
-            name = obj.tags.get('name', 'Unnamed')
-            osm_type = 'node'
-            osm_id = obj.id
-
-            # Get specific type from tags
-            poi_type = None
-            for key, values in self.filters:
-                if key in obj.tags:
-                    poi_type = f"{key}={obj.tags[key]}"
-                    break
-
-            self.pois.append({
-                'osm_type': osm_type,
-                'osm_id': osm_id,
-                'name': name,
-                'latitude': lat,
-                'longitude': lon,
-                'poi_type': poi_type,
-                'category': self.category_key
-            })
-
-            if len(self.pois) % 100 == 0:
-                print(f"  {self.category_key}: Found {len(self.pois)} POIs...")
+            self.add_poi('node', obj.id, obj.tags, lat, lon)
+
+        self.count_processed()
 
+    def poi_type(self, tags):
+        """Specific type from the first filter key present in the tags"""
+        for key, values in self.filters:
+            if key in tags:
+                return f"{key}={tags[key]}"
+        return None
+
+    def add_poi(self, osm_type, osm_id, tags, lat, lon, geometry_wkb=None):
+        self.pois.append({
+            'osm_type': osm_type,
+            'osm_id': osm_id,
+            'name': tags.get('name', 'Unnamed'),
+            'latitude': lat,
+            'longitude': lon,
+            'poi_type': self.poi_type(tags),
+            'category': self.category_key,
+            'geometry_wkb': geometry_wkb
+        })
+
+        if len(self.pois) % 100 == 0:
+            print(f"  {self.category_key}: Found {len(self.pois)} POIs...")
+
+    def count_processed(self):
         self.processed += 1
         if self.processed % 1000000 == 0:
             print(f"  {self.category_key}: Processed {self.processed:,} objects...")
@@ -125,26 +137,88 @@ class POIExtractor(osmium.SimpleHandler):
     def node(self, n):
         self.extract_poi(n)
 
-def extract_category_pois(osm_file, category_key, category_info, neighborhoods_df, radius_m=2000):
-    """Extract POIs for a specific category"""
-    print(f"\nExtracting {category_info['name']}...")
-    print(f"  Radius: {radius_m}m around {len(neighborhoods_df)} neighborhoods")
+class AreaPOIExtractor(POIExtractor):
+    """
+    POI extractor that also assembles closed ways and multipolygon relations
 
-    handler = POIExtractor(category_key, category_info['filters'], neighborhoods_df, radius_m)
-    handler.apply_file(osm_file)
+    Areas are stored with their full geometry (hex WKB) and their centroid as
+    latitude/longitude, so point-based consumers keep working while distance
+    calculations can measure to the polygon boundary.
+    """
 
-    print(f"  Found {len(handler.pois)} POIs")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wkb_factory = osmium.geom.WKBFactory()
 
+    def area(self, a):
+        if self.matches_filter(a.tags):
+            try:
+                geometry_wkb = self.wkb_factory.create_multipolygon(a)
+            except RuntimeError:
+                # Broken or incomplete ring in the extract
+                return
+            geometry = shapely.from_wkb(geometry_wkb)
+
+            if area_within_any_neighborhood(geometry, self.centers_lon, self.centers_lat, self.radius_m):
+                centroid = geometry.centroid
+                osm_type = 'way' if a.from_way() else 'relation'
+                self.add_poi(osm_type, a.orig_id(), a.tags, centroid.y, centroid.x, geometry_wkb)
+
+        self.count_processed()
+
+def extract_category_pois_in_blocks(buffer, category_key, filters, neighborhoods_df, radius_m):
+    """Pool task: point POIs of one category in one range of PBF blocks"""
+    handler = POIExtractor(category_key, filters, neighborhoods_df, radius_m)
+    handler.apply_file(buffer, filters=[tag_filter(filters)])
     return handler.pois
 
-def save_to_csv(pois, output_file):
-    """Save POIs to CSV file"""
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+def extract_category_pois(osm_file, category_key, category_info, neighborhoods_df, radius_m=2000, workers=1):
+    """
+    Extract POIs for a specific category
+
+    Point categories can decode PBF blocks in a process pool (workers != 1,
+    None = all cores). Area categories always run serially: multipolygon
+    assembly needs ways and relations from across the whole file.
+    """
+    print(f"\nExtracting {category_info['name']}...")
+    print(f"  Radius: {radius_m}m around {len(neighborhoods_df)} neighborhoods")
+
+    # Tag filters run in osmium, so only matching objects reach the Python callbacks
+    if category_info.get('areas'):
+        # Area assembly needs node locations and an extra pass over the relations
+        handler = AreaPOIExtractor(category_key, category_info['filters'], neighborhoods_df, radius_m)
+        handler.apply_file(osm_file, locations=True,
+                           filters=[tag_filter(category_info['filters'], AREA_POI_ENTITIES)])
+        pois = handler.pois
+    elif workers == 1:
+        handler = POIExtractor(category_key, category_info['filters'], neighborhoods_df, radius_m)
+        handler.apply_file(osm_file, filters=[tag_filter(category_info['filters'])])
+        pois = handler.pois
+    else:
+        header_bytes, groups, _ = split_pbf(osm_file, workers)
+        worker = partial(extract_category_pois_in_blocks, category_key=category_key, filters=category_info['filters'],
+                         neighborhoods_df=neighborhoods_df, radius_m=radius_m)
+        pois = [poi for result in map_block_groups(osm_file, worker, groups, header_bytes, workers) for poi in result]
+
+    print(f"  Found {len(pois)} POIs")
+
+    return pois
+
+def save_pois(pois, output_file, csv_export=False):
+    """
+    Save POIs as a columnar table (optionally with a CSV copy)
 
+    Returns:
+        DataFrame as written
+    """
     df = pd.DataFrame(pois)
-    df.to_csv(output_file, index=False)
+    if 'geometry_wkb' in df.columns and df['geometry_wkb'].isna().all():
+        df = df.drop(columns=['geometry_wkb'])
+    saved_file = write_table(df, output_file, csv_export=csv_export)
+
+    print(f"  Saved to {saved_file}")
 
-    print(f"  Saved to {output_file}")
+    return df
 
 def main():
     print("=" * 70)
@@ -156,6 +230,8 @@ def main():
     NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
     OUTPUT_DIR = "data/pois"
     RADIUS_M = 2000  # 2km radius for broader context
+    WORKERS = os.cpu_count()  # Processes decoding PBF blocks (1 = serial)
+    EXPORT_CSV = False  # Also write a .csv copy of every POI table
 
     print("\nPOC Categories (3 simplified categories):")
     for key, info in POI_CATEGORIES.items():
@@ -171,12 +247,12 @@ def main():
     all_pois = {}
 
     for category_key, category_info in POI_CATEGORIES.items():
-        pois = extract_category_pois(OSM_FILE, category_key, category_info, neighborhoods_df, RADIUS_M)
+        pois = extract_category_pois(OSM_FILE, category_key, category_info, neighborhoods_df, RADIUS_M, WORKERS)
         all_pois[category_key] = pois
 
-        # Save to CSV
-        output_file = os.path.join(OUTPUT_DIR, f"{category_key}.csv")
-        save_to_csv(pois, output_file)
+        # Save as columnar table
+        output_file = os.path.join(OUTPUT_DIR, f"{category_key}.parquet")
+        save_pois(pois, output_file, EXPORT_CSV)
 
     # Summary
     print("\n" + "=" * 70)
@@ -205,7 +281,7 @@ def main():
     print("=" * 70)
     print("\nFiles created:")
     for category_key in POI_CATEGORIES.keys():
-        output_file = os.path.join(OUTPUT_DIR, f"{category_key}.csv")
+        output_file = os.path.join(OUTPUT_DIR, f"{category_key}.parquet")
         print(f"  - {output_file}")
 
 if __name__ == "__main__":
@@ -1,49 +1,338 @@
 import osmium
+import numpy as np
 import pandas as pd
+import shapely
 import json
 import os
-from math import radians, cos, sin, asin, sqrt
+import sys
+from array import array
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import haversine, to_unit_vectors, chord_radius
+from poc_common.osm_filters import highway_filter
+from poc_common.pbf_blocks import split_pbf, map_block_groups
+from poc_common.neighborhood_store import (
+    NeighborhoodStore, neighborhood_positions, neighborhood_signatures, update_neighborhoods
+)
+from poc_common.stage_cache import file_signature, source_digest
+
+try:
+    import geopandas as gpd
+except ImportError:
+    gpd = None
 
 # Street types to extract (residential streets where people live)
 STREET_TYPES = ['residential', 'tertiary', 'living_street']
 
-def haversine(lon1, lat1, lon2, lat2):
+# Way tags the pipeline actually uses (everything else is dropped at extraction)
+STREET_TAGS = ['highway', 'name']
+
+# Osmium fixed-point coordinate precision (int32 coordinates, 1e-7 degrees)
+COORDINATE_PRECISION = 10000000
+
+# Street attributes written as GeoJSON / FlatGeobuf properties
+FEATURE_PROPERTIES = ['osm_id', 'name', 'highway_type', 'neighborhood_id', 'neighborhood_name', 'city']
+
+# FlatGeobuf attribute holding the original feature position (the spatial index reorders features)
+FEATURE_ORDER_COLUMN = 'feature_order'
+
+# Max node-to-center distance evaluations per batch in process_streets
+ASSIGNMENT_BATCH_SIZE = 2000000
+
+def concatenated_ranges(starts, ends):
+    """Concatenate np.arange(start, end) for every (start, end) pair without a Python loop"""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    group_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + np.arange(total) - group_starts
+
+def assign_streets_to_neighborhoods(way_offsets, lons, lats, centers_lon, centers_lat, radius_m):
     """
-    Calculate the great circle distance in meters between two points
-    on the earth (specified in decimal degrees)
+    Find every (way, neighborhood) pair where any node of the way lies within the radius
+
+    Prefilters candidates with a KD-tree over neighborhood centers using each
+    way's bounding box, then runs one batched haversine test over the nodes of
+    the candidate pairs only.
+
+    Args:
+        way_offsets: int array of length n_ways + 1 delimiting each way's nodes
+        lons, lats: Flattened node coordinates of all ways
+        centers_lon, centers_lat: Neighborhood centers
+        radius_m: Radius in meters
+
+    Returns:
+        Tuple of (way_index, neighborhood_index) arrays, sorted by way then neighborhood
     """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000  # Radius of earth in meters
-    return c * r
-
-def point_within_radius(point_lon, point_lat, center_lon, center_lat, radius_m):
-    """Check if a point is within radius of center"""
-    distance = haversine(point_lon, point_lat, center_lon, center_lat)
-    return distance <= radius_m
-
-def street_intersects_radius(node_coords, center_lon, center_lat, radius_m):
+    from scipy.spatial import cKDTree
+
+    n_ways = len(way_offsets) - 1
+    if n_ways == 0 or len(centers_lon) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    starts = way_offsets[:-1]
+
+    # Per-way bounding box and the radius of a circle around its center that covers it
+    min_lon = np.minimum.reduceat(lons, starts)
+    max_lon = np.maximum.reduceat(lons, starts)
+    min_lat = np.minimum.reduceat(lats, starts)
+    max_lat = np.maximum.reduceat(lats, starts)
+    mid_lon = (min_lon + max_lon) / 2
+    mid_lat = (min_lat + max_lat) / 2
+    half_diagonal = np.maximum(
+        haversine(mid_lon, mid_lat, max_lon, max_lat),
+        haversine(mid_lon, mid_lat, max_lon, min_lat)
+    )
+
+    # Spatial prefilter: neighborhood centers near each way's bounding box
+    tree = cKDTree(to_unit_vectors(centers_lon, centers_lat))
+    search_radius = chord_radius((radius_m + half_diagonal) * 1.01 + 1)
+    candidates = tree.query_ball_point(to_unit_vectors(mid_lon, mid_lat), search_radius)
+
+    candidate_counts = np.fromiter((len(c) for c in candidates), dtype=np.int64, count=n_ways)
+    pair_way = np.repeat(np.arange(n_ways), candidate_counts)
+    pair_nbh = np.fromiter((i for c in candidates for i in c), dtype=np.int64, count=int(candidate_counts.sum()))
+
+    # Exact test, batched over candidate pairs to cap memory
+    matched = np.zeros(len(pair_way), dtype=bool)
+    pair_sizes = way_offsets[pair_way + 1] - way_offsets[pair_way]
+    batch_start = 0
+    while batch_start < len(pair_way):
+        cumulative = np.cumsum(pair_sizes[batch_start:])
+        batch_end = batch_start + max(1, int(np.searchsorted(cumulative, ASSIGNMENT_BATCH_SIZE, side='right')))
+        batch = slice(batch_start, batch_end)
+
+        node_index = concatenated_ranges(way_offsets[pair_way[batch]], way_offsets[pair_way[batch] + 1])
+        nbh_index = np.repeat(pair_nbh[batch], pair_sizes[batch])
+        distances = haversine(lons[node_index], lats[node_index], centers_lon[nbh_index], centers_lat[nbh_index])
+
+        group_starts = np.cumsum(pair_sizes[batch]) - pair_sizes[batch]
+        matched[batch] = np.minimum.reduceat(distances, group_starts) <= radius_m
+        batch_start = batch_end
+
+    pair_way = pair_way[matched]
+    pair_nbh = pair_nbh[matched]
+    order = np.lexsort((pair_nbh, pair_way))
+    return pair_way[order], pair_nbh[order]
+
+def node_location_index(index_file=None):
     """
-    Check if any point of the street (way) is within the radius
+    Build the osmium location index spec used to resolve way node coordinates
+
+    Osmium stores locations as int64 ids with fixed-point int32 coordinates.
+    With an index file the store is memory-mapped on disk, so peak memory stays
+    flat as the extract grows; without one it falls back to an in-memory index.
 
     Args:
-        node_coords: List of (lon, lat) tuples representing the street's nodes
-        center_lon, center_lat: Center point of neighborhood
-        radius_m: Radius in meters
+        index_file: Path for a file-backed index (removed first if it exists)
+
+    Returns:
+        Index spec string for SimpleHandler.apply_file(idx=...)
+    """
+    if index_file is None:
+        return 'flex_mem'
+
+    os.makedirs(os.path.dirname(index_file) or '.', exist_ok=True)
+    if os.path.exists(index_file):
+        os.remove(index_file)
+
+    return f'sparse_file_array,{index_file}'
+
+def street_tags(tags):
+    """Keep only the way tags used downstream (see STREET_TAGS)"""
+    return {key: tags[key] for key in STREET_TAGS if key in tags}
+
+def collect_candidate_ways(osm_file, highway_types=STREET_TYPES):
+    """
+    Way-first pass 1: collect candidate streets and the node ids they reference
+
+    Only ways are decoded. Node references are stored as one flat int64 array
+    with per-way offsets, and the referenced ids are tracked in osmium's
+    IdTracker (a compact bitset) so pass 2 can skip every other node.
+
+    Args:
+        osm_file: Path to OSM PBF file (or an osmium.io.FileBuffer of blocks)
+        highway_types: highway=* values to keep (default: residential STREET_TYPES)
+
+    Returns:
+        Tuple of (way_ids, way_tags, refs, offsets, tracker)
+    """
+    way_ids = []
+    way_tags = []
+    refs = array('q')
+    offsets = array('q', [0])
+    tracker = osmium.IdTracker()
+
+    # Non-street ways are dropped inside osmium before reaching Python
+    for w in osmium.FileProcessor(osm_file, osmium.osm.WAY).with_filter(highway_filter(highway_types)):
+        way_ids.append(w.id)
+        way_tags.append(street_tags(w.tags))
+        refs.extend(n.ref for n in w.nodes)
+        offsets.append(len(refs))
+        tracker.add_references(w)
+
+        if len(way_ids) % 5000 == 0:
+            print(f"  Found {len(way_ids)} potential streets...")
+
+    refs = np.frombuffer(refs, dtype=np.int64) if len(refs) else np.empty(0, dtype=np.int64)
+    return way_ids, way_tags, refs, np.frombuffer(offsets, dtype=np.int64), tracker
+
+def read_node_locations(osm_file, id_filter):
+    """
+    Coordinates of the nodes passing id_filter
+
+    Returns:
+        Tuple of (node_ids, x, y) sorted by node id, with fixed-point int32 coordinates
+    """
+    node_ids = array('q')
+    xs = array('i')
+    ys = array('i')
+
+    for n in osmium.FileProcessor(osm_file, osmium.osm.NODE).with_filter(id_filter):
+        node_ids.append(n.id)
+        xs.append(n.location.x)
+        ys.append(n.location.y)
+
+    node_ids = np.array(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids, kind='stable')
+    return node_ids[order], np.array(xs, dtype=np.int32)[order], np.array(ys, dtype=np.int32)[order]
+
+def resolve_referenced_nodes(osm_file, tracker):
+    """
+    Way-first pass 2: read coordinates only for nodes referenced by candidate ways
+
+    Returns:
+        Tuple of (node_ids, x, y) sorted by node id, with fixed-point int32 coordinates
+    """
+    node_ids, xs, ys = read_node_locations(osm_file, tracker.id_filter())
+    print(f"  Resolved {len(node_ids):,} referenced node locations")
+    return node_ids, xs, ys
+
+# Node id filter of the current pool process (set by init_node_worker)
+_node_filter = None
+
+def init_node_worker(node_ids):
+    """Build the referenced-node filter once per pool process"""
+    global _node_filter
+    _node_filter = osmium.filter.IdFilter(node_ids).enable_for(osmium.osm.NODE)
+
+def collect_ways_in_blocks(buffer, highway_types=STREET_TYPES):
+    """Pool task: candidate ways of one block range (without the tracker)"""
+    way_ids, way_tags, refs, offsets, _ = collect_candidate_ways(buffer, highway_types)
+    return way_ids, way_tags, refs, offsets
+
+def resolve_nodes_in_blocks(buffer):
+    """Pool task: referenced node locations of one block range"""
+    return read_node_locations(buffer, _node_filter)
+
+def collect_way_first_parallel(osm_file, highway_types=STREET_TYPES, workers=None):
+    """
+    Way-first extraction with PBF blocks decoded in a process pool
+
+    Phase A collects candidate ways per block range. Their references are
+    merged in file order, so the result matches the serial pass exactly.
+    Phase B then resolves the referenced nodes per block range; this handles
+    ways whose nodes sit in other blocks. In a file sorted by type (the
+    Sort.Type_then_ID header feature), no block after the first block range
+    with ways can hold nodes, so phase B skips those ranges.
 
     Returns:
-        True if any node is within radius
+        Tuple of (way_ids, way_tags, refs, offsets, node_ids, x, y)
+    """
+    header_bytes, groups, is_sorted = split_pbf(osm_file, workers)
+
+    print("  Phase A: candidate ways per block range...")
+    way_results = map_block_groups(
+        osm_file, partial(collect_ways_in_blocks, highway_types=highway_types), groups, header_bytes, workers
+    )
+
+    way_ids = []
+    way_tags = []
+    refs = []
+    offsets = [np.zeros(1, dtype=np.int64)]
+    first_way_group = None
+    ref_count = 0
+    for i, (group_ids, group_tags, group_refs, group_offsets) in enumerate(way_results):
+        if group_ids and first_way_group is None:
+            first_way_group = i
+        offsets.append(group_offsets[1:] + ref_count)
+        ref_count += len(group_refs)
+        way_ids.extend(group_ids)
+        way_tags.extend(group_tags)
+        refs.append(group_refs)
+    refs = np.concatenate(refs) if refs else np.empty(0, dtype=np.int64)
+    offsets = np.concatenate(offsets)
+
+    node_groups = groups
+    if is_sorted and first_way_group is not None:
+        node_groups = groups[:first_way_group + 1]
+
+    print(f"  Phase B: referenced nodes in {len(node_groups):,} block ranges...")
+    node_results = map_block_groups(
+        osm_file, resolve_nodes_in_blocks, node_groups, header_bytes, workers,
+        initializer=init_node_worker, initargs=(np.unique(refs),)
+    )
+
+    node_ids = np.concatenate([r[0] for r in node_results]) if node_results else np.empty(0, dtype=np.int64)
+    xs = np.concatenate([r[1] for r in node_results]) if node_results else np.empty(0, dtype=np.int32)
+    ys = np.concatenate([r[2] for r in node_results]) if node_results else np.empty(0, dtype=np.int32)
+    order = np.argsort(node_ids, kind='stable')
+
+    print(f"  Resolved {len(node_ids):,} referenced node locations")
+
+    return way_ids, way_tags, refs, offsets, node_ids[order], xs[order], ys[order]
+
+def collect_way_first(osm_file, highway_types=STREET_TYPES, workers=1):
     """
-    for lon, lat in node_coords:
-        if point_within_radius(lon, lat, center_lon, center_lat, radius_m):
-            return True
-    return False
+    Candidate ways and their referenced node locations (serial or parallel)
+
+    Returns:
+        Tuple of (way_ids, way_tags, refs, offsets, node_ids, x, y)
+    """
+    if workers != 1:
+        return collect_way_first_parallel(osm_file, highway_types, workers)
+
+    way_ids, way_tags, refs, offsets, tracker = collect_candidate_ways(osm_file, highway_types)
+    node_ids, xs, ys = resolve_referenced_nodes(osm_file, tracker)
+    return way_ids, way_tags, refs, offsets, node_ids, xs, ys
+
+def load_ways_way_first(osm_file, workers=1):
+    """
+    Build the candidate street list with the two-phase way-first extraction
+
+    Args:
+        osm_file: Path to OSM PBF file
+        workers: Processes decoding PBF blocks in parallel (1 = serial passes, None = all cores)
+
+    Returns:
+        List of way dicts ({'id', 'tags', 'coords'}) as consumed by process_streets
+    """
+    way_ids, way_tags, refs, offsets, node_ids, xs, ys = collect_way_first(osm_file, workers=workers)
+
+    # Look up every reference at once; unresolved nodes are dropped like before
+    positions = np.searchsorted(node_ids, refs)
+    positions = np.minimum(positions, max(len(node_ids) - 1, 0))
+    if len(node_ids):
+        found = node_ids[positions] == refs
+        lons = xs[positions] / COORDINATE_PRECISION
+        lats = ys[positions] / COORDINATE_PRECISION
+    else:
+        found = np.zeros(len(refs), dtype=bool)
+        lons = lats = np.zeros(len(refs))
+
+    ways = []
+    for i, way_id in enumerate(way_ids):
+        start, end = offsets[i], offsets[i + 1]
+        mask = found[start:end]
+        ways.append({
+            'id': way_id,
+            'tags': way_tags[i],
+            'coords': list(zip(lons[start:end][mask].tolist(), lats[start:end][mask].tolist()))
+        })
+
+    return ways
 
 class StreetExtractor(osmium.SimpleHandler):
     def __init__(self, neighborhoods_df, radius_m=1000):
@@ -51,14 +340,9 @@ class StreetExtractor(osmium.SimpleHandler):
         self.neighborhoods_df = neighborhoods_df
         self.radius_m = radius_m
         self.streets = []
-        self.node_locations = {}  # Cache node locations
         self.ways_to_process = []  # Store ways for second pass
         self.processed_ways = 0
 
-    def node(self, n):
-        """First pass: collect all node locations"""
-        self.node_locations[n.id] = (n.location.lon, n.location.lat)
-
     def way(self, w):
         """First pass: identify streets to process"""
         # Check if it's a street type we're interested in
@@ -69,11 +353,14 @@ class StreetExtractor(osmium.SimpleHandler):
         if highway_type not in STREET_TYPES:
             return
 
+        # Node locations are resolved by osmium's location index
+        node_coords = [(n.lon, n.lat) for n in w.nodes if n.location.valid()]
+
         # Store way for second pass
         self.ways_to_process.append({
             'id': w.id,
-            'tags': dict(w.tags),
-            'nodes': [n.ref for n in w.nodes]
+            'tags': street_tags(w.tags),
+            'coords': node_coords
         })
 
         if len(self.ways_to_process) % 5000 == 0:
@@ -83,54 +370,51 @@ class StreetExtractor(osmium.SimpleHandler):
         """Second pass: filter streets by proximity to neighborhoods"""
         print(f"\nProcessing {len(self.ways_to_process)} streets...")
 
-        for way_data in self.ways_to_process:
-            self.processed_ways += 1
-
-            if self.processed_ways % 5000 == 0:
-                print(f"  Processed {self.processed_ways}/{len(self.ways_to_process)} streets, found {len(self.streets)} matches...")
-
-            # Get coordinates for all nodes in this way
-            node_coords = []
-            for node_ref in way_data['nodes']:
-                if node_ref in self.node_locations:
-                    node_coords.append(self.node_locations[node_ref])
-
-            # Skip if we couldn't resolve all nodes
-            if len(node_coords) < 2:
-                continue
-
-            # Check if street intersects any neighborhood radius
-            for _, neighborhood in self.neighborhoods_df.iterrows():
-                if street_intersects_radius(
-                    node_coords,
-                    neighborhood['longitude'],
-                    neighborhood['latitude'],
-                    self.radius_m
-                ):
-                    # Street intersects this neighborhood - store it
-                    street_name = way_data['tags'].get('name', 'Unnamed')
-
-                    # Create GeoJSON LineString geometry
-                    geometry = {
-                        'type': 'LineString',
-                        'coordinates': [[lon, lat] for lon, lat in node_coords]
-                    }
-
-                    self.streets.append({
-                        'osm_id': way_data['id'],
-                        'name': street_name,
-                        'highway_type': way_data['tags']['highway'],
-                        'neighborhood_id': neighborhood['id'],
-                        'neighborhood_name': neighborhood['name'],
-                        'city': neighborhood['city'],
-                        'geometry': json.dumps(geometry)
-                    })
-
-                    # A street can intersect multiple neighborhoods, so we don't break here
+        # Skip ways whose nodes we couldn't resolve
+        ways = [way_data for way_data in self.ways_to_process if len(way_data['coords']) >= 2]
+        self.processed_ways = len(self.ways_to_process)
+
+        # Flatten all node coordinates so the assignment runs on arrays
+        way_offsets = np.zeros(len(ways) + 1, dtype=np.int64)
+        way_offsets[1:] = np.cumsum([len(way_data['coords']) for way_data in ways])
+        coords = np.array([coord for way_data in ways for coord in way_data['coords']], dtype=float).reshape(-1, 2)
+
+        nbh = self.neighborhoods_df
+        way_index, nbh_index = assign_streets_to_neighborhoods(
+            way_offsets,
+            coords[:, 0],
+            coords[:, 1],
+            nbh['longitude'].to_numpy(dtype=float),
+            nbh['latitude'].to_numpy(dtype=float),
+            self.radius_m
+        )
+
+        # A street can intersect multiple neighborhoods, so each pair is stored
+        geometries = {}
+        for i, j in zip(way_index.tolist(), nbh_index.tolist()):
+            way_data = ways[i]
+            neighborhood = nbh.iloc[j]
+
+            if i not in geometries:
+                # Create GeoJSON LineString geometry
+                geometries[i] = json.dumps({
+                    'type': 'LineString',
+                    'coordinates': [[lon, lat] for lon, lat in way_data['coords']]
+                }, separators=(',', ':'))
+
+            self.streets.append({
+                'osm_id': way_data['id'],
+                'name': way_data['tags'].get('name', 'Unnamed'),
+                'highway_type': way_data['tags']['highway'],
+                'neighborhood_id': neighborhood['id'],
+                'neighborhood_name': neighborhood['name'],
+                'city': neighborhood['city'],
+                'geometry': geometries[i]
+            })
 
         print(f"  Completed: {len(self.streets)} street segments found across all neighborhoods")
 
-def extract_streets(osm_file, neighborhoods_df, radius_m=1000):
+def extract_streets(osm_file, neighborhoods_df, radius_m=1000, node_index_file=None, mode='way_first', workers=1):
     """
     Extract street geometries near neighborhoods
 
@@ -138,6 +422,12 @@ def extract_streets(osm_file, neighborhoods_df, radius_m=1000):
         osm_file: Path to OSM PBF file
         neighborhoods_df: DataFrame with neighborhood centers
         radius_m: Radius in meters to search around each neighborhood
+        node_index_file: Optional path for a disk-backed node location index
+            (only used in 'locations' mode)
+        mode: 'way_first' (collect ways, then only their nodes) or
+            'locations' (resolve every node through osmium's location index)
+        workers: Processes decoding PBF blocks in parallel ('way_first' only;
+            1 = serial, None = all cores)
 
     Returns:
         DataFrame with street data
@@ -146,13 +436,23 @@ def extract_streets(osm_file, neighborhoods_df, radius_m=1000):
     print(f"Target street types: {', '.join(STREET_TYPES)}")
     print(f"Radius: {radius_m}m ({radius_m/1000}km)")
     print(f"Neighborhoods: {len(neighborhoods_df)}")
+    print(f"Mode: {mode}")
     print("=" * 70)
 
     handler = StreetExtractor(neighborhoods_df, radius_m)
 
-    # First pass: collect nodes and identify ways
+    # First pass: resolve node locations and identify ways
     print("\nPass 1: Reading OSM data...")
-    handler.apply_file(osm_file)
+    if mode == 'way_first':
+        handler.ways_to_process = load_ways_way_first(osm_file, workers)
+    elif mode == 'locations':
+        handler.apply_file(osm_file, locations=True, idx=node_location_index(node_index_file),
+                           filters=[highway_filter(STREET_TYPES)])
+
+        if node_index_file is not None and os.path.exists(node_index_file):
+            os.remove(node_index_file)
+    else:
+        raise ValueError(f"Unknown extraction mode: {mode}")
 
     # Second pass: filter streets by proximity
     print("\nPass 2: Filtering streets by proximity to neighborhoods...")
@@ -160,41 +460,102 @@ def extract_streets(osm_file, neighborhoods_df, radius_m=1000):
 
     return pd.DataFrame(handler.streets)
 
+def extract_streets_incremental(osm_file, neighborhoods_df, store_dir, radius_m=1000, node_index_file=None,
+                                mode='way_first', workers=1):
+    """
+    extract_streets() that only processes new or changed neighborhoods
+
+    Streets are kept per neighborhood in store_dir, signed with the
+    neighborhood's row, the radius, STREET_TYPES, the OSM file and the source
+    of the extraction code (both modes give the same streets, so the mode is
+    not part of it). Stale neighborhoods still need one pass over the PBF,
+    but the per-street work only covers them, and nothing runs when every
+    neighborhood is up to date.
+
+    Returns:
+        Tuple of (DataFrame with street data in the same order as
+        extract_streets() on all neighborhoods, recomputed neighborhood ids)
+    """
+    store = NeighborhoodStore(store_dir)
+    signatures = neighborhood_signatures(neighborhoods_df, {
+        'osm_file': file_signature(osm_file),
+        'radius_m': radius_m,
+        'street_types': STREET_TYPES,
+        'code': source_digest([extract_streets, haversine, highway_filter, split_pbf, NeighborhoodStore])
+    })
+
+    streets_df, stale = update_neighborhoods(
+        store, neighborhoods_df, signatures,
+        lambda stale_df: extract_streets(osm_file, stale_df, radius_m=radius_m, node_index_file=node_index_file,
+                                         mode=mode, workers=workers)
+    )
+    print(f"Neighborhoods recomputed: {len(stale)} of {len(signatures)} (others loaded from {store_dir})")
+
+    if streets_df.empty:
+        return streets_df, stale
+
+    # extract_streets() lists pairs by way, then neighborhood; ways come in id order in sorted PBF extracts
+    nbh_order = streets_df['neighborhood_id'].map(neighborhood_positions(neighborhoods_df))
+    order = np.lexsort((nbh_order.to_numpy(), streets_df['osm_id'].to_numpy()))
+    return streets_df.iloc[order].reset_index(drop=True), stale
+
 def save_to_geojson(streets_df, output_file):
     """
     Save streets as GeoJSON FeatureCollection
-    """
-    features = []
-
-    for _, street in streets_df.iterrows():
-        geometry = json.loads(street['geometry'])
-
-        feature = {
-            'type': 'Feature',
-            'properties': {
-                'osm_id': int(street['osm_id']),
-                'name': street['name'],
-                'highway_type': street['highway_type'],
-                'neighborhood_id': int(street['neighborhood_id']),
-                'neighborhood_name': street['neighborhood_name'],
-                'city': street['city']
-            },
-            'geometry': geometry
-        }
-        features.append(feature)
-
-    geojson = {
-        'type': 'FeatureCollection',
-        'features': features
-    }
 
+    Features are streamed to the file one per line without indentation. The
+    geometry column already holds GeoJSON strings, so it is written as-is
+    instead of being parsed and serialized again.
+    """
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
+    columns = [streets_df[column].tolist() for column in FEATURE_PROPERTIES + ['geometry']]
+
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
+        f.write('{"type":"FeatureCollection","features":[')
+        for i, (osm_id, name, highway_type, nbh_id, nbh_name, city, geometry) in enumerate(zip(*columns)):
+            properties = json.dumps({
+                'osm_id': int(osm_id),
+                'name': name,
+                'highway_type': highway_type,
+                'neighborhood_id': int(nbh_id),
+                'neighborhood_name': nbh_name,
+                'city': city
+            }, ensure_ascii=False, separators=(',', ':'))
+            f.write(f'{"," if i else ""}\n{{"type":"Feature","properties":{properties},"geometry":{geometry}}}')
+        f.write('\n]}\n')
 
     print(f"\nSaved GeoJSON to: {output_file}")
 
+def streets_to_geodataframe(streets_df):
+    """GeoDataFrame of the street features, as read back from the GeoJSON output"""
+    return gpd.GeoDataFrame(
+        streets_df[FEATURE_PROPERTIES],
+        geometry=shapely.from_geojson(streets_df['geometry'].to_numpy()),
+        crs='EPSG:4326'
+    )
+
+def save_to_flatgeobuf(streets_df, output_file):
+    """
+    Save streets as FlatGeobuf with a packed R-tree spatial index
+
+    Readers can then load only the features inside a bounding box (or matching
+    an attribute filter) without scanning the file. The index stores features
+    in spatial order, so their original position is kept in an extra
+    attribute. Skipped when geopandas is not installed.
+    """
+    if gpd is None:
+        print("geopandas not installed, skipping FlatGeobuf output")
+        return
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    streets_gdf = streets_to_geodataframe(streets_df)
+    streets_gdf[FEATURE_ORDER_COLUMN] = np.arange(len(streets_gdf), dtype=np.int64)
+    streets_gdf.to_file(output_file, driver='FlatGeobuf', SPATIAL_INDEX='YES')
+
+    print(f"Saved FlatGeobuf to: {output_file}")
+
 def save_summary_csv(streets_df, output_file):
     """
     Save summary statistics as CSV (without full geometry)
@@ -212,8 +573,13 @@ def main():
     OSM_FILE = "../poc_smartscore/data/belgium-latest.osm.pbf"  # Reuse from poc_smartscore
     NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
     OUTPUT_GEOJSON = "data/streets/residential_streets.geojson"
+    OUTPUT_FLATGEOBUF = "data/streets/residential_streets.fgb"  # Spatially indexed copy (None to skip)
     OUTPUT_CSV = "data/streets/residential_streets_summary.csv"
     RADIUS_M = 1000  # 1km radius
+    EXTRACTION_MODE = 'way_first'  # 'way_first', or 'locations' to resolve nodes through NODE_INDEX_FILE
+    NODE_INDEX_FILE = "data/streets/node_locations.idx"  # Disk-backed node location store ('locations' mode)
+    WORKERS = os.cpu_count()  # Processes decoding PBF blocks (1 = serial)
+    NEIGHBORHOOD_STORE_DIR = "data/streets/by_neighborhood"  # Per-neighborhood results (None = extract all)
 
     # Load neighborhoods
     print("\n1. Loading neighborhoods...")
@@ -222,11 +588,19 @@ def main():
 
     # Extract streets
     print("\n2. Extracting streets from OSM...")
-    streets_df = extract_streets(OSM_FILE, neighborhoods_df, radius_m=RADIUS_M)
+    if NEIGHBORHOOD_STORE_DIR:
+        streets_df, _ = extract_streets_incremental(OSM_FILE, neighborhoods_df, NEIGHBORHOOD_STORE_DIR,
+                                                    radius_m=RADIUS_M, node_index_file=NODE_INDEX_FILE,
+                                                    mode=EXTRACTION_MODE, workers=WORKERS)
+    else:
+        streets_df = extract_streets(OSM_FILE, neighborhoods_df, radius_m=RADIUS_M, node_index_file=NODE_INDEX_FILE,
+                                     mode=EXTRACTION_MODE, workers=WORKERS)
 
     # Save results
     print("\n3. Saving results...")
     save_to_geojson(streets_df, OUTPUT_GEOJSON)
+    if OUTPUT_FLATGEOBUF:
+        save_to_flatgeobuf(streets_df, OUTPUT_FLATGEOBUF)
     save_summary_csv(streets_df, OUTPUT_CSV)
 
     # Statistics
@@ -257,6 +631,8 @@ def main():
     print("=" * 70)
     print("\nFiles created:")
     print(f"  - {OUTPUT_GEOJSON} (full geometry for mapping)")
+    if OUTPUT_FLATGEOBUF and os.path.exists(OUTPUT_FLATGEOBUF):
+        print(f"  - {OUTPUT_FLATGEOBUF} (spatially indexed geometry)")
     print(f"  - {OUTPUT_CSV} (summary for inspection)")
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+"""
+Batch walking isochrones per neighborhood center
+
+Computes 5/10/15-minute walking isochrones for every neighborhood center over
+the cached OSM walking graph. Each worker memory-maps the graph once and runs
+one distance-limited Dijkstra for a batch of centers on the subgraph of nodes
+within the largest band's distance of any of them (edges are never shorter
+than the straight line, so no reachable node lies outside), turning the
+reached nodes into a simplified concave-hull polygon per band and counting the
+POIs reachable within each band.
+"""
+
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse.csgraph import dijkstra
+
+from walking_graph import (
+    load_walking_graph, load_or_build_walking_graph, WALKING_SPEED_M_PER_MIN
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import LocalProjection
+from poc_common.columnar import read_table
+from poc_common.process_pools import pool_context
+
+# Walking time bands in minutes
+ISOCHRONE_MINUTES = [5, 10, 15]
+
+# POI categories (same files as written by extract_pois.py)
+POI_CATEGORIES = ['supermarkets', 'pt_stops', 'green_spaces']
+
+# Centers per worker task (one Dijkstra run over the union of their local subgraphs)
+CENTERS_PER_TASK = 4
+
+# Polygon shaping in meters: concave hull ratio, buffer around reached streets, simplification
+HULL_RATIO = 0.3
+HULL_BUFFER_M = 30
+SIMPLIFY_TOLERANCE_M = 10
+
+# Per-process state, set once by init_worker
+_worker = {}
+
+def band_polygon(lons, lats, projection):
+    """
+    Simplified concave hull around the nodes reached within one band
+
+    Returns:
+        Shapely polygon in lon/lat
+    """
+    x, y = projection.project(lons, lats)
+    points = shapely.multipoints(np.column_stack([x, y]))
+    hull = shapely.concave_hull(points, ratio=HULL_RATIO)
+    polygon = hull.buffer(HULL_BUFFER_M).simplify(SIMPLIFY_TOLERANCE_M)
+
+    return shapely.transform(polygon, lambda coords: np.column_stack(projection.unproject(coords[:, 0], coords[:, 1])))
+
+def init_worker(graph_dir, poi_nodes, poi_snaps):
+    """Load the memory-mapped graph and the snapped POIs once per process"""
+    graph = load_walking_graph(graph_dir)
+    _worker['graph'] = graph
+    _worker['poi_nodes'] = poi_nodes
+    _worker['poi_snaps'] = poi_snaps
+
+def isochrones_for_centers(centers):
+    """
+    Isochrones for a batch of centers with one distance-limited Dijkstra run on their local subgraph
+
+    Args:
+        centers: List of dicts with id, name, longitude, latitude
+
+    Returns:
+        List of records, one per center and band, each with a 'geometry'
+    """
+    graph = _worker['graph']
+    limits = np.array(ISOCHRONE_MINUTES, dtype=float) * WALKING_SPEED_M_PER_MIN
+
+    lons = np.array([c['longitude'] for c in centers], dtype=float)
+    lats = np.array([c['latitude'] for c in centers], dtype=float)
+    center_nodes, center_snaps = graph.snap(lons, lats)
+
+    # Only nodes within the largest band (straight line from a center node) can be reached
+    reaches = np.maximum(limits.max() - center_snaps, 0.0)
+    nodes = np.unique(np.concatenate([
+        graph.nodes_within(graph.lons[node], graph.lats[node], reach) for node, reach in zip(center_nodes, reaches)
+    ]))
+    # Rows are exact up to each center's own reach, which is all the bands below use
+    rows = dijkstra(graph.subgraph(nodes), directed=True, indices=np.searchsorted(nodes, center_nodes),
+                    limit=reaches.max())
+
+    records = []
+    for center, row, snap in zip(centers, rows, center_snaps):
+        local_reached = np.flatnonzero(np.isfinite(row))
+        reached = nodes[local_reached]
+        walked = row[local_reached] + snap
+        projection = LocalProjection(center['longitude'], center['latitude'])
+
+        # Walking distance from this center to every POI (snapped at both ends; inf outside the subgraph)
+        poi_walks = {}
+        for category, poi_nodes in _worker['poi_nodes'].items():
+            local = np.minimum(np.searchsorted(nodes, poi_nodes), len(nodes) - 1)
+            poi_rows = np.where(nodes[local] == poi_nodes, row[local], np.inf)
+            poi_walks[category] = poi_rows + _worker['poi_snaps'][category] + snap
+
+        for minutes, limit in zip(ISOCHRONE_MINUTES, limits):
+            inside = reached[walked <= limit]
+            band_lons = np.append(np.asarray(graph.lons)[inside], center['longitude'])
+            band_lats = np.append(np.asarray(graph.lats)[inside], center['latitude'])
+
+            record = {
+                'neighborhood_id': center['id'],
+                'neighborhood_name': center['name'],
+                'minutes': minutes,
+                'distance_m': float(limit),
+                'reached_nodes': int(len(inside)),
+                'geometry': band_polygon(band_lons, band_lats, projection)
+            }
+            for category, walks in poi_walks.items():
+                record[f'{category}_count'] = int((walks <= limit).sum())
+            records.append(record)
+
+    return records
+
+def generate_isochrones(neighborhoods_df, pois_dict, graph_dir, workers=None):
+    """
+    Isochrones and POI counts for every neighborhood center, in parallel
+
+    Args:
+        neighborhoods_df: DataFrame with id, name, latitude, longitude
+        pois_dict: Dict of category -> POI DataFrame (latitude, longitude)
+        graph_dir: Directory of the cached walking graph
+        workers: Number of processes (default: all cores; 1 runs in-process)
+
+    Returns:
+        List of records sorted by neighborhood and band
+    """
+    graph = load_walking_graph(graph_dir)
+
+    # Snap POIs once; workers only need their node index and snap length
+    poi_nodes = {}
+    poi_snaps = {}
+    for category, pois_df in pois_dict.items():
+        nodes, snaps = graph.snap(pois_df['longitude'].to_numpy(dtype=float), pois_df['latitude'].to_numpy(dtype=float))
+        poi_nodes[category] = np.asarray(nodes, dtype=np.int64)
+        poi_snaps[category] = snaps
+
+    centers = neighborhoods_df.drop_duplicates('id')[['id', 'name', 'longitude', 'latitude']].to_dict('records')
+    tasks = [centers[i:i + CENTERS_PER_TASK] for i in range(0, len(centers), CENTERS_PER_TASK)]
+    workers = workers or os.cpu_count() or 1
+
+    print(f"\n  {len(centers):,} centers in {len(tasks):,} batches on {workers} worker(s)")
+
+    records = []
+    if workers == 1:
+        init_worker(graph_dir, poi_nodes, poi_snaps)
+        for task in tasks:
+            records.extend(isochrones_for_centers(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), initializer=init_worker,
+                                 initargs=(graph_dir, poi_nodes, poi_snaps)) as pool:
+            for task_records in pool.map(isochrones_for_centers, tasks):
+                records.extend(task_records)
+
+    return records
+
+def write_isochrones_geojson(records, output_file):
+    """Write isochrone polygons with their counts as a GeoJSON FeatureCollection"""
+    features = []
+    for record in records:
+        properties = {key: value for key, value in record.items() if key != 'geometry'}
+        features.append({
+            'type': 'Feature',
+            'geometry': shapely.geometry.mapping(record['geometry']),
+            'properties': properties
+        })
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+def main():
+    print("=" * 70)
+    print("Street Sampling POC - Walking Isochrones per Neighborhood")
+    print("=" * 70)
+
+    # Configuration
+    NEIGHBORHOODS_CSV = "data/neighborhoods.csv"
+    POI_DIR = "data/pois"
+    OSM_FILE = "../poc_smartscore/data/belgium-latest.osm.pbf"
+    GRAPH_DIR = "data/graph"
+    OUTPUT_GEOJSON = "results/isochrones.geojson"
+    OUTPUT_CSV = "results/isochrone_poi_counts.csv"
+
+    print(f"\nBands: {', '.join(f'{m} min' for m in ISOCHRONE_MINUTES)} at {WALKING_SPEED_M_PER_MIN} m/min")
+
+    print("\n1. Loading walking graph...")
+    graph = load_or_build_walking_graph(OSM_FILE, GRAPH_DIR)
+    print(f"   {graph.node_count:,} nodes, {graph.edge_count:,} edges")
+
+    print("\n2. Loading neighborhoods and POIs...")
+    neighborhoods_df = pd.read_csv(NEIGHBORHOODS_CSV)
+    print(f"   Loaded {neighborhoods_df['id'].nunique():,} neighborhoods")
+    pois_dict = {}
+    for category in POI_CATEGORIES:
+        pois_dict[category] = read_table(os.path.join(POI_DIR, f"{category}.parquet"))
+        print(f"   - {category}: {len(pois_dict[category]):,} POIs")
+
+    print("\n3. Generating isochrones...")
+    records = generate_isochrones(neighborhoods_df, pois_dict, GRAPH_DIR)
+
+    print("\n4. Saving results...")
+    os.makedirs(os.path.dirname(OUTPUT_GEOJSON), exist_ok=True)
+    write_isochrones_geojson(records, OUTPUT_GEOJSON)
+    counts_df = pd.DataFrame([{k: v for k, v in r.items() if k != 'geometry'} for r in records])
+    counts_df.to_csv(OUTPUT_CSV, index=False)
+    print(f"   Saved polygons to: {OUTPUT_GEOJSON}")
+    print(f"   Saved POI counts to: {OUTPUT_CSV}")
+
+    print("\n5. Summary (average POIs reachable per band):")
+    count_columns = [f'{category}_count' for category in POI_CATEGORIES]
+    print(counts_df.groupby('minutes')[count_columns].mean().round(1).to_string())
+
+    print("\n" + "=" * 70)
+    print("Isochrone generation complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,197 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point, LineString
-from math import radians, cos, sin, asin, sqrt
+import shapely
 import os
-
-def haversine(lon1, lat1, lon2, lat2):
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import haversine, EARTH_RADIUS_M
+from poc_common.columnar import write_table
+from poc_common.neighborhood_store import NeighborhoodStore, group_digests, neighborhood_signatures, update_neighborhoods
+from poc_common.stage_cache import source_digest
+
+# Street metadata carried over to every sample point
+STREET_COLUMNS = {
+    'osm_id': 'street_osm_id',
+    'name': 'street_name',
+    'highway_type': 'highway_type',
+    'neighborhood_id': 'neighborhood_id',
+    'neighborhood_name': 'neighborhood_name',
+    'city': 'city'
+}
+
+# Original feature position stored in FlatGeobuf streets files (see extract_streets.py)
+STREET_ORDER_COLUMN = 'feature_order'
+
+def measure_lines(geometries):
     """
-    Calculate the great circle distance in meters between two points
-    on the earth (specified in decimal degrees)
+    Haversine lengths of many LineStrings at once
+
+    Returns:
+        Tuple of (coords, line_of_coord, segment_lengths, line_lengths);
+        segment i joins coordinates i and i + 1 and is zero where they belong
+        to different lines
     """
-    # Convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000  # Radius of earth in meters
-    return c * r
-
-def calculate_line_length_meters(linestring):
+    coords, line_of_coord = shapely.get_coordinates(geometries, return_index=True)
+    segment_lengths = haversine(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    segment_lengths[line_of_coord[:-1] != line_of_coord[1:]] = 0
+    line_lengths = np.bincount(line_of_coord[:-1], weights=segment_lengths, minlength=len(geometries))
+    return coords, line_of_coord, segment_lengths, line_lengths
+
+def sample_streets(geometries, sample_interval_m=500):
     """
-    Calculate approximate length of a LineString in meters using haversine
+    Generate sample point positions along many LineStrings at once
+
+    Logic:
+    - Streets ≤500m: 1 point at midpoint
+    - Streets >500m: points at 0m, 500m, 1000m, etc. along the line
+
+    Cumulative geodesic lengths are computed for all coordinates in one pass
+    and every sample offset is interpolated on them, so there is no per-street
+    Python work. Lengths restart at zero on every street, so a street's
+    samples do not depend on which other streets are in the batch.
 
     Args:
-        linestring: Shapely LineString with lon/lat coordinates
+        geometries: Array of Shapely LineStrings with lon/lat coordinates
+        sample_interval_m: Distance between sample points in meters (default 500m)
 
     Returns:
-        Length in meters
+        Dict of arrays, one entry per sample: street_index, longitude, latitude,
+        distance_along, is_midpoint, plus street_length_m per street
     """
-    coords = list(linestring.coords)
-    total_length = 0
-
-    for i in range(len(coords) - 1):
-        lon1, lat1 = coords[i]
-        lon2, lat2 = coords[i + 1]
-        segment_length = haversine(lon1, lat1, lon2, lat2)
-        total_length += segment_length
+    coords, street_of_coord, segment_lengths, street_lengths = measure_lines(geometries)
+    n_streets = len(geometries)
+
+    coord_counts = np.bincount(street_of_coord, minlength=n_streets)
+    first_coord = np.concatenate([[0], np.cumsum(coord_counts)[:-1]])
+    last_coord = first_coord + coord_counts - 1
+
+    # Running length along each street (crossing segments are zero, so it restarts at every first coordinate)
+    length_before = np.zeros(len(coords))
+    length_before[1:] = segment_lengths
+    cumulative = pd.Series(length_before).groupby(street_of_coord).cumsum().to_numpy()
+
+    # Sample offsets: midpoint for short streets, every interval for long ones
+    is_short = street_lengths <= sample_interval_m
+    sample_counts = np.where(is_short, 1, (street_lengths // sample_interval_m).astype(np.int64) + 1)
+    street_index = np.repeat(np.arange(n_streets), sample_counts)
+    rank = np.arange(len(street_index)) - np.repeat(np.cumsum(sample_counts) - sample_counts, sample_counts)
+    is_midpoint = is_short[street_index]
+    distance_along = np.where(is_midpoint, street_lengths[street_index] / 2, rank * float(sample_interval_m))
+
+    # Locate the segment holding each offset (binary search within the street) and interpolate linearly within it
+    target = distance_along
+    segment = first_coord[street_index]
+    upper = last_coord[street_index]
+    while True:
+        searching = segment < upper
+        if not searching.any():
+            break
+        middle = (segment + upper + 1) // 2
+        below = cumulative[middle] <= target
+        segment = np.where(searching & below, middle, segment)
+        upper = np.where(searching & ~below, middle - 1, upper)
+    segment = np.clip(segment, first_coord[street_index], np.maximum(last_coord[street_index] - 1, first_coord[street_index]))
+    segment_end = np.minimum(segment + 1, last_coord[street_index])
+    span = cumulative[segment_end] - cumulative[segment]
+    fraction = np.divide(target - cumulative[segment], span, out=np.zeros_like(span), where=span > 0)
+    fraction = np.clip(fraction, 0, 1)
+
+    return {
+        'street_index': street_index,
+        'longitude': coords[segment, 0] + fraction * (coords[segment_end, 0] - coords[segment, 0]),
+        'latitude': coords[segment, 1] + fraction * (coords[segment_end, 1] - coords[segment, 1]),
+        'distance_along': distance_along,
+        'is_midpoint': is_midpoint,
+        'street_length_m': street_lengths
+    }
+
+def neighborhood_regions(neighborhoods_df, radius_m=1000):
+    """
+    Sampling region per neighborhood in its own local metric frame
 
-    return total_length
+    The frame is an equirectangular projection in meters centered on the
+    neighborhood center. The region is the radius circle, or the neighborhood
+    polygon when a 'polygon_wkt' column (lon/lat WKT) provides one.
 
-def generate_sample_points_for_street(street_geometry, street_data, sample_interval_m=500):
+    Returns:
+        DataFrame indexed by neighborhood id with lon0, lat0, meters_per_deg_lon,
+        meters_per_deg_lat and region columns
+    """
+    centers = neighborhoods_df.drop_duplicates('id').set_index('id')
+    meters_per_deg_lat = np.radians(1) * EARTH_RADIUS_M
+    meters_per_deg_lon = meters_per_deg_lat * np.cos(np.radians(centers['latitude'].to_numpy(dtype=float)))
+
+    circle = shapely.Point(0, 0).buffer(radius_m, quad_segs=64)
+    regions = np.full(len(centers), circle, dtype=object)
+
+    if 'polygon_wkt' in centers.columns:
+        has_polygon = centers['polygon_wkt'].notna().to_numpy()
+        for i in np.flatnonzero(has_polygon):
+            polygon = shapely.from_wkt(centers['polygon_wkt'].iloc[i])
+            regions[i] = shapely.transform(
+                polygon,
+                lambda xy, i=i: (xy - [centers['longitude'].iloc[i], centers['latitude'].iloc[i]])
+                * [meters_per_deg_lon[i], meters_per_deg_lat]
+            )
+
+    return pd.DataFrame({
+        'lon0': centers['longitude'].to_numpy(dtype=float),
+        'lat0': centers['latitude'].to_numpy(dtype=float),
+        'meters_per_deg_lon': meters_per_deg_lon,
+        'meters_per_deg_lat': meters_per_deg_lat,
+        'region': regions
+    }, index=centers.index)
+
+def clip_streets_to_regions(geometries, neighborhood_ids, regions):
     """
-    Generate sample points along a street LineString
+    Clip each street to its neighborhood's sampling region
 
-    Logic:
-    - Streets ≤500m: 1 point at midpoint
-    - Streets >500m: points at 0m, 500m, 1000m, etc. along the line
+    Streets are projected into their neighborhood's local frame, intersected
+    with the region in one vectorized call, and the resulting pieces are
+    projected back to lon/lat.
 
     Args:
-        street_geometry: Shapely LineString
-        street_data: Dict with street metadata (osm_id, name, neighborhood_id, etc.)
-        sample_interval_m: Distance between sample points in meters (default 500m)
+        geometries: Array of lon/lat LineStrings
+        neighborhood_ids: Neighborhood id per street
+        regions: Output of neighborhood_regions()
 
     Returns:
-        List of sample point dicts
+        Tuple of (clipped LineStrings, street index per clipped piece)
     """
-    samples = []
-
-    # Calculate street length
-    length_m = calculate_line_length_meters(street_geometry)
-
-    if length_m <= sample_interval_m:
-        # Short street: 1 point at midpoint (50% along the line)
-        point = street_geometry.interpolate(0.5, normalized=True)
-
-        samples.append({
-            'latitude': point.y,
-            'longitude': point.x,
-            'street_osm_id': street_data['osm_id'],
-            'street_name': street_data['name'],
-            'highway_type': street_data['highway_type'],
-            'neighborhood_id': street_data['neighborhood_id'],
-            'neighborhood_name': street_data['neighborhood_name'],
-            'city': street_data['city'],
-            'street_length_m': length_m,
-            'position_on_street': 'midpoint'
-        })
-    else:
-        # Long street: multiple points at intervals
-        # Calculate how many sample points we need
-        num_points = int(length_m / sample_interval_m) + 1
-
-        for i in range(num_points):
-            # Calculate distance along the street for this sample
-            distance_along = i * sample_interval_m
-
-            # Stop if we exceed street length
-            if distance_along > length_m:
-                break
-
-            # Interpolate point at this distance
-            # We need to convert distance to normalized position (0-1)
-            normalized_position = distance_along / length_m
-            point = street_geometry.interpolate(normalized_position, normalized=True)
-
-            samples.append({
-                'latitude': point.y,
-                'longitude': point.x,
-                'street_osm_id': street_data['osm_id'],
-                'street_name': street_data['name'],
-                'highway_type': street_data['highway_type'],
-                'neighborhood_id': street_data['neighborhood_id'],
-                'neighborhood_name': street_data['neighborhood_name'],
-                'city': street_data['city'],
-                'street_length_m': length_m,
-                'position_on_street': f'{distance_along:.0f}m'
-            })
-
-    return samples
+    frame = regions.loc[np.asarray(neighborhood_ids)]
+    lon0 = frame['lon0'].to_numpy()
+    lat0 = frame['lat0'].to_numpy()
+    scale_x = frame['meters_per_deg_lon'].to_numpy()
+    scale_y = frame['meters_per_deg_lat'].to_numpy()
+
+    coords, street_of_coord = shapely.get_coordinates(geometries, return_index=True)
+    local = np.column_stack([
+        (coords[:, 0] - lon0[street_of_coord]) * scale_x[street_of_coord],
+        (coords[:, 1] - lat0[street_of_coord]) * scale_y[street_of_coord]
+    ])
+    local_lines = shapely.linestrings(local, indices=street_of_coord)
+
+    clipped = shapely.intersection(local_lines, frame['region'].to_numpy())
+    pieces, street_of_piece = shapely.get_parts(clipped, return_index=True)
+
+    # Keep line pieces only (a street touching the boundary yields a point)
+    keep = (shapely.get_type_id(pieces) == 1) & (shapely.length(pieces) > 0)
+    pieces = pieces[keep]
+    street_of_piece = street_of_piece[keep]
+
+    if len(pieces) == 0:
+        return pieces, street_of_piece
+
+    coords, piece_of_coord = shapely.get_coordinates(pieces, return_index=True)
+    street_of_coord = street_of_piece[piece_of_coord]
+    lonlat = np.column_stack([
+        coords[:, 0] / scale_x[street_of_coord] + lon0[street_of_coord],
+        coords[:, 1] / scale_y[street_of_coord] + lat0[street_of_coord]
+    ])
+
+    return shapely.linestrings(lonlat, indices=piece_of_coord), street_of_piece
 
 def filter_points_within_radius(samples_df, neighborhoods_df, radius_m=1000):
     """
@@ -125,39 +207,92 @@ def filter_points_within_radius(samples_df, neighborhoods_df, radius_m=1000):
     """
     print(f"\nFiltering sample points to keep only those within {radius_m}m of neighborhood centers...")
 
-    filtered_samples = []
     initial_count = len(samples_df)
 
-    for _, sample in samples_df.iterrows():
-        # Find the neighborhood center for this sample
-        neighborhood = neighborhoods_df[neighborhoods_df['id'] == sample['neighborhood_id']].iloc[0]
-
-        # Calculate distance from sample to neighborhood center
-        distance = haversine(
-            sample['longitude'], sample['latitude'],
-            neighborhood['longitude'], neighborhood['latitude']
-        )
+    # Look up the neighborhood center for every sample at once
+    centers = neighborhoods_df.drop_duplicates('id').set_index('id')
+    center_lon = samples_df['neighborhood_id'].map(centers['longitude']).to_numpy(dtype=float)
+    center_lat = samples_df['neighborhood_id'].map(centers['latitude']).to_numpy(dtype=float)
 
-        # Keep sample if within radius
-        if distance <= radius_m:
-            filtered_samples.append(sample)
+    # Calculate distance from each sample to its neighborhood center
+    distances = haversine(
+        samples_df['longitude'].to_numpy(dtype=float), samples_df['latitude'].to_numpy(dtype=float),
+        center_lon, center_lat
+    )
 
-    filtered_df = pd.DataFrame(filtered_samples)
+    # Keep samples within radius
+    filtered_df = samples_df[distances <= radius_m]
     removed_count = initial_count - len(filtered_df)
 
     print(f"  Kept {len(filtered_df):,} sample points (removed {removed_count:,} outside radius)")
 
     return filtered_df
 
-def generate_sample_points(streets_gdf, neighborhoods_df, sample_interval_m=500, radius_m=1000):
+def sampling_bbox(neighborhoods_df, radius_m=1000):
+    """
+    Lon/lat bounding box around all sampling regions
+
+    Streets outside it cannot produce samples, whether streets are clipped to
+    the regions or the points are filtered by radius afterwards.
+
+    Returns:
+        Tuple (min_lon, min_lat, max_lon, max_lat)
+    """
+    regions = neighborhood_regions(neighborhoods_df, radius_m)
+    bounds = shapely.bounds(regions['region'].to_numpy())
+    bounds[:, :2] = np.minimum(bounds[:, :2], -radius_m)
+    bounds[:, 2:] = np.maximum(bounds[:, 2:], radius_m)
+
+    lons = regions['lon0'].to_numpy()[:, None] + bounds[:, [0, 2]] / regions['meters_per_deg_lon'].to_numpy()[:, None]
+    lats = regions['lat0'].to_numpy()[:, None] + bounds[:, [1, 3]] / regions['meters_per_deg_lat'].to_numpy()[:, None]
+
+    return float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())
+
+def streets_source(geojson_file, flatgeobuf_file):
+    """The FlatGeobuf copy when it is at least as new as the GeoJSON, else the GeoJSON"""
+    if flatgeobuf_file and os.path.exists(flatgeobuf_file) and \
+            (not os.path.exists(geojson_file) or os.path.getmtime(flatgeobuf_file) >= os.path.getmtime(geojson_file)):
+        return flatgeobuf_file
+    return geojson_file
+
+def load_streets(streets_file, neighborhoods_df, radius_m=1000):
+    """
+    Read only the street features of the given neighborhoods
+
+    The neighborhood id filter is pushed down to the reader, and the sampling
+    bounding box lets FlatGeobuf files skip everything else through their
+    spatial index.
+
+    Args:
+        streets_file: GeoJSON or FlatGeobuf written by extract_streets.py
+        neighborhoods_df: DataFrame with the neighborhoods to sample
+        radius_m: Sampling radius around neighborhood centers
+
+    Returns:
+        GeoDataFrame with street geometries
+    """
+    ids = ', '.join(str(int(nbh_id)) for nbh_id in neighborhoods_df['id'].unique())
+    streets_gdf = gpd.read_file(streets_file, bbox=sampling_bbox(neighborhoods_df, radius_m),
+                                where=f"neighborhood_id IN ({ids})")
+
+    # FlatGeobuf returns features in spatial-index order; restore the extraction order
+    if STREET_ORDER_COLUMN in streets_gdf.columns:
+        streets_gdf = streets_gdf.sort_values(STREET_ORDER_COLUMN).drop(columns=[STREET_ORDER_COLUMN])
+
+    return streets_gdf.reset_index(drop=True)
+
+def generate_sample_points(streets_gdf, neighborhoods_df, sample_interval_m=500, radius_m=1000, clip_to_radius=True):
     """
     Generate sample points for all streets
 
     Args:
         streets_gdf: GeoDataFrame with street geometries
-        neighborhoods_df: DataFrame with neighborhood centers
+        neighborhoods_df: DataFrame with neighborhood centers (optionally polygon_wkt)
         sample_interval_m: Distance between samples (default 500m)
-        radius_m: Filter radius around neighborhood centers (default 1000m)
+        radius_m: Radius around neighborhood centers (default 1000m)
+        clip_to_radius: Clip streets to the neighborhood radius (or polygon) and
+            sample only the clipped pieces; otherwise sample full streets and
+            filter the points afterwards
 
     Returns:
         DataFrame with sample points
@@ -165,51 +300,113 @@ def generate_sample_points(streets_gdf, neighborhoods_df, sample_interval_m=500,
     print(f"\nGenerating sample points with {sample_interval_m}m intervals...")
     print(f"Processing {len(streets_gdf):,} streets...")
 
-    all_samples = []
-    processed = 0
+    # Skip anything that is not a LineString
+    is_line = (streets_gdf.geometry.geom_type == 'LineString').to_numpy()
+    streets = streets_gdf[is_line]
+    geometries = streets.geometry.to_numpy()
+    *_, street_lengths = measure_lines(geometries)
+
+    if clip_to_radius:
+        print(f"  Clipping streets to {radius_m}m around their neighborhood centers...")
+        regions = neighborhood_regions(neighborhoods_df, radius_m)
+        pieces, street_of_piece = clip_streets_to_regions(geometries, streets['neighborhood_id'].to_numpy(), regions)
+        print(f"  Kept {len(pieces):,} street pieces inside the sampling regions")
+    else:
+        pieces, street_of_piece = geometries, np.arange(len(geometries))
+
+    samples = sample_streets(pieces, sample_interval_m)
+    street_index = street_of_piece[samples['street_index']]
+
+    print(f"  Total sample points generated: {len(street_index):,}")
+
+    # Join street metadata by street index
+    samples_df = pd.DataFrame({
+        'latitude': samples['latitude'],
+        'longitude': samples['longitude']
+    })
+    metadata = streets[list(STREET_COLUMNS)].iloc[street_index].rename(columns=STREET_COLUMNS)
+    for column in metadata.columns:
+        samples_df[column] = metadata[column].to_numpy()
+    samples_df['street_length_m'] = street_lengths[street_index]
+    samples_df['position_on_street'] = np.where(
+        samples['is_midpoint'],
+        'midpoint',
+        pd.Series(np.round(samples['distance_along']).astype(np.int64)).astype(str).to_numpy() + 'm'
+    )
 
-    for idx, row in streets_gdf.iterrows():
-        processed += 1
+    # Add sample_id
+    samples_df.insert(0, 'sample_id', range(1, len(samples_df) + 1))
 
-        if processed % 500 == 0:
-            print(f"  Processed {processed:,}/{len(streets_gdf):,} streets, generated {len(all_samples):,} samples so far...")
+    if not clip_to_radius:
+        # Filter to keep only points within radius
+        samples_df = filter_points_within_radius(samples_df, neighborhoods_df, radius_m)
 
-        # Get street geometry
-        geometry = row['geometry']
+        # Re-index sample_id after filtering
+        samples_df['sample_id'] = range(1, len(samples_df) + 1)
 
-        # Skip if not a LineString
-        if not isinstance(geometry, LineString):
-            continue
+    return samples_df
 
-        # Extract street data
-        street_data = {
-            'osm_id': row['osm_id'],
-            'name': row['name'],
-            'highway_type': row['highway_type'],
-            'neighborhood_id': row['neighborhood_id'],
-            'neighborhood_name': row['neighborhood_name'],
-            'city': row['city']
-        }
+def street_digests(streets_gdf):
+    """Digest of every neighborhood's streets (attributes and geometry), keyed by neighborhood id"""
+    streets = pd.DataFrame({
+        'osm_id': streets_gdf['osm_id'].astype(np.int64),
+        'name': streets_gdf['name'].astype(str),
+        'highway_type': streets_gdf['highway_type'].astype(str),
+        'neighborhood_id': streets_gdf['neighborhood_id'].astype(np.int64),
+        'neighborhood_name': streets_gdf['neighborhood_name'].astype(str),
+        'city': streets_gdf['city'].astype(str),
+        'geometry_wkb': shapely.to_wkb(streets_gdf.geometry.to_numpy())
+    })
+    return group_digests(streets)
+
+def street_order(samples_df, streets_df):
+    """
+    Row order that puts samples in the order of their streets in streets_df, as in a full run
 
-        # Generate sample points for this street
-        samples = generate_sample_points_for_street(geometry, street_data, sample_interval_m)
-        all_samples.extend(samples)
+    Samples of one street keep their relative order, so samples generated in
+    parts (per neighborhood or per tile) can be merged back.
+    """
+    street_keys = pd.MultiIndex.from_arrays([streets_df['osm_id'].to_numpy(dtype=np.int64),
+                                             streets_df['neighborhood_id'].to_numpy(dtype=np.int64)])
+    sample_keys = pd.MultiIndex.from_arrays([samples_df['street_osm_id'].to_numpy(dtype=np.int64),
+                                             samples_df['neighborhood_id'].to_numpy(dtype=np.int64)])
+    return np.argsort(street_keys.get_indexer(sample_keys), kind='stable')
+
+def generate_sample_points_incremental(streets_gdf, neighborhoods_df, store_dir, sample_interval_m=500, radius_m=1000,
+                                       clip_to_radius=True):
+    """
+    generate_sample_points() that only samples new or changed neighborhoods
 
-    print(f"  Total sample points generated: {len(all_samples):,}")
+    Samples are kept per neighborhood in store_dir (without sample_id),
+    signed with the neighborhood's row, the sampling parameters, the source
+    of the sampling code and a digest of that neighborhood's streets. A street's samples only depend on the
+    street and its own neighborhood, so the reassembled table matches a full
+    run; sample ids are assigned after reassembly.
 
-    # Convert to DataFrame
-    samples_df = pd.DataFrame(all_samples)
+    Returns:
+        Tuple of (DataFrame with sample points, recomputed neighborhood ids)
+    """
+    store = NeighborhoodStore(store_dir)
+    signatures = neighborhood_signatures(neighborhoods_df, {
+        'sample_interval_m': sample_interval_m,
+        'radius_m': radius_m,
+        'clip_to_radius': clip_to_radius,
+        'code': source_digest([generate_sample_points, haversine, write_table, NeighborhoodStore])
+    }, upstream=street_digests(streets_gdf))
 
-    # Add sample_id
-    samples_df.insert(0, 'sample_id', range(1, len(samples_df) + 1))
+    def sample_stale(stale_df):
+        streets = streets_gdf[streets_gdf['neighborhood_id'].isin(stale_df['id'])]
+        samples_df = generate_sample_points(streets, stale_df, sample_interval_m, radius_m, clip_to_radius)
+        return samples_df.drop(columns=['sample_id'])
 
-    # Filter to keep only points within radius
-    samples_df = filter_points_within_radius(samples_df, neighborhoods_df, radius_m)
+    samples_df, stale = update_neighborhoods(store, neighborhoods_df, signatures, sample_stale)
+    print(f"Neighborhoods recomputed: {len(stale)} of {len(signatures)} (others loaded from {store_dir})")
 
-    # Re-index sample_id after filtering
-    samples_df['sample_id'] = range(1, len(samples_df) + 1)
+    if not samples_df.empty:
+        samples_df = samples_df.iloc[street_order(samples_df, streets_gdf)].reset_index(drop=True)
 
-    return samples_df
+    samples_df.insert(0, 'sample_id', range(1, len(samples_df) + 1))
+    return samples_df, stale
 
 def main():
     print("=" * 70)
@@ -218,35 +415,50 @@ def main():
 
     # Configuration
     STREETS_GEOJSON = "data/streets/residential_streets.geojson"
+    STREETS_FLATGEOBUF = "data/streets/residential_streets.fgb"  # Used instead when present and up to date
     NEIGHBORHOODS_CSV = "data/neighborhoods.csv"
-    OUTPUT_CSV = "data/samples/street_samples.csv"
+    OUTPUT_FILE = "data/samples/street_samples.parquet"
+    EXPORT_CSV = False  # Also write a .csv copy of the samples
     SAMPLE_INTERVAL_M = 500  # Sample every 500m
     RADIUS_M = 1000  # Keep only samples within 1km of neighborhood center
+    NEIGHBORHOOD_IDS = None  # Only sample these neighborhood ids (None = all)
+    NEIGHBORHOOD_STORE_DIR = "data/samples/by_neighborhood"  # Per-neighborhood results (None = sample all)
 
     # Load data
     print("\n1. Loading data...")
-    print(f"   Reading streets from: {STREETS_GEOJSON}")
-    streets_gdf = gpd.read_file(STREETS_GEOJSON)
-    print(f"   Loaded {len(streets_gdf):,} street segments")
-
     print(f"   Reading neighborhoods from: {NEIGHBORHOODS_CSV}")
     neighborhoods_df = pd.read_csv(NEIGHBORHOODS_CSV)
+    if NEIGHBORHOOD_IDS is not None:
+        neighborhoods_df = neighborhoods_df[neighborhoods_df['id'].isin(NEIGHBORHOOD_IDS)]
     print(f"   Loaded {len(neighborhoods_df)} neighborhoods")
 
+    streets_file = streets_source(STREETS_GEOJSON, STREETS_FLATGEOBUF)
+    print(f"   Reading streets from: {streets_file}")
+    streets_gdf = load_streets(streets_file, neighborhoods_df, RADIUS_M)
+    print(f"   Loaded {len(streets_gdf):,} street segments")
+
     # Generate sample points
     print("\n2. Generating sample points...")
-    samples_df = generate_sample_points(
-        streets_gdf,
-        neighborhoods_df,
-        sample_interval_m=SAMPLE_INTERVAL_M,
-        radius_m=RADIUS_M
-    )
+    if NEIGHBORHOOD_STORE_DIR:
+        samples_df, _ = generate_sample_points_incremental(
+            streets_gdf,
+            neighborhoods_df,
+            NEIGHBORHOOD_STORE_DIR,
+            sample_interval_m=SAMPLE_INTERVAL_M,
+            radius_m=RADIUS_M
+        )
+    else:
+        samples_df = generate_sample_points(
+            streets_gdf,
+            neighborhoods_df,
+            sample_interval_m=SAMPLE_INTERVAL_M,
+            radius_m=RADIUS_M
+        )
 
     # Save results
     print("\n3. Saving results...")
-    os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
-    samples_df.to_csv(OUTPUT_CSV, index=False)
-    print(f"   Saved to: {OUTPUT_CSV}")
+    saved_file = write_table(samples_df, OUTPUT_FILE, csv_export=EXPORT_CSV)
+    print(f"   Saved to: {saved_file}")
 
     # Statistics
     print("\n" + "=" * 70)
@@ -296,7 +508,7 @@ def main():
     print("\n" + "=" * 70)
     print("Sample point generation complete!")
     print("=" * 70)
-    print(f"\nOutput file: {OUTPUT_CSV}")
+    print(f"\nOutput file: {saved_file}")
 
 if __name__ == "__main__":
     main()
@@ -4,60 +4,37 @@ Measures processing times and file sizes for street sampling POC
 """
 
 import os
-import time
+import sys
 import pandas as pd
-import subprocess
 from datetime import datetime
 
-def get_file_size_mb(filepath):
-    """Get file size in MB"""
-    if os.path.exists(filepath):
-        return os.path.getsize(filepath) / (1024 * 1024)
-    return 0
-
-def run_with_timing(script_name, phase_name):
-    """Run a Python script and measure its execution time"""
-    print(f"\n{'='*70}")
-    print(f"Running: {phase_name}")
-    print(f"{'='*70}")
-
-    start_time = time.time()
-
-    try:
-        result = subprocess.run(
-            ['python', script_name],
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 minute timeout
-        )
+from run_pipeline import run_pipeline
 
-        end_time = time.time()
-        duration = end_time - start_time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import find_table, read_table
 
-        # Print output
-        if result.stdout:
-            print(result.stdout)
-
-        # Check for errors
-        if result.returncode != 0:
-            print(f"ERROR: Script failed with return code {result.returncode}")
-            if result.stderr:
-                print(f"STDERR: {result.stderr}")
-            return duration, False
-
-        print(f"\n{phase_name} completed in {duration:.2f} seconds")
-        return duration, True
-
-    except subprocess.TimeoutExpired:
-        print(f"ERROR: {phase_name} timed out after 10 minutes")
-        return 600, False
-    except Exception as e:
-        print(f"ERROR: {phase_name} failed with exception: {e}")
-        return 0, False
+def get_file_size_mb(filepath):
+    """Get file size in MB (tables in whichever format they were stored)"""
+    if not os.path.exists(filepath):
+        try:
+            filepath = find_table(filepath)
+        except FileNotFoundError:
+            return 0
+    return os.path.getsize(filepath) / (1024 * 1024)
+
+# Pipeline stage -> timing key used in the report
+PHASES = {
+    'extract_streets': 'street_extraction',
+    'generate_sample_points': 'sample_generation',
+    'extract_pois': 'poi_extraction',
+    'calculate_distances': 'distance_calculation',
+    'aggregate_labels': 'label_aggregation',
+    'map': 'map_generation'
+}
 
 def count_sample_points_per_neighborhood():
     """Count sample points per neighborhood"""
-    samples_df = pd.read_csv('data/samples/street_samples.csv')
+    samples_df = read_table('data/samples/street_samples.parquet')
     counts = samples_df.groupby('neighborhood_name').size().sort_values(ascending=False)
     return counts
 
@@ -67,59 +44,19 @@ def main():
     print("="*70)
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    # Track all timings
-    timings = {}
-
-    # Phase 1: Extract streets
-    print("\n\nPHASE 1: STREET EXTRACTION")
-    duration, success = run_with_timing('extract_streets.py', 'Street Extraction')
-    timings['street_extraction'] = duration
+    # Run all stages in-process; independent branches (streets, POIs) overlap.
+    # The stage cache and per-neighborhood stores are off so every stage is actually timed.
+    print("\n\nRUNNING PIPELINE")
+    pipeline, _ = run_pipeline({'cache_dir': None, 'streets_store_dir': None, 'samples_store_dir': None,
+                                'distances_store_dir': None})
 
-    if not success:
-        print("WARNING: Street extraction failed, continuing with existing data...")
+    timings = {PHASES[name]: timing['duration_s'] for name, timing in pipeline.timings.items()}
+    for name, timing in pipeline.timings.items():
+        if timing['status'] != 'ok':
+            print(f"WARNING: {name} {timing['status']}, report uses the existing output files")
 
-    # Phase 2: Generate sample points
-    print("\n\nPHASE 2: SAMPLE POINT GENERATION")
-    duration, success = run_with_timing('generate_sample_points.py', 'Sample Point Generation')
-    timings['sample_generation'] = duration
-
-    if not success:
-        print("WARNING: Sample generation failed, continuing with existing data...")
-
-    # Phase 3: Extract POIs
-    print("\n\nPHASE 3: POI EXTRACTION")
-    duration, success = run_with_timing('extract_pois.py', 'POI Extraction')
-    timings['poi_extraction'] = duration
-
-    if not success:
-        print("WARNING: POI extraction failed, continuing with existing data...")
-
-    # Phase 4: Calculate distances
-    print("\n\nPHASE 4: DISTANCE CALCULATION")
-    duration, success = run_with_timing('calculate_distances.py', 'Distance Calculation')
-    timings['distance_calculation'] = duration
-
-    if not success:
-        print("WARNING: Distance calculation failed, continuing with existing data...")
-
-    # Phase 5: Aggregate labels
-    print("\n\nPHASE 5: LABEL AGGREGATION")
-    duration, success = run_with_timing('aggregate_labels.py', 'Label Aggregation')
-    timings['label_aggregation'] = duration
-
-    if not success:
-        print("WARNING: Label aggregation failed, continuing with existing data...")
-
-    # Phase 6: Create map
-    print("\n\nPHASE 6: MAP GENERATION")
-    duration, success = run_with_timing('create_map_with_lines.py', 'Map Generation')
-    timings['map_generation'] = duration
-
-    if not success:
-        print("WARNING: Map generation failed, continuing with existing data...")
-
-    # Calculate total time
-    total_time = sum(timings.values())
+    # Stages overlap, so the total is wall-clock time rather than the sum of stages
+    total_time = pipeline.wall_time_s
 
     # Gather file sizes
     print("\n\n" + "="*70)
@@ -129,11 +66,11 @@ def main():
     file_sizes = {
         'neighborhoods': get_file_size_mb('data/neighborhoods.csv'),
         'streets': get_file_size_mb('data/streets/residential_streets.geojson'),
-        'street_samples': get_file_size_mb('data/samples/street_samples.csv'),
-        'supermarkets': get_file_size_mb('data/pois/supermarkets.csv'),
-        'pt_stops': get_file_size_mb('data/pois/pt_stops.csv'),
-        'green_spaces': get_file_size_mb('data/pois/green_spaces.csv'),
-        'distances': get_file_size_mb('results/distances_per_sample.csv'),
+        'street_samples': get_file_size_mb('data/samples/street_samples.parquet'),
+        'supermarkets': get_file_size_mb('data/pois/supermarkets.parquet'),
+        'pt_stops': get_file_size_mb('data/pois/pt_stops.parquet'),
+        'green_spaces': get_file_size_mb('data/pois/green_spaces.parquet'),
+        'distances': get_file_size_mb('results/distances_per_sample.parquet'),
         'labels_summary': get_file_size_mb('results/neighborhood_labels_summary.csv'),
         'html_map': get_file_size_mb('street_sampling_map.html')
     }
@@ -141,11 +78,11 @@ def main():
     # Count records
     neighborhoods_df = pd.read_csv('data/neighborhoods.csv')
     streets_df = pd.read_csv('data/streets/residential_streets_summary.csv')
-    samples_df = pd.read_csv('data/samples/street_samples.csv')
-    pois_supermarkets = pd.read_csv('data/pois/supermarkets.csv')
-    pois_pt = pd.read_csv('data/pois/pt_stops.csv')
-    pois_green = pd.read_csv('data/pois/green_spaces.csv')
-    distances_df = pd.read_csv('results/distances_per_sample.csv')
+    samples_df = read_table('data/samples/street_samples.parquet')
+    pois_supermarkets = read_table('data/pois/supermarkets.parquet')
+    pois_pt = read_table('data/pois/pt_stops.parquet')
+    pois_green = read_table('data/pois/green_spaces.parquet')
+    distances_df = read_table('results/distances_per_sample.parquet')
     labels_df = pd.read_csv('results/neighborhood_labels_summary.csv')
 
     record_counts = {
@@ -187,7 +124,12 @@ def main():
     report_lines.append(f"Phase 5 - Label Aggregation:      {timings['label_aggregation']:>8.2f} seconds")
     report_lines.append(f"Phase 6 - Map Generation:         {timings['map_generation']:>8.2f} seconds")
     report_lines.append(f"{'-'*70}")
-    report_lines.append(f"TOTAL PROCESSING TIME:            {total_time:>8.2f} seconds ({total_time/60:.2f} minutes)")
+    report_lines.append(f"Sum of phase times:               {sum(timings.values()):>8.2f} seconds")
+    report_lines.append(f"TOTAL PROCESSING TIME:            {total_time:>8.2f} seconds ({total_time/60:.2f} minutes, wall clock)")
+    report_lines.append("")
+    report_lines.append("Stage schedule (independent stages run concurrently):")
+    for line in pipeline.summary_lines():
+        report_lines.append(f"  {line}")
     report_lines.append("")
 
     # Record counts
@@ -0,0 +1,467 @@
+"""
+Persistent OSM store with incremental updates from change files
+
+Keeps the POIs and residential streets the POC uses in a SQLite database,
+imported once from the Belgium PBF. Daily refreshes then apply OSM
+replication change files (.osc / .osc.gz): created, modified and deleted
+nodes and ways are upserted or removed, and the neighborhoods near any
+change are reported so only those need to be re-sampled and re-scored.
+The POI CSVs and the street GeoJSON are re-exported from the store.
+
+Area POIs (green-space polygons) are assembled at the full import only;
+change files remove deleted areas and count modified ones as stale until
+the next full import.
+"""
+
+import glob
+import os
+import sqlite3
+import sys
+import numpy as np
+import osmium
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from extract_streets import (
+    STREET_TYPES, COORDINATE_PRECISION, StreetExtractor, collect_way_first, street_tags,
+    save_to_geojson, save_to_flatgeobuf, save_summary_csv
+)
+from extract_pois import POI_CATEGORIES, save_pois, area_distances, area_within_any_neighborhood
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.geodesy import to_unit_vectors, chord_radius
+from poc_common.osm_filters import definitions_tag_filter, AREA_POI_ENTITIES
+
+# Context radii used by the extraction scripts
+POI_RADIUS_M = 2000     # extract_pois.py
+STREET_RADIUS_M = 1000  # extract_streets.py
+
+# Categories whose POIs include assembled areas (see extract_pois.py)
+AREA_CATEGORIES = {key: info for key, info in POI_CATEGORIES.items() if info.get('areas')}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pois (
+    category TEXT NOT NULL,
+    osm_type TEXT NOT NULL,
+    osm_id INTEGER NOT NULL,
+    name TEXT,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    poi_type TEXT,
+    geometry_wkb TEXT,
+    PRIMARY KEY (category, osm_type, osm_id)
+);
+CREATE INDEX IF NOT EXISTS pois_by_object ON pois (osm_type, osm_id);
+
+CREATE TABLE IF NOT EXISTS streets (
+    id INTEGER PRIMARY KEY,
+    highway TEXT NOT NULL,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS way_nodes (
+    way_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    node_id INTEGER NOT NULL,
+    PRIMARY KEY (way_id, seq)
+);
+CREATE INDEX IF NOT EXISTS way_nodes_by_node ON way_nodes (node_id);
+
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    longitude REAL NOT NULL,
+    latitude REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS applied_changes (
+    file TEXT PRIMARY KEY,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+def poi_rows(osm_type, osm_id, tags, lat, lon, categories=POI_CATEGORIES, geometry_wkb=None):
+    """
+    POI rows (one per matching category) for an OSM object
+
+    Matching and poi_type follow POIExtractor in extract_pois.py.
+    """
+    rows = []
+    for category_key, category_info in categories.items():
+        filters = category_info['filters']
+        if not any(key in tags and tags[key] in values for key, values in filters):
+            continue
+        poi_type = next((f"{key}={tags[key]}" for key, _ in filters if key in tags), None)
+        rows.append((category_key, osm_type, osm_id, tags.get('name', 'Unnamed'), lat, lon, poi_type, geometry_wkb))
+    return rows
+
+class POICollector(osmium.SimpleHandler):
+    """Collect POI rows for every category during the initial import"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+
+    def node(self, n):
+        self.rows.extend(poi_rows('node', n.id, dict(n.tags), n.location.lat, n.location.lon))
+
+class AreaPOICollector(osmium.SimpleHandler):
+    """Collect area POI rows (geometry + centroid) for the categories with areas"""
+
+    def __init__(self, categories):
+        super().__init__()
+        self.categories = categories
+        self.wkb_factory = osmium.geom.WKBFactory()
+        self.rows = []
+
+    def area(self, a):
+        try:
+            geometry_wkb = self.wkb_factory.create_multipolygon(a)
+        except RuntimeError:
+            return
+        centroid = shapely.from_wkb(geometry_wkb).centroid
+        osm_type = 'way' if a.from_way() else 'relation'
+        self.rows.extend(poi_rows(osm_type, a.orig_id(), dict(a.tags), centroid.y, centroid.x,
+                                  self.categories, geometry_wkb))
+
+class ChangeCollector(osmium.SimpleHandler):
+    """
+    Read an .osc file into plain dicts (last version of each object wins)
+
+    Change objects are only valid inside the callback, so everything needed
+    later (tags, location, node refs) is copied out.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.nodes = {}
+        self.ways = {}
+        self.relations = {}
+
+    def node(self, n):
+        if n.deleted:
+            self.nodes[n.id] = None
+        else:
+            self.nodes[n.id] = (n.location.lon, n.location.lat, dict(n.tags))
+
+    def way(self, w):
+        if w.deleted:
+            self.ways[w.id] = None
+        else:
+            self.ways[w.id] = (dict(w.tags), [n.ref for n in w.nodes])
+
+    def relation(self, r):
+        self.relations[r.id] = None if r.deleted else dict(r.tags)
+
+class OsmStore:
+    """
+    SQLite store of POIs, residential streets and the street nodes they use
+
+    Args:
+        db_file: Path to the SQLite database (created if missing)
+    """
+
+    def __init__(self, db_file):
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self.db = sqlite3.connect(db_file)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def is_empty(self):
+        return self.db.execute("SELECT NOT EXISTS (SELECT 1 FROM streets) AND NOT EXISTS (SELECT 1 FROM pois)").fetchone()[0] == 1
+
+    def import_pbf(self, osm_file, workers=1):
+        """Fill the store from a full PBF extract (replaces any previous content)"""
+        print(f"\nImporting {osm_file} into the store...")
+
+        way_ids, way_tags, refs, offsets, node_ids, xs, ys = collect_way_first(osm_file, STREET_TYPES, workers)
+
+        collector = POICollector()
+        collector.apply_file(osm_file, filters=[definitions_tag_filter(POI_CATEGORIES)])
+
+        area_collector = AreaPOICollector(AREA_CATEGORIES)
+        if AREA_CATEGORIES:
+            area_collector.apply_file(osm_file, locations=True,
+                                      filters=[definitions_tag_filter(AREA_CATEGORIES, AREA_POI_ENTITIES)])
+
+        seqs = np.arange(len(refs)) - np.repeat(offsets[:-1], np.diff(offsets))
+        way_of_ref = np.repeat(np.asarray(way_ids, dtype=np.int64), np.diff(offsets))
+
+        with self.db:
+            for table in ['pois', 'streets', 'way_nodes', 'nodes', 'applied_changes']:
+                self.db.execute(f"DELETE FROM {table}")
+            self.db.executemany("INSERT INTO pois VALUES (?, ?, ?, ?, ?, ?, ?, ?)", collector.rows + area_collector.rows)
+            self.db.executemany(
+                "INSERT INTO streets VALUES (?, ?, ?)",
+                ((way_id, tags['highway'], tags.get('name')) for way_id, tags in zip(way_ids, way_tags))
+            )
+            self.db.executemany("INSERT INTO way_nodes VALUES (?, ?, ?)",
+                                zip(way_of_ref.tolist(), seqs.tolist(), refs.tolist()))
+            self.db.executemany("INSERT INTO nodes VALUES (?, ?, ?)", zip(
+                node_ids.tolist(), (xs / COORDINATE_PRECISION).tolist(), (ys / COORDINATE_PRECISION).tolist()
+            ))
+
+        print(f"  Stored {len(collector.rows) + len(area_collector.rows):,} POIs, {len(way_ids):,} streets, "
+              f"{len(node_ids):,} street nodes")
+
+    def applied_files(self):
+        return {row[0] for row in self.db.execute("SELECT file FROM applied_changes")}
+
+    def street_points(self, way_ids):
+        """Current node coordinates of the given streets"""
+        points = []
+        for way_id in way_ids:
+            points.extend(self.db.execute(
+                "SELECT n.longitude, n.latitude FROM way_nodes w JOIN nodes n ON n.id = w.node_id WHERE w.way_id = ?",
+                (way_id,)
+            ).fetchall())
+        return points
+
+    def apply_changes(self, osc_file):
+        """
+        Apply one OSM change file in a single transaction
+
+        Returns:
+            Dict with change counts and the touched locations:
+            'poi_points' and 'street_points' (lists of (lon, lat), old and new)
+            and 'poi_areas' (WKB geometries of changed area POIs)
+        """
+        changes = ChangeCollector()
+        changes.apply_file(osc_file)
+
+        summary = {'pois_removed': 0, 'pois_added': 0, 'streets_removed': 0, 'streets_added': 0,
+                   'nodes_moved': 0, 'unresolved_nodes': 0, 'stale_areas': 0, 'poi_points': [], 'poi_areas': [],
+                   'street_points': []}
+        db = self.db
+
+        with db:
+            # Nodes: POIs and moved street nodes
+            for node_id, change in changes.nodes.items():
+                old_pois = db.execute("SELECT longitude, latitude FROM pois WHERE osm_type = 'node' AND osm_id = ?",
+                                      (node_id,)).fetchall()
+                summary['poi_points'].extend(old_pois)
+                summary['pois_removed'] += db.execute("DELETE FROM pois WHERE osm_type = 'node' AND osm_id = ?",
+                                                      (node_id,)).rowcount
+
+                old_location = db.execute("SELECT longitude, latitude FROM nodes WHERE id = ?", (node_id,)).fetchone()
+
+                if change is None:
+                    if old_location is not None:
+                        db.execute("DELETE FROM nodes WHERE id = ?", (node_id,))
+                        summary['street_points'].append(old_location)
+                    continue
+
+                lon, lat, tags = change
+                rows = poi_rows('node', node_id, tags, lat, lon)
+                db.executemany("INSERT INTO pois VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                summary['pois_added'] += len(rows)
+                if rows:
+                    summary['poi_points'].append((lon, lat))
+
+                if old_location is not None and tuple(old_location) != (lon, lat):
+                    db.execute("UPDATE nodes SET longitude = ?, latitude = ? WHERE id = ?", (lon, lat, node_id))
+                    summary['street_points'].extend([old_location, (lon, lat)])
+                    summary['nodes_moved'] += 1
+
+            # Area POIs: deletions are applied, modifications wait for the next full import
+            area_changes = [('way', way_id, None if change is None else change[0]) for way_id, change in changes.ways.items()]
+            area_changes += [('relation', relation_id, tags) for relation_id, tags in changes.relations.items()]
+            for osm_type, osm_id, tags in area_changes:
+                old_areas = db.execute(
+                    "SELECT longitude, latitude, geometry_wkb FROM pois WHERE osm_type = ? AND osm_id = ?",
+                    (osm_type, osm_id)
+                ).fetchall()
+                if tags is None and old_areas:
+                    db.execute("DELETE FROM pois WHERE osm_type = ? AND osm_id = ?", (osm_type, osm_id))
+                    summary['pois_removed'] += len(old_areas)
+                elif tags is not None and (old_areas or poi_rows(osm_type, osm_id, tags, 0, 0, AREA_CATEGORIES)):
+                    summary['stale_areas'] += 1
+                for lon, lat, geometry_wkb in old_areas:
+                    if geometry_wkb is None:
+                        summary['poi_points'].append((lon, lat))
+                    else:
+                        summary['poi_areas'].append(geometry_wkb)
+
+            # Ways: replace each changed street with its new version
+            for way_id, change in changes.ways.items():
+                old_refs = [row[0] for row in db.execute("SELECT node_id FROM way_nodes WHERE way_id = ?", (way_id,))]
+                if old_refs:
+                    summary['street_points'].extend(self.street_points([way_id]))
+                    db.execute("DELETE FROM way_nodes WHERE way_id = ?", (way_id,))
+                summary['streets_removed'] += db.execute("DELETE FROM streets WHERE id = ?", (way_id,)).rowcount
+
+                is_street = change is not None and change[0].get('highway') in STREET_TYPES
+                if is_street:
+                    tags, refs = change
+                    tags = street_tags(tags)
+                    db.execute("INSERT INTO streets VALUES (?, ?, ?)", (way_id, tags['highway'], tags.get('name')))
+                    db.executemany("INSERT INTO way_nodes VALUES (?, ?, ?)",
+                                   [(way_id, seq, ref) for seq, ref in enumerate(refs)])
+                    summary['streets_added'] += 1
+
+                    for ref in refs:
+                        location = db.execute("SELECT longitude, latitude FROM nodes WHERE id = ?", (ref,)).fetchone()
+                        if location is None and changes.nodes.get(ref) is not None:
+                            location = changes.nodes[ref][:2]
+                            db.execute("INSERT INTO nodes VALUES (?, ?, ?)", (ref, *location))
+                        if location is None:
+                            # Untouched node that no stored street used before; fixed by the next full import
+                            summary['unresolved_nodes'] += 1
+                        else:
+                            summary['street_points'].append(tuple(location))
+
+                # Drop nodes no street references anymore
+                db.executemany(
+                    "DELETE FROM nodes WHERE id = ? AND NOT EXISTS (SELECT 1 FROM way_nodes WHERE node_id = ?)",
+                    [(ref, ref) for ref in old_refs]
+                )
+
+            db.execute("INSERT OR REPLACE INTO applied_changes (file) VALUES (?)", (os.path.basename(osc_file),))
+
+        return summary
+
+    def pois(self, category):
+        """POIs of one category in the extract_pois.py column layout"""
+        pois_df = pd.read_sql_query(
+            "SELECT osm_type, osm_id, name, latitude, longitude, poi_type, category, geometry_wkb FROM pois "
+            "WHERE category = ? ORDER BY osm_type, osm_id",
+            self.db, params=(category,)
+        )
+        return pois_df
+
+    def ways(self):
+        """
+        All stored streets as way dicts ({'id', 'tags', 'coords'}) for process_streets
+
+        Nodes missing from the store are dropped, like unresolved nodes at extraction.
+        """
+        streets = {way_id: {'id': way_id, 'tags': {'highway': highway, **({'name': name} if name is not None else {})},
+                            'coords': []}
+                   for way_id, highway, name in self.db.execute("SELECT id, highway, name FROM streets ORDER BY id")}
+
+        for way_id, lon, lat in self.db.execute(
+            "SELECT w.way_id, n.longitude, n.latitude FROM way_nodes w JOIN nodes n ON n.id = w.node_id "
+            "ORDER BY w.way_id, w.seq"
+        ):
+            streets[way_id]['coords'].append((lon, lat))
+
+        return list(streets.values())
+
+def within_radius_of_any(lons, lats, centers_lon, centers_lat, radius_m):
+    """Mask of points within radius_m of any center (exact great-circle test via unit-vector chords)"""
+    if len(lons) == 0 or len(centers_lon) == 0:
+        return np.zeros(len(lons), dtype=bool)
+
+    chords, _ = cKDTree(to_unit_vectors(centers_lon, centers_lat)).query(to_unit_vectors(lons, lats))
+    return chords <= chord_radius(radius_m)
+
+def affected_neighborhoods(summary, neighborhoods_df):
+    """
+    Neighborhoods whose extracted POIs or streets may have changed
+
+    A neighborhood is affected if a changed POI lies within the POI radius of
+    its center (for areas: any part of the polygon, as in extract_pois.py),
+    or a changed street node within the street radius.
+    """
+    centers = neighborhoods_df.drop_duplicates('id')
+    affected = np.zeros(len(centers), dtype=bool)
+    centers_lon = centers['longitude'].to_numpy(dtype=float)
+    centers_lat = centers['latitude'].to_numpy(dtype=float)
+
+    for points, radius_m in [(summary['poi_points'], POI_RADIUS_M), (summary['street_points'], STREET_RADIUS_M)]:
+        if points:
+            points = np.asarray(points, dtype=float)
+            affected |= within_radius_of_any(centers_lon, centers_lat, points[:, 0], points[:, 1], radius_m)
+
+    for geometry in shapely.from_wkb(summary.get('poi_areas', [])):
+        affected |= area_distances(geometry, centers_lon, centers_lat) <= POI_RADIUS_M
+
+    return centers[affected]
+
+def pois_near_neighborhoods(pois_df, centers_lon, centers_lat, radius_m):
+    """Mask of POIs within radius_m of any center: by location for points, by polygon for areas"""
+    near = within_radius_of_any(pois_df['longitude'].to_numpy(dtype=float), pois_df['latitude'].to_numpy(dtype=float),
+                                centers_lon, centers_lat, radius_m)
+    has_area = pois_df['geometry_wkb'].notna().to_numpy()
+    for position in np.flatnonzero(has_area):
+        geometry = shapely.from_wkb(pois_df['geometry_wkb'].iat[position])
+        near[position] = area_within_any_neighborhood(geometry, centers_lon, centers_lat, radius_m)
+    return near
+
+def main():
+    print("=" * 70)
+    print("Street Sampling POC - Incremental OSM Updates")
+    print("=" * 70)
+
+    # Configuration
+    OSM_FILE = "../poc_smartscore/data/belgium-latest.osm.pbf"  # Initial import only
+    STORE_FILE = "data/osm_store.sqlite"
+    CHANGES_DIR = "data/changes"  # Replication .osc / .osc.gz files, applied in name order
+    NEIGHBORHOODS_FILE = "data/neighborhoods.csv"
+    POI_DIR = "data/pois"
+    OUTPUT_GEOJSON = "data/streets/residential_streets.geojson"
+    OUTPUT_FLATGEOBUF = "data/streets/residential_streets.fgb"  # Spatially indexed copy (None to skip)
+    OUTPUT_CSV = "data/streets/residential_streets_summary.csv"
+    AFFECTED_CSV = "results/affected_neighborhoods.csv"
+    WORKERS = os.cpu_count()  # Processes decoding PBF blocks for the initial import
+
+    neighborhoods_df = pd.read_csv(NEIGHBORHOODS_FILE)
+
+    print("\n1. Opening store...")
+    store = OsmStore(STORE_FILE)
+    if store.is_empty():
+        store.import_pbf(OSM_FILE, WORKERS)
+
+    print("\n2. Applying change files...")
+    applied = store.applied_files()
+    pending = [path for path in sorted(glob.glob(os.path.join(CHANGES_DIR, "*.osc*")))
+               if os.path.basename(path) not in applied]
+    totals = {'poi_points': [], 'poi_areas': [], 'street_points': []}
+    for path in pending:
+        summary = store.apply_changes(path)
+        for key in totals:
+            totals[key].extend(summary[key])
+        print(f"   {os.path.basename(path)}: POIs +{summary['pois_added']}/-{summary['pois_removed']}, "
+              f"streets +{summary['streets_added']}/-{summary['streets_removed']}, "
+              f"{summary['nodes_moved']} nodes moved, {summary['unresolved_nodes']} unresolved nodes, "
+              f"{summary['stale_areas']} stale areas")
+    if not pending:
+        print("   No new change files")
+
+    print("\n3. Affected neighborhoods...")
+    affected_df = affected_neighborhoods(totals, neighborhoods_df)
+    os.makedirs(os.path.dirname(AFFECTED_CSV), exist_ok=True)
+    affected_df.to_csv(AFFECTED_CSV, index=False)
+    print(f"   {len(affected_df)} of {neighborhoods_df['id'].nunique()} neighborhoods affected")
+    for _, neighborhood in affected_df.iterrows():
+        print(f"   - {neighborhood['name']}")
+    print(f"   Saved to: {AFFECTED_CSV}")
+
+    if pending or not os.path.exists(OUTPUT_GEOJSON):
+        print("\n4. Exporting POIs and streets from the store...")
+        centers_lon = neighborhoods_df['longitude'].to_numpy(dtype=float)
+        centers_lat = neighborhoods_df['latitude'].to_numpy(dtype=float)
+        for category_key in POI_CATEGORIES:
+            pois_df = store.pois(category_key)
+            near = pois_near_neighborhoods(pois_df, centers_lon, centers_lat, POI_RADIUS_M)
+            save_pois(pois_df[near].to_dict('records'), os.path.join(POI_DIR, f"{category_key}.parquet"))
+
+        handler = StreetExtractor(neighborhoods_df, STREET_RADIUS_M)
+        handler.ways_to_process = store.ways()
+        handler.process_streets()
+        streets_df = pd.DataFrame(handler.streets)
+        save_to_geojson(streets_df, OUTPUT_GEOJSON)
+        if OUTPUT_FLATGEOBUF:
+            save_to_flatgeobuf(streets_df, OUTPUT_FLATGEOBUF)
+        save_summary_csv(streets_df, OUTPUT_CSV)
+
+    store.close()
+
+    print("\n" + "=" * 70)
+    print("Incremental update complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Run the street sampling POC as one in-process pipeline
+
+Chains the same steps as the individual scripts (extract_streets.py ->
+generate_sample_points.py, extract_pois.py -> calculate_distances.py ->
+aggregate_labels.py -> create_map_with_lines.py) but hands DataFrames from
+stage to stage in memory. Street and POI extraction do not depend on each
+other and run concurrently. Every stage still writes its usual output files,
+so the individual scripts and analyze_performance.py keep working.
+
+Stage results are cached under data/cache, keyed by the stage's code, its
+parameters and its upstream stages. Editing LABEL_THRESHOLDS in
+aggregate_labels.py, for example, only reruns label aggregation and the map.
+When the neighborhoods change, streets, samples and distances are only
+recomputed for new or changed neighborhoods (per-neighborhood stores).
+"""
+
+import os
+import sys
+import pandas as pd
+
+from extract_streets import (
+    STREET_TYPES, extract_streets, extract_streets_incremental, save_to_geojson, save_to_flatgeobuf, save_summary_csv,
+    streets_to_geodataframe
+)
+from generate_sample_points import generate_sample_points, generate_sample_points_incremental
+from extract_pois import POI_CATEGORIES, extract_category_pois, save_pois
+from calculate_distances import calculate_all_distances, calculate_distances_incremental, raster_signatures
+from build_distance_rasters import DistanceRaster
+from aggregate_labels import LABEL_THRESHOLDS, calculate_median_distances, assign_labels, create_summary_table
+from create_map_with_lines import load_sample_distances, create_map_with_lines
+from walking_graph import load_or_build_walking_graph, source_signature
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common import columnar, geodesy, neighborhood_store, osm_filters, pbf_blocks
+from poc_common.columnar import write_table
+from poc_common.pipeline import Pipeline
+from poc_common.stage_cache import StageCache, file_signature, frame_digest
+
+# Default configuration (same values as the individual scripts)
+DEFAULT_CONFIG = {
+    'osm_file': "../poc_smartscore/data/belgium-latest.osm.pbf",
+    'neighborhoods_file': "data/neighborhoods.csv",
+    'streets_geojson': "data/streets/residential_streets.geojson",
+    'streets_flatgeobuf': "data/streets/residential_streets.fgb",
+    'streets_summary_csv': "data/streets/residential_streets_summary.csv",
+    'samples_file': "data/samples/street_samples.parquet",
+    'poi_dir': "data/pois",
+    'distances_file': "results/distances_per_sample.parquet",
+    'labels_file': "results/neighborhood_labels.csv",
+    'labels_summary_file': "results/neighborhood_labels_summary.csv",
+    'map_file': "street_sampling_map.html",
+    'graph_dir': "data/graph",
+    'raster_dir': "data/rasters",
+    'street_radius_m': 1000,
+    'street_extraction_mode': 'way_first',  # Or 'locations' (node locations through node_index_file)
+    'node_index_file': "data/streets/node_locations.idx",
+    'poi_radius_m': 2000,
+    'sample_interval_m': 500,
+    'sample_radius_m': 1000,
+    'distance_method': 'kdtree',
+    'export_csv': False,
+    'workers': os.cpu_count(),
+    'cache_dir': "data/cache",  # None disables the stage cache
+    'cache_max_mb': 2048,
+    # Per-neighborhood results (None recomputes every neighborhood when the list changes)
+    'streets_store_dir': "data/streets/by_neighborhood",
+    'samples_store_dir': "data/samples/by_neighborhood",
+    'distances_store_dir': "results/distances_by_neighborhood"
+}
+
+# Street and POI extraction run at the same time and split the worker processes between them
+CONCURRENT_PBF_STAGES = 2
+
+def pbf_workers(config):
+    """Processes for one of the concurrently running PBF-decoding stages"""
+    return max(1, (config['workers'] or os.cpu_count()) // CONCURRENT_PBF_STAGES)
+
+def table_files(paths):
+    """Stored files of the given tables (a missing table keeps its path, which does not exist)"""
+    files = []
+    for path in paths:
+        try:
+            files.append(columnar.find_table(path))
+        except FileNotFoundError:
+            files.append(path)
+    return files
+
+def stage_extract_streets(config, neighborhoods_df):
+    """Streets near the neighborhoods, saved as GeoJSON, FlatGeobuf and summary CSV"""
+    if config['streets_store_dir']:
+        streets_df, _ = extract_streets_incremental(
+            config['osm_file'], neighborhoods_df, config['streets_store_dir'], radius_m=config['street_radius_m'],
+            node_index_file=config['node_index_file'], mode=config['street_extraction_mode'],
+            workers=pbf_workers(config)
+        )
+    else:
+        streets_df = extract_streets(config['osm_file'], neighborhoods_df, radius_m=config['street_radius_m'],
+                                     node_index_file=config['node_index_file'], mode=config['street_extraction_mode'],
+                                     workers=pbf_workers(config))
+
+    save_to_geojson(streets_df, config['streets_geojson'])
+    if config['streets_flatgeobuf']:
+        save_to_flatgeobuf(streets_df, config['streets_flatgeobuf'])
+    save_summary_csv(streets_df, config['streets_summary_csv'])
+
+    return {'streets_df': streets_df}
+
+def stage_generate_sample_points(config, neighborhoods_df, streets_df):
+    """Sample points along the extracted streets"""
+    streets_gdf = streets_to_geodataframe(streets_df)
+    if config['samples_store_dir']:
+        samples_df, _ = generate_sample_points_incremental(
+            streets_gdf,
+            neighborhoods_df,
+            config['samples_store_dir'],
+            sample_interval_m=config['sample_interval_m'],
+            radius_m=config['sample_radius_m']
+        )
+    else:
+        samples_df = generate_sample_points(
+            streets_gdf,
+            neighborhoods_df,
+            sample_interval_m=config['sample_interval_m'],
+            radius_m=config['sample_radius_m']
+        )
+    write_table(samples_df, config['samples_file'], csv_export=config['export_csv'])
+
+    return {'samples_df': samples_df}
+
+def stage_extract_pois(config, neighborhoods_df):
+    """POIs of every category near the neighborhoods"""
+    pois_dict = {}
+    for category_key, category_info in POI_CATEGORIES.items():
+        pois = extract_category_pois(config['osm_file'], category_key, category_info, neighborhoods_df,
+                                     config['poi_radius_m'], pbf_workers(config))
+        output_file = os.path.join(config['poi_dir'], f"{category_key}.parquet")
+        pois_dict[category_key] = save_pois(pois, output_file, config['export_csv'])
+
+    return {'pois_dict': pois_dict}
+
+def stage_calculate_distances(config, neighborhoods_df, samples_df, pois_dict):
+    """Distance from every sample point to the nearest POI of each category"""
+    walking_graph = None
+    graph_source = None
+    if config['distance_method'] == 'network':
+        walking_graph = load_or_build_walking_graph(config['osm_file'], config['graph_dir'])
+        graph_source = source_signature(config['osm_file'])
+
+    if config['distances_store_dir']:
+        distances_df, _ = calculate_distances_incremental(
+            samples_df, pois_dict, neighborhoods_df, config['distances_store_dir'],
+            method=config['distance_method'], raster_dir=config['raster_dir'], walking_graph=walking_graph,
+            params={'graph_source': graph_source}, workers=config['workers']
+        )
+    else:
+        distances_df = calculate_all_distances(samples_df, pois_dict, method=config['distance_method'],
+                                               raster_dir=config['raster_dir'], walking_graph=walking_graph,
+                                               workers=config['workers'])
+    write_table(distances_df, config['distances_file'], csv_export=config['export_csv'])
+
+    return {'distances_df': distances_df}
+
+def stage_aggregate_labels(config, neighborhoods_df, distances_df):
+    """Median distances and labels per neighborhood"""
+    labels_df = assign_labels(calculate_median_distances(distances_df))
+    summary_df = create_summary_table(labels_df, neighborhoods_df)
+
+    os.makedirs(os.path.dirname(config['labels_file']), exist_ok=True)
+    labels_df.to_csv(config['labels_file'], index=False)
+    summary_df.to_csv(config['labels_summary_file'], index=False)
+
+    return {'labels_df': labels_df, 'labels_summary_df': summary_df}
+
+def stage_map(config, neighborhoods_df, samples_df, pois_dict, distances_df, labels_summary_df):
+    """Interactive map with sample-to-POI connection lines"""
+    samples_enriched_df = load_sample_distances(samples_df, distances_df)
+    create_map_with_lines(neighborhoods_df, samples_enriched_df, pois_dict, distances_df, labels_summary_df,
+                          config['map_file'])
+
+    return {'map_file': config['map_file']}
+
+def build_pipeline(cache=None):
+    """
+    Street sampling stages, the artifacts they exchange and their cache keys
+
+    Every run starts from the 'config' dict and 'neighborhoods_df'. Parameters
+    only list the config values a stage actually uses, so changing e.g. the
+    sample interval leaves street and POI extraction cached.
+    """
+    pipeline = Pipeline(cache)
+    pipeline.add(
+        'extract_streets', stage_extract_streets,
+        inputs=['config', 'neighborhoods_df'], outputs=['streets_df'],
+        params=lambda config, neighborhoods_df: {
+            'osm_file': file_signature(config['osm_file']),
+            'neighborhoods': frame_digest(neighborhoods_df),
+            'radius_m': config['street_radius_m'],
+            'street_types': STREET_TYPES,
+            'outputs': [config['streets_geojson'], config['streets_flatgeobuf'], config['streets_summary_csv']]
+        },
+        code=[extract_streets, geodesy, osm_filters, pbf_blocks, neighborhood_store],
+        files=lambda config, neighborhoods_df: [config['streets_geojson'], config['streets_summary_csv']]
+    )
+    pipeline.add(
+        'generate_sample_points', stage_generate_sample_points,
+        inputs=['config', 'neighborhoods_df', 'streets_df'], outputs=['samples_df'],
+        params=lambda config, neighborhoods_df, streets_df: {
+            'neighborhoods': frame_digest(neighborhoods_df),
+            'sample_interval_m': config['sample_interval_m'],
+            'radius_m': config['sample_radius_m'],
+            'output': config['samples_file'],
+            'export_csv': config['export_csv']
+        },
+        code=[generate_sample_points, geodesy, columnar, neighborhood_store],
+        files=lambda config, **_: table_files([config['samples_file']])
+    )
+    pipeline.add(
+        'extract_pois', stage_extract_pois,
+        inputs=['config', 'neighborhoods_df'], outputs=['pois_dict'],
+        params=lambda config, neighborhoods_df: {
+            'osm_file': file_signature(config['osm_file']),
+            'neighborhoods': frame_digest(neighborhoods_df),
+            'radius_m': config['poi_radius_m'],
+            'categories': POI_CATEGORIES,
+            'output_dir': config['poi_dir'],
+            'export_csv': config['export_csv']
+        },
+        code=[extract_category_pois, geodesy, osm_filters, pbf_blocks, columnar],
+        files=lambda config, **_: table_files([os.path.join(config['poi_dir'], category_key)
+                                               for category_key in POI_CATEGORIES])
+    )
+    pipeline.add(
+        'calculate_distances', stage_calculate_distances,
+        inputs=['config', 'neighborhoods_df', 'samples_df', 'pois_dict'], outputs=['distances_df'],
+        params=lambda config, neighborhoods_df, samples_df, pois_dict: {
+            'method': config['distance_method'],
+            'graph_source': source_signature(config['osm_file']) if config['distance_method'] == 'network' else None,
+            'rasters': raster_signatures(config['raster_dir']) if config['distance_method'] == 'raster' else None,
+            'output': config['distances_file'],
+            'export_csv': config['export_csv']
+        },
+        code=[calculate_all_distances, DistanceRaster, load_or_build_walking_graph, geodesy, columnar, neighborhood_store],
+        files=lambda config, **_: table_files([config['distances_file']])
+    )
+    pipeline.add(
+        'aggregate_labels', stage_aggregate_labels,
+        inputs=['config', 'neighborhoods_df', 'distances_df'], outputs=['labels_df', 'labels_summary_df'],
+        params=lambda config, neighborhoods_df, distances_df: {
+            'neighborhoods': frame_digest(neighborhoods_df),
+            'thresholds': LABEL_THRESHOLDS,
+            'outputs': [config['labels_file'], config['labels_summary_file']]
+        },
+        code=[assign_labels],
+        files=lambda config, **_: [config['labels_file'], config['labels_summary_file']]
+    )
+    pipeline.add(
+        'map', stage_map,
+        inputs=['config', 'neighborhoods_df', 'samples_df', 'pois_dict', 'distances_df', 'labels_summary_df'],
+        outputs=['map_file'],
+        params=lambda config, neighborhoods_df, **_: {
+            'neighborhoods': frame_digest(neighborhoods_df),
+            'output': config['map_file']
+        },
+        code=[create_map_with_lines],
+        files=lambda config, **_: [config['map_file']]
+    )
+    return pipeline
+
+def run_pipeline(config=None):
+    """
+    Run all street sampling stages
+
+    Args:
+        config: Overrides for DEFAULT_CONFIG
+
+    Returns:
+        Tuple of (pipeline with per-stage timings, artifacts dict)
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    neighborhoods_df = pd.read_csv(config['neighborhoods_file'])
+
+    cache = StageCache(config['cache_dir'], config['cache_max_mb'] * 1024 ** 2) if config['cache_dir'] else None
+
+    pipeline = build_pipeline(cache)
+    artifacts = pipeline.run({'config': config, 'neighborhoods_df': neighborhoods_df})
+
+    return pipeline, artifacts
+
+def main():
+    print("=" * 70)
+    print("Street Sampling POC - In-Process Pipeline")
+    print("=" * 70)
+
+    pipeline, artifacts = run_pipeline()
+
+    print("\n" + "=" * 70)
+    print("PIPELINE TIMINGS")
+    print("=" * 70)
+    for line in pipeline.summary_lines():
+        print(line)
+
+    failed = [name for name, timing in pipeline.timings.items() if timing['status'] in ('failed', 'skipped')]
+    if failed:
+        print(f"\nStages not completed: {', '.join(failed)}")
+        sys.exit(1)
+
+    print("\n" + "=" * 70)
+    print("Pipeline complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
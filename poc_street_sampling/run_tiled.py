@@ -0,0 +1,303 @@
+"""
+Run the street sampling POC tile by tile, for country-scale neighborhood sets
+
+Streets and POIs are extracted once, as in run_pipeline.py. Neighborhoods are
+then partitioned into square tiles over Belgium (poc_common.tiling), and each
+tile samples its streets and measures nearest-POI distances in a worker
+process that only receives the tile's streets and the POIs in a halo around
+them. The halo starts at the POI extraction radius (2 km, RADIUS_M in
+extract_pois.py). A worker reports how far from the tile center its nearest
+POIs actually were; a tile whose nearest POI could lie beyond its halo is
+rerun with a halo that covers it, so results at tile edges are exact. Tile
+outputs are stitched back into the order of a single run before labels are
+aggregated.
+
+Only the 'kdtree' and 'brute_force' methods can be tiled (raster lookups and
+walking distances need the whole raster or street graph). No map is drawn;
+a map of every neighborhood is not usable.
+"""
+
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import shapely
+
+from extract_streets import streets_to_geodataframe
+from generate_sample_points import generate_sample_points, street_order
+from calculate_distances import SHARDED_METHODS, POIReach, nearest_pois_by_category
+from run_pipeline import (
+    CONCURRENT_PBF_STAGES, DEFAULT_CONFIG, stage_extract_streets, stage_extract_pois, stage_aggregate_labels
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poc_common.columnar import write_table
+from poc_common.geodesy import haversine
+from poc_common.tiling import TILE_SIZE_M, bounding_circle, map_bounded, partition_neighborhoods
+
+TILED_CONFIG = {
+    **DEFAULT_CONFIG,
+    'tile_size_m': TILE_SIZE_M,
+    'halo_m': DEFAULT_CONFIG['poi_radius_m'],
+    'tiles_per_worker': 8,  # Tiles a worker process handles before it is replaced
+    'tiles_file': "results/tiles.csv"
+}
+
+def locate_tiles(tiles, streets_df):
+    """
+    Add each tile's street positions and a circle (center, radius_m) containing those streets
+
+    Streets belong to the tile of their neighborhood, so streets crossing a
+    tile edge stay whole; the circle is what the POI halo is measured from.
+    """
+    bounds = shapely.bounds(shapely.from_geojson(streets_df['geometry'].to_numpy()))
+    tile_of = {nbh_id: i for i, tile in enumerate(tiles) for nbh_id in tile['neighborhood_ids']}
+    street_tiles = streets_df['neighborhood_id'].map(tile_of).to_numpy()
+    positions = pd.Series(np.arange(len(streets_df))).groupby(street_tiles).indices
+
+    for i, tile in enumerate(tiles):
+        tile['street_positions'] = positions.get(i, np.empty(0, dtype=np.int64))
+        tile['center'], tile['radius_m'] = None, 0.0
+        if len(tile['street_positions']):
+            street_bounds = bounds[tile['street_positions']]
+            min_lon, min_lat = street_bounds[:, 0].min(), street_bounds[:, 1].min()
+            max_lon, max_lat = street_bounds[:, 2].max(), street_bounds[:, 3].max()
+            center_lon, center_lat, tile['radius_m'] = bounding_circle([min_lon, min_lon, max_lon, max_lon],
+                                                                       [min_lat, max_lat, min_lat, max_lat])
+            tile['center'] = (center_lon, center_lat)
+
+    return tiles
+
+def tile_task(tile, reach_m, config, neighborhoods_df, streets_df, poi_reaches):
+    """Pool task payload: the tile's neighborhoods and streets, and per category the POIs within reach_m of its center"""
+    center_lon, center_lat = tile['center']
+    return {
+        'tile_id': tile['tile_id'],
+        'neighborhoods_df': neighborhoods_df[neighborhoods_df['id'].isin(tile['neighborhood_ids'])],
+        'streets_df': streets_df.iloc[tile['street_positions']],
+        'pois_dict': {
+            category_key: poi_reach.pois_df.iloc[poi_reach.within(center_lon, center_lat, reach_m[category_key])]
+            for category_key, poi_reach in poi_reaches.items()
+        },
+        'center': tile['center'],
+        'reach_m': reach_m,
+        'method': config['distance_method'],
+        'sample_interval_m': config['sample_interval_m'],
+        'sample_radius_m': config['sample_radius_m']
+    }
+
+def process_tile(task):
+    """
+    Pool task: sample one tile's streets and find their nearest POIs within the tile's halo
+
+    Printing is suppressed in workers; the parent reports one line per tile.
+
+    Returns:
+        Dict with samples_df (without sample_id), category_results (see
+        nearest_pois_by_category), sample_radius_m (distance from the tile
+        center to its farthest sample) and, per category, needed_reach_m:
+        the largest sample-to-center distance plus nearest POI distance. Any
+        POI nearer than the one found lies within that reach of the center.
+    """
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        samples_df = generate_sample_points(streets_to_geodataframe(task['streets_df']), task['neighborhoods_df'],
+                                            task['sample_interval_m'], task['sample_radius_m'])
+        category_results = nearest_pois_by_category(samples_df, task['pois_dict'], task['method'], verbose=False)
+
+    center_lon, center_lat = task['center']
+    offsets = haversine(center_lon, center_lat, samples_df['longitude'].to_numpy(dtype=float),
+                        samples_df['latitude'].to_numpy(dtype=float))
+
+    needed_reach_m = {}
+    for category_key, category_df in zip(task['pois_dict'], category_results):
+        # A category without POIs in the halo needs an unknown reach
+        distances = np.nan_to_num(category_df['distance_m'].to_numpy(dtype=float), nan=np.inf)
+        needed_reach_m[category_key] = float((offsets + distances).max()) if len(distances) else 0.0
+
+    return {
+        'samples_df': samples_df.drop(columns=['sample_id']),
+        'category_results': category_results,
+        'sample_radius_m': float(offsets.max()) if len(offsets) else 0.0,
+        'needed_reach_m': needed_reach_m,
+        'duration_s': time.perf_counter() - start
+    }
+
+def stitch_tiles(tiles, results, streets_df):
+    """
+    Merge tile outputs into the samples and distances of a single run
+
+    Samples are put back in street order and renumbered; distance rows follow
+    their samples and get the new sample ids.
+
+    Returns:
+        Tuple of (samples_df, distances_df)
+    """
+    samples = []
+    category_results = []
+    offset = 0
+    for tile in tiles:
+        result = results.get(tile['tile_id'])
+        if result is None:
+            continue
+        samples.append(result['samples_df'])
+        for category_df in result['category_results']:
+            category_df['_sample_order'] += offset
+            category_results.append(category_df)
+        offset += len(result['samples_df'])
+
+    if not samples or offset == 0:
+        return pd.DataFrame(), pd.DataFrame()
+
+    samples_df = pd.concat(samples, ignore_index=True)
+    order = street_order(samples_df, streets_df)
+    samples_df = samples_df.iloc[order].reset_index(drop=True)
+    samples_df.insert(0, 'sample_id', range(1, len(samples_df) + 1))
+
+    # Stitched position -> position in the single-run order
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+
+    distances_df = pd.concat(category_results, ignore_index=True)
+    distances_df['_sample_order'] = position[distances_df['_sample_order'].to_numpy()]
+    distances_df['sample_id'] = distances_df['_sample_order'] + 1
+    distances_df = distances_df.sort_values(['_sample_order', '_category_order'], kind='stable')
+    distances_df = distances_df.drop(columns=['_sample_order', '_category_order']).reset_index(drop=True)
+
+    return samples_df, distances_df
+
+def run_tiles(config, neighborhoods_df, streets_df, pois_dict):
+    """
+    Sample points and nearest-POI distances of all neighborhoods, tile by tile
+
+    Tiles run in a worker pool that keeps a bounded number of tiles in
+    flight and replaces each worker after config['tiles_per_worker'] tiles.
+    Every tile starts with a halo of config['halo_m'] around its streets; a
+    tile whose results needed a wider reach in some category is rerun with
+    exactly that reach (or, if its halo held no POI of the category, with
+    the reach POIReach.circle_reach() guarantees), after which it is exact.
+
+    Returns:
+        Tuple of (samples_df, distances_df, tiles_df with one row per tile)
+    """
+    tiles = locate_tiles(partition_neighborhoods(neighborhoods_df, config['tile_size_m']), streets_df)
+    poi_reaches = {category_key: POIReach(pois_df) for category_key, pois_df in pois_dict.items()}
+    print(f"  {len(tiles)} tiles of {config['tile_size_m'] / 1000:g} km, halo {config['halo_m']}m")
+
+    reach_m = {tile['tile_id']: {category_key: tile['radius_m'] + config['halo_m'] for category_key in pois_dict}
+               for tile in tiles}
+    rounds = {tile['tile_id']: 0 for tile in tiles}
+    results = {}
+
+    pending = [tile for tile in tiles if len(tile['street_positions'])]
+    while pending:
+        tasks = (tile_task(tile, reach_m[tile['tile_id']], config, neighborhoods_df, streets_df, poi_reaches)
+                 for tile in pending)
+        tiles_by_id = {tile['tile_id']: tile for tile in pending}
+        rerun = []
+
+        for task, result in map_bounded(process_tile, tasks, config['workers'], config['tiles_per_worker']):
+            tile = tiles_by_id[task['tile_id']]
+            rounds[tile['tile_id']] += 1
+
+            short = [
+                category_key for category_key, needed in result['needed_reach_m'].items()
+                if needed > task['reach_m'][category_key] and len(poi_reaches[category_key].pois_df)
+            ]
+            for category_key in short:
+                needed = result['needed_reach_m'][category_key]
+                if not np.isfinite(needed):
+                    needed = poi_reaches[category_key].circle_reach(*tile['center'], result['sample_radius_m'])
+                reach_m[tile['tile_id']][category_key] = needed
+
+            if short:
+                rerun.append(tile)
+                print(f"  {tile['tile_id']}: halo too small for {', '.join(short)}, rerunning")
+            else:
+                results[tile['tile_id']] = result
+                print(f"  {tile['tile_id']}: {len(tile['neighborhood_ids'])} neighborhoods, "
+                      f"{len(result['samples_df']):,} samples in {result['duration_s']:.2f}s")
+
+        pending = sorted(rerun, key=lambda tile: (tile['row'], tile['col']))
+
+    tiles_df = pd.DataFrame([{
+        'tile_id': tile['tile_id'],
+        'min_lon': tile['bounds'][0],
+        'min_lat': tile['bounds'][1],
+        'max_lon': tile['bounds'][2],
+        'max_lat': tile['bounds'][3],
+        'neighborhoods': len(tile['neighborhood_ids']),
+        'streets': len(tile['street_positions']),
+        'samples': len(results[tile['tile_id']]['samples_df']) if tile['tile_id'] in results else 0,
+        'max_reach_m': round(max(reach_m[tile['tile_id']].values(), default=0.0), 1),
+        'runs': rounds[tile['tile_id']],
+        'duration_s': round(results[tile['tile_id']]['duration_s'], 3) if tile['tile_id'] in results else 0.0
+    } for tile in tiles])
+
+    samples_df, distances_df = stitch_tiles(tiles, results, streets_df)
+    return samples_df, distances_df, tiles_df
+
+def run_tiled(config=None):
+    """
+    Extract streets and POIs, process all tiles and aggregate labels
+
+    Args:
+        config: Overrides for TILED_CONFIG
+
+    Returns:
+        Dict of step name -> duration in seconds
+    """
+    config = {**TILED_CONFIG, **(config or {})}
+    if config['distance_method'] not in SHARDED_METHODS:
+        raise ValueError(f"Distance method {config['distance_method']} cannot be tiled (use one of {SHARDED_METHODS})")
+
+    neighborhoods_df = pd.read_csv(config['neighborhoods_file'])
+    timings = {}
+
+    # Street and POI extraction overlap, as in run_pipeline.py (each gets half of the workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENT_PBF_STAGES) as pool:
+        streets = pool.submit(stage_extract_streets, config, neighborhoods_df)
+        pois = pool.submit(stage_extract_pois, config, neighborhoods_df)
+        streets_df = streets.result()['streets_df']
+        pois_dict = pois.result()['pois_dict']
+    timings['extract'] = time.perf_counter() - start
+
+    print(f"\nProcessing {len(neighborhoods_df)} neighborhoods in tiles...")
+    start = time.perf_counter()
+    samples_df, distances_df, tiles_df = run_tiles(config, neighborhoods_df, streets_df, pois_dict)
+    write_table(samples_df, config['samples_file'], csv_export=config['export_csv'])
+    write_table(distances_df, config['distances_file'], csv_export=config['export_csv'])
+    os.makedirs(os.path.dirname(config['tiles_file']), exist_ok=True)
+    tiles_df.to_csv(config['tiles_file'], index=False)
+    timings['tiles'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stage_aggregate_labels(config, neighborhoods_df, distances_df)
+    timings['aggregate_labels'] = time.perf_counter() - start
+
+    return timings
+
+def main():
+    print("=" * 70)
+    print("Street Sampling POC - Tiled Run")
+    print("=" * 70)
+
+    timings = run_tiled()
+
+    print("\n" + "=" * 70)
+    print("TIMINGS")
+    print("=" * 70)
+    for name, duration_s in timings.items():
+        print(f"{name:<28} {duration_s:>10.2f}s")
+    print(f"{'Total':<28} {sum(timings.values()):>10.2f}s")
+
+    print("\n" + "=" * 70)
+    print("Tiled run complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()